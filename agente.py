@@ -0,0 +1,526 @@
+"""
+Motor de conversa do Agente de Análise de Fraudes, independente da interface.
+
+A Conversa guarda o estado em um objeto com os atributos messages, df, estatisticas, carga, tool_images,
+tokens_contexto e latencias_turno: no app é o próprio st.session_state; no modo em lote (lote.py) é um
+EstadoConversa. O que é exibido ao usuário (spinners, texto em streaming, avisos e erros) passa pelos
+ganchos de uma Interface; a implementação padrão não exibe nada e só registra avisos no log.
+"""
+import contextlib
+import contextvars
+import os
+import time
+from concurrent.futures import ThreadPoolExecutor
+from io import BytesIO
+
+import pandas as pd
+
+from cargas import CargaDados, carga_anexo, carga_url
+from consulta_estruturada import CONSULTA_ESTRUTURADA_MAX_LINHAS, consulta_estruturada
+from contexto import ResumoHistorico, compactar_historico, estimar_tokens, limitar_saida
+from gemini_client import ErroGemini, obter_cliente
+from metricas import anotar, trecho, turno
+from perfil import perfil_dados
+from pontuacao import pontuar_transacoes
+from tools import CONSULTA_MAX_LINHAS_SAIDA, consulta_tool, grafico_tool
+
+# Modelo do Gemini (a URL base da API é configurável por GEMINI_BASE_URL, ver gemini_client.py)
+MODEL_NAME = "gemini-2.5-flash-preview-05-20"
+# Orçamento de um turno do agente: chamadas ao modelo e tempo (s) antes de exigir a resposta final em texto
+MAX_PASSOS_AGENTE = int(os.environ.get("MAX_PASSOS_AGENTE", "6"))
+TEMPO_MAXIMO_TURNO_S = float(os.environ.get("TEMPO_MAXIMO_TURNO_S", "120"))
+# Ferramentas que só leem os dados: várias chamadas no mesmo passo rodam em paralelo
+FERRAMENTAS_PARALELAS = {"perfil_dados", "consulta_estruturada", "consulta_tool", "grafico_tool", "pontuar_transacoes", "analisar_conclusoes"}
+FERRAMENTAS_TRABALHADORES = int(os.environ.get("FERRAMENTAS_TRABALHADORES", "4"))
+# Quanto (s) a ferramenta 'carregar_dados' espera pela carga antes de responder que ela segue em segundo plano
+ESPERA_CARGA_FERRAMENTA_S = float(os.environ.get("ESPERA_CARGA_FERRAMENTA_S", "5"))
+
+# Instrução do sistema para guiar o agente
+SYSTEM_INSTRUCTION = (
+    "Você é um Agente de Análise de Fraudes especializado em DataFrames pandas. "
+    "Sua função é responder a perguntas usando as ferramentas 'carregar_dados', 'perfil_dados', 'consulta_estruturada', 'consulta_tool', 'grafico_tool', 'pontuar_transacoes' ou 'analisar_conclusoes'. "
+    "NÃO gere código Python diretamente na resposta; use as ferramentas."
+    "O DataFrame principal é chamado 'df' e contém colunas 'Time', 'V1' a 'V28', 'Amount' e 'Class'. "
+    "Se o usuário fornecer uma URL de um arquivo .csv, ou uma URL para um arquivo CSV compactado (como .zip ou .gz), use a ferramenta 'carregar_dados' com a URL. "
+    "Se o usuário pedir para acrescentar/anexar um novo arquivo (ex.: o lote diário) aos dados atuais, use 'carregar_dados' com anexar=true."
+    "Para perguntas sobre desbalanceamento de classes, estatísticas de Amount por classe, correlações com Class, quantis ou valores ausentes, "
+    "use primeiro 'perfil_dados', que responde instantaneamente a partir do perfil pré-calculado. "
+    "Para filtros, contagens, agrupamentos, agregações (soma, média, mínimo, máximo, desvio, mediana, quantis) e top-k sobre colunas, "
+    "use 'consulta_estruturada': ela é mais rápida e tem tempo de resposta previsível. "
+    "Para as demais análises numéricas ou estatísticas, use 'consulta_tool'. "
+    "Na 'consulta_tool', prefira os subconjuntos indexados 'fraudes' (Class == 1) e 'normais' (Class == 0) a 'df[df['Class'] == 1]', "
+    "e 'janela(t0, t1)' (linhas com t0 <= Time <= t1) a filtros sobre 'Time': eles não percorrem o DataFrame inteiro. "
+    "Se os dados foram lidos em streaming, 'df' contém apenas parte das linhas: para estatísticas globais use, na 'consulta_tool', "
+    "o objeto 'estatisticas' (estatisticas.resumo(), estatisticas.resumo_por_classe('Amount'), estatisticas.contagem_classes, estatisticas.quantis([0.9, 0.99])). "
+    "Sempre que o usuário pedir visualização (gráfico, histograma, boxplot), use 'grafico_tool'."
+    "Para pontuar o risco de fraude das transações, listar as mais suspeitas ou avaliar precisão/revocação por limiar, use 'pontuar_transacoes'."
+    "Quando o usuário solicitar um resumo, conclusões ou o que foi descoberto, use a ferramenta 'analisar_conclusoes'."
+    "Responda de forma concisa e profissional, em português."
+)
+
+# Declarações das ferramentas enviadas ao modelo em todas as chamadas
+DECLARACOES_FERRAMENTAS = [
+    {
+        "functionDeclarations": [
+            {
+                "name": "carregar_dados",
+                "description": "Carrega um DataFrame a partir de uma URL de arquivo .csv fornecida. Use esta ferramenta quando o usuário mencionar uma URL de arquivo; com anexar=true, acrescenta o arquivo aos dados atuais.",
+                "parameters": {
+                    "type": "OBJECT",
+                    "properties": {
+                        "url": {"type": "STRING", "description": "A URL pública do arquivo CSV."},
+                        "streaming": {"type": "BOOLEAN", "description": "Se verdadeiro, lê o arquivo em blocos (para arquivos muito grandes). Arquivos grandes usam streaming automaticamente."},
+                        "anexar": {"type": "BOOLEAN", "description": "Se verdadeiro, acrescenta as linhas do arquivo (mesmas colunas) ao final dos dados atuais em vez de substituí-los."}
+                    },
+                    "required": ["url"]
+                }
+            },
+            {
+                "name": "perfil_dados",
+                "description": "Retorna o perfil pré-calculado do DataFrame 'df' (resposta instantânea). Use para desbalanceamento de classes, estatísticas de Amount por classe, correlações das colunas com Class, quantis e valores ausentes.",
+                "parameters": {
+                    "type": "OBJECT",
+                    "properties": {
+                        "secao": {"type": "STRING", "description": "Seção do perfil: 'geral', 'classes', 'amount', 'correlacoes', 'quantis', 'ausentes' ou 'tudo'."}
+                    },
+                    "required": ["secao"]
+                }
+            },
+            {
+                "name": "consulta_estruturada",
+                "description": "Consulta estruturada ao DataFrame 'df', sem código: filtros, agrupamento, agregações, quantis e top-k (as N linhas ou grupos com maior/menor valor). Prefira-a à 'consulta_tool' sempre que a pergunta couber nesses termos.",
+                "parameters": {
+                    "type": "OBJECT",
+                    "properties": {
+                        "filtros": {
+                            "type": "ARRAY",
+                            "description": "Condições combinadas com E. Ex: [{'coluna': 'Class', 'operador': '==', 'valor': 1}, {'coluna': 'Time', 'operador': 'entre', 'valores': [0, 3600]}]",
+                            "items": {
+                                "type": "OBJECT",
+                                "properties": {
+                                    "coluna": {"type": "STRING"},
+                                    "operador": {"type": "STRING", "description": "'==', '!=', '<', '<=', '>', '>=', 'entre' (valores=[mínimo, máximo]) ou 'em' (valores=lista)."},
+                                    "valor": {"type": "NUMBER"},
+                                    "valores": {"type": "ARRAY", "items": {"type": "NUMBER"}}
+                                },
+                                "required": ["coluna", "operador"]
+                            }
+                        },
+                        "agrupar_por": {"type": "ARRAY", "items": {"type": "STRING"}, "description": "Colunas de agrupamento. Ex: ['Class']"},
+                        "agregacoes": {
+                            "type": "ARRAY",
+                            "description": "Agregações calculadas (por grupo, se houver agrupar_por). Ex: [{'funcao': 'media', 'coluna': 'Amount'}, {'funcao': 'quantil', 'coluna': 'Amount', 'q': 0.99}, {'funcao': 'contagem'}]",
+                            "items": {
+                                "type": "OBJECT",
+                                "properties": {
+                                    "funcao": {"type": "STRING", "description": "'contagem', 'soma', 'media', 'min', 'max', 'desvio', 'mediana' ou 'quantil'."},
+                                    "coluna": {"type": "STRING", "description": "Coluna agregada (opcional para 'contagem')."},
+                                    "q": {"type": "NUMBER", "description": "Quantil entre 0 e 1 (só para 'quantil')."}
+                                },
+                                "required": ["funcao"]
+                            }
+                        },
+                        "colunas": {"type": "ARRAY", "items": {"type": "STRING"}, "description": "Sem agregações, o resultado são as linhas filtradas: colunas exibidas. Ex: ['Time', 'Amount', 'Class']"},
+                        "ordenar_por": {"type": "STRING", "description": "Coluna (linhas) ou agregação/coluna de agrupamento (grupos) usada na ordenação. Ex: 'Amount' ou 'media(Amount)'"},
+                        "decrescente": {"type": "BOOLEAN", "description": "Ordem decrescente (padrão: verdadeiro)."},
+                        "limite": {"type": "INTEGER", "description": f"Número de linhas ou grupos retornados (padrão {CONSULTA_MAX_LINHAS_SAIDA}, máximo {CONSULTA_ESTRUTURADA_MAX_LINHAS})."}
+                    }
+                }
+            },
+            {
+                "name": "consulta_tool",
+                "description": "Executa código Python para consultar o DataFrame 'df' e retorna resultados como string. Use para obter estatísticas, valores, linhas específicas, etc. Alterações no lugar em colunas de 'df' (ex: df.fillna(0, inplace=True), df.insert(...)) são mantidas nas próximas consultas; não use inplace=True para remover ou reordenar linhas nem para mudar o índice: atribua o resultado a uma variável.",
+                "parameters": {
+                    "type": "OBJECT",
+                    "properties": {
+                        "codigo_python": {"type": "STRING", "description": "O código Python a ser executado no DataFrame 'df'. Também disponíveis: 'fraudes', 'normais' e 'janela(t0, t1)'. Ex: df.shape[0], fraudes['Amount'].mean(), janela(0, 3600)['Class'].sum()"}
+                    },
+                    "required": ["codigo_python"]
+                }
+            },
+            {
+                "name": "grafico_tool",
+                "description": "Gera um gráfico e retorna a imagem em buffer de memória. Use para histogramas, boxplots, dispersão (scatter) e gráficos de barra.",
+                "parameters": {
+                    "type": "OBJECT",
+                    "properties": {
+                        "tipo_grafico": {"type": "STRING", "description": "Tipo: 'hist', 'box', 'scatter' ou 'bar'."},
+                        "colunas": {"type": "ARRAY", "items": {"type": "STRING"}, "description": "Lista de 1 ou 2 colunas para o gráfico. Ex: ['Amount']"},
+                        "titulo": {"type": "STRING", "description": "Título descritivo para o gráfico."}
+                    },
+                    "required": ["tipo_grafico", "colunas", "titulo"]
+                }
+            },
+            {
+                "name": "pontuar_transacoes",
+                "description": "Ajusta um modelo de risco de fraude (regressão logística sobre V1–V28 e Amount) no DataFrame 'df' e pontua 'df' ou um novo CSV. Retorna precisão/revocação por limiar (medidas em uma validação estratificada quando o próprio df é pontuado), a vazão (linhas/s) e as transações mais suspeitas.",
+                "parameters": {
+                    "type": "OBJECT",
+                    "properties": {
+                        "url": {"type": "STRING", "description": "URL opcional de um CSV com o mesmo esquema a ser pontuado. Se omitida, pontua o próprio 'df'."},
+                        "limiares": {"type": "ARRAY", "items": {"type": "NUMBER"}, "description": "Limiares de pontuação (0 a 1) para precisão/revocação. Ex: [0.5, 0.9, 0.99]"},
+                        "top_n": {"type": "INTEGER", "description": "Quantas transações mais suspeitas listar (padrão 10, máximo 50)."}
+                    }
+                }
+            },
+            {
+                "name": "analisar_conclusoes",
+                "description": "Analisa o histórico da conversa e as análises já realizadas para tirar conclusões sobre os dados e gerar um resumo final. Use esta ferramenta quando o usuário perguntar 'quais as conclusões' ou 'o que você descobriu' etc.",
+                "parameters": {
+                    "type": "OBJECT",
+                    "properties": {},  # Sem parâmetros, pois o histórico já é o input
+                }
+            }
+        ]
+    }
+]
+
+_executor_ferramentas = ThreadPoolExecutor(max_workers=FERRAMENTAS_TRABALHADORES, thread_name_prefix="ferramenta")
+
+
+def executar_ferramenta(func_name: str, func_args: dict, df, estatisticas) -> tuple:
+    """
+    Executa uma ferramenta que apenas lê os dados. Não usa o estado da conversa, então pode rodar em uma
+    thread do pool enquanto outras ferramentas do mesmo passo executam.
+
+    Returns:
+        Uma tupla (saida_texto, imagem), onde imagem é o BytesIO de um gráfico gerado ou None.
+    """
+    if func_name == "perfil_dados":
+        return perfil_dados(df, func_args.get("secao", "tudo")), None
+
+    if func_name == "consulta_estruturada":
+        return consulta_estruturada(df, func_args), None
+
+    if func_name == "consulta_tool":
+        contexto = {"estatisticas": estatisticas} if estatisticas is not None else None
+        return consulta_tool(df, func_args["codigo_python"], contexto), None
+
+    if func_name == "grafico_tool":
+        buffer_ou_erro = grafico_tool(df, func_args.get("tipo_grafico"), func_args.get("colunas"), func_args.get("titulo"))
+        if isinstance(buffer_ou_erro, BytesIO):
+            return "Gráfico gerado com sucesso e salvo em buffer.", buffer_ou_erro
+        return f"Ocorreu um erro ao gerar o gráfico: {buffer_ou_erro}", None
+
+    if func_name == "pontuar_transacoes":
+        return pontuar_transacoes(df, func_args.get("url"), func_args.get("limiares"), func_args.get("top_n", 10)), None
+
+    if func_name == "analisar_conclusoes":
+        tool_output = "Histórico analisado, por favor, gere as conclusões."
+        # O perfil pré-calculado dá às conclusões uma base quantitativa sem novas consultas
+        resumo_perfil = perfil_dados(df, "classes") + "\n\n" + perfil_dados(df, "amount") + "\n\n" + perfil_dados(df, "correlacoes")
+        if not resumo_perfil.startswith("Erro"):
+            tool_output += f" Perfil do dataset para embasar as conclusões:\n{resumo_perfil}"
+        return tool_output, None
+
+    return f"Erro: Ferramenta '{func_name}' desconhecida.", None
+
+
+def _executar_medindo(func_name: str, func_args: dict, df, estatisticas, passo: int) -> tuple:
+    """Executa a ferramenta na thread do pool, dentro de um trecho 'ferramenta', e retorna (saida_texto, imagem, duracao_s)."""
+    with trecho("ferramenta", ferramenta=func_name, passo=passo) as medida:
+        try:
+            saida, imagem = executar_ferramenta(func_name, func_args, df, estatisticas)
+        except Exception as e:
+            saida, imagem = f"Erro ao executar a ferramenta '{func_name}': {e}", None
+            medida.definir(erro=type(e).__name__)
+        medida.definir(caracteres_saida=len(saida))
+    return saida, imagem, medida.duracao_s
+
+
+def _descrever_chamada(func_name: str, func_args: dict) -> str:
+    """Texto do spinner de uma chamada de ferramenta."""
+    if func_name == "consulta_tool":
+        return f"🛠️ Executando consulta: `{func_args.get('codigo_python')}`"
+    if func_name == "consulta_estruturada":
+        return "🧮 Executando consulta estruturada..."
+    if func_name == "grafico_tool":
+        return f"📊 Gerando gráfico: {func_args.get('titulo')}"
+    if func_name == "perfil_dados":
+        return "📋 Consultando o perfil dos dados..."
+    if func_name == "pontuar_transacoes":
+        return "🎯 Pontuando o risco de fraude das transações..."
+    if func_name == "analisar_conclusoes":
+        return "🧠 Analisando conclusões..."
+    return f"🛠️ Executando {func_name}..."
+
+
+class Interface:
+    """
+    Ganchos de exibição usados pela Conversa. A implementação padrão (modo em lote) não exibe nada:
+    avisos e erros vão para o log.
+    """
+
+    def chave_api(self) -> str:
+        return os.environ.get("GEMINI_API_KEY", "")
+
+    def aguardar(self, descricao: str):
+        """Contexto exibido enquanto a conversa espera (ferramentas, cargas)."""
+        return contextlib.nullcontext()
+
+    def modelo(self, aviso: str):
+        """Contexto de uma chamada ao modelo; produz a função que recebe o texto em streaming, ou None."""
+        return contextlib.nullcontext()
+
+    def nova_tentativa(self, tentativa: int, espera: float, motivo: str):
+        print(f"[AVISO] {motivo}. Tentando novamente em {espera:.1f}s (tentativa {tentativa + 1})...")
+
+    def erro(self, mensagem: str):
+        print(f"[AVISO] {mensagem}")
+
+
+class EstadoConversa:
+    """Estado de uma conversa fora do Streamlit (os mesmos atributos que o app guarda em st.session_state)."""
+
+    def __init__(self, df=None, estatisticas=None):
+        self.messages = []
+        self.df = df
+        self.estatisticas = estatisticas
+        self.carga = None
+        self.tool_images = []
+        self.tokens_contexto = None
+        self.latencias_turno = None
+        self.resumo_historico = ResumoHistorico()
+
+
+class Conversa:
+    """
+    Ciclo de conversa do agente sobre um estado (st.session_state ou EstadoConversa). Com 'limite_chamadas'
+    (um semáforo compartilhado entre conversas), as chamadas à API ficam limitadas ao número de vagas.
+    """
+
+    def __init__(self, estado, interface: Interface | None = None, limite_chamadas=None):
+        self.estado = estado
+        self.interface = interface or Interface()
+        self.limite_chamadas = limite_chamadas
+
+    # --- Dados ---
+
+    def instalar_carga(self, esperar: bool = False) -> bool:
+        """
+        Coloca no estado o resultado da carga em segundo plano, se ela terminou (ou, com 'esperar', quando terminar).
+        Retorna True se havia uma carga e ela foi instalada.
+        """
+        carga = getattr(self.estado, "carga", None)
+        if carga is None or not (esperar or carga.concluida):
+            return False
+        self.estado.df, self.estado.estatisticas, _ = carga.resultado()
+        self.estado.carga = None
+        return True
+
+    def aguardar_dados(self):
+        """Espera a carga em andamento, se houver: chamada apenas por quem precisa do DataFrame."""
+        carga = getattr(self.estado, "carga", None)
+        if carga is not None:
+            with self.interface.aguardar(f"⏳ Aguardando a carga de {carga.descricao}..."), trecho("carga.espera"):
+                self.instalar_carga(esperar=True)
+
+    def carregar_dados(self, func_args: dict) -> str:
+        """
+        Executa a ferramenta 'carregar_dados': inicia a carga em segundo plano e espera até ESPERA_CARGA_FERRAMENTA_S.
+        Se ela não terminar nesse prazo, a conversa segue e as ferramentas que usam os dados aguardam a conclusão.
+        """
+        url = func_args.get("url")
+        if not url:
+            return "Erro: URL não fornecida."
+        if func_args.get("anexar"):
+            # A anexação parte do dataset atual: uma carga ainda em andamento precisa terminar antes
+            self.aguardar_dados()
+            if not isinstance(self.estado.df, pd.DataFrame):
+                return "Erro: Não há um DataFrame carregado ao qual anexar os dados. Use 'carregar_dados' sem anexar."
+            carga = CargaDados(f"anexo de '{url}'", carga_anexo, url, self.estado.df, self.estado.estatisticas)
+        else:
+            carga = CargaDados(f"'{url}'", carga_url, url, bool(func_args.get("streaming")))
+        self.estado.carga = carga
+        try:
+            with self.interface.aguardar("⏳ Carregando dados da URL..."):
+                _, _, mensagem = carga.resultado(ESPERA_CARGA_FERRAMENTA_S)
+        except TimeoutError:
+            return (
+                f"A carga de '{url}' continua em segundo plano (acompanhe o progresso na barra lateral). "
+                "As próximas consultas aos dados aguardam automaticamente a sua conclusão."
+            )
+        self.instalar_carga()
+        return mensagem
+
+    # --- Modelo ---
+
+    def chamar_api(self, tools: list | None = None, ao_receber_texto=None, tool_config: dict | None = None) -> dict:
+        """
+        Chama a API do Gemini com o histórico da conversa (backoff exponencial no cliente compartilhado).
+        Com 'ao_receber_texto', usa o endpoint de streaming e repassa cada trecho de texto assim que chega.
+        """
+        api_key = self.interface.chave_api()
+        if not api_key:
+            self.interface.erro("Por favor, insira sua Chave de API Gemini na barra lateral.")
+            return {}
+
+        # Turnos antigos resumidos quando o histórico passa do orçamento de tokens; o resumo acumulado fica no estado
+        history = self.estado.messages
+        resumo = getattr(self.estado, "resumo_historico", None)
+        if resumo is None:
+            resumo = self.estado.resumo_historico = ResumoHistorico()
+        contents = compactar_historico(history, resumo=resumo)
+        tokens_historico = estimar_tokens(history)
+        tokens_enviados = tokens_historico if contents is history else estimar_tokens(contents)
+        self.estado.tokens_contexto = {"historico": tokens_historico, "enviados": tokens_enviados}
+        anotar(tokens_historico=tokens_historico, tokens_enviados=tokens_enviados)
+        if contents is not history:
+            print(f"[INFO] Histórico compactado: ~{tokens_historico} -> ~{tokens_enviados} tokens.")
+        payload = {
+            "contents": contents,
+            "systemInstruction": {"parts": [{"text": SYSTEM_INSTRUCTION}]},
+        }
+        if tools:
+            payload["tools"] = tools
+        if tool_config:
+            payload["toolConfig"] = tool_config
+
+        try:
+            with self._vaga_api():
+                cliente = obter_cliente()
+                if ao_receber_texto is not None:
+                    return cliente.gerar_conteudo_stream(MODEL_NAME, payload, api_key, ao_receber_texto=ao_receber_texto,
+                                                         ao_tentar_novamente=self.interface.nova_tentativa)
+                return cliente.gerar_conteudo(MODEL_NAME, payload, api_key, ao_tentar_novamente=self.interface.nova_tentativa)
+        except ErroGemini as e:
+            self.interface.erro(f"{e} Verifique sua chave ou o formato JSON.")
+            return {}
+
+    @contextlib.contextmanager
+    def _vaga_api(self):
+        """Ocupa uma vaga de 'limite_chamadas' durante a chamada; a espera por uma vaga é medida como trecho."""
+        if self.limite_chamadas is None:
+            yield
+            return
+        with trecho("gemini.fila"):
+            self.limite_chamadas.acquire()
+        try:
+            yield
+        finally:
+            self.limite_chamadas.release()
+
+    # --- Ferramentas ---
+
+    def executar_chamadas(self, chamadas: list, passo: int, etapas: list) -> list:
+        """
+        Executa as chamadas de função de uma resposta do modelo e retorna as partes 'functionResponse', na
+        mesma ordem. Chamadas consecutivas de ferramentas só de leitura rodam em paralelo; 'carregar_dados'
+        roda sozinha e separa os lotes, pois as chamadas seguintes precisam ver o novo DataFrame.
+        """
+        saidas = [None] * len(chamadas)
+        i = 0
+        while i < len(chamadas):
+            func_name = chamadas[i]["name"]
+            func_args = dict(chamadas[i].get("args") or {})
+
+            if func_name not in FERRAMENTAS_PARALELAS:
+                with trecho("ferramenta", ferramenta=func_name, passo=passo) as medida:
+                    if func_name == "carregar_dados":
+                        saidas[i] = self.carregar_dados(func_args)
+                    else:
+                        saidas[i] = f"Erro: Ferramenta '{func_name}' desconhecida."
+                    medida.definir(caracteres_saida=len(saidas[i]))
+                etapas.append({"passo": passo, "etapa": func_name, "duracao_s": medida.duracao_s})
+                i += 1
+                continue
+
+            lote = []
+            while i < len(chamadas) and chamadas[i]["name"] in FERRAMENTAS_PARALELAS:
+                lote.append(i)
+                i += 1
+            # As threads recebem os dados diretamente: st.session_state só é acessível na thread do Streamlit.
+            # Cada uma roda em uma cópia do contexto atual, para que seus trechos entrem no turno em andamento.
+            self.aguardar_dados()
+            df, estatisticas = self.estado.df, self.estado.estatisticas
+            descricao = "\n\n".join(_descrever_chamada(chamadas[j]["name"], chamadas[j].get("args") or {}) for j in lote)
+            with self.interface.aguardar(descricao):
+                futuros = {
+                    j: _executor_ferramentas.submit(contextvars.copy_context().run, _executar_medindo, chamadas[j]["name"],
+                                                    dict(chamadas[j].get("args") or {}), df, estatisticas, passo)
+                    for j in lote
+                }
+                for j, futuro in futuros.items():
+                    saidas[j], imagem, duracao = futuro.result()
+                    if imagem is not None:
+                        self.estado.tool_images.append(imagem)
+                    etapas.append({"passo": passo, "etapa": chamadas[j]["name"], "duracao_s": duracao})
+
+        # Saídas grandes (ex.: df.head(5000)) ficariam no histórico e seriam reenviadas em todas as chamadas seguintes
+        return [
+            {"functionResponse": {"name": chamada["name"], "response": {"output": limitar_saida(saida)}}}
+            for chamada, saida in zip(chamadas, saidas)
+        ]
+
+    # --- Turno ---
+
+    def responder(self, prompt: str, **atributos_turno) -> dict | None:
+        """
+        Gerencia um turno da conversa. O modelo pode pedir várias ferramentas em uma resposta e vários passos
+        por pergunta: o laço continua até uma resposta só com texto ou até esgotar MAX_PASSOS_AGENTE /
+        TEMPO_MAXIMO_TURNO_S, quando a última chamada é feita com as ferramentas desativadas.
+
+        Returns:
+            {"texto", "total_s", "etapas", "recarregar"} (recarregar indica que 'carregar_dados' foi chamada),
+            ou None se o turno falhou: o erro já foi informado à interface e o histórico volta ao que era.
+        """
+        inicio_turno = time.perf_counter()
+        inicio_historico = len(self.estado.messages)
+
+        # 1. Adiciona a nova pergunta ao histórico de chat
+        self.estado.messages.append({"role": "user", "parts": [{"text": prompt}]})
+
+        etapas = []
+        recarregar = False
+        final_text = ""
+        with turno(passos_maximos=MAX_PASSOS_AGENTE, **atributos_turno) as turno_atual:
+            try:
+                for passo in range(1, MAX_PASSOS_AGENTE + 1):
+                    # 2. Chamada ao modelo; no último passo (ou sem tempo) ele precisa responder com texto
+                    esgotado = passo == MAX_PASSOS_AGENTE or time.perf_counter() - inicio_turno > TEMPO_MAXIMO_TURNO_S
+                    aviso = "🧠 Pensando..." if passo == 1 else f"💬 Gerando resposta... (passo {passo})"
+                    with trecho("modelo", passo=passo, ferramentas_desativadas=esgotado) as medida, \
+                            self.interface.modelo(aviso) as ao_receber_texto:
+                        response = self.chamar_api(
+                            DECLARACOES_FERRAMENTAS, ao_receber_texto=ao_receber_texto,
+                            tool_config={"functionCallingConfig": {"mode": "NONE"}} if esgotado else None,
+                        )
+                    etapas.append({"passo": passo, "etapa": "modelo", "duracao_s": medida.duracao_s})
+
+                    # Se a chamada falhou (retornou dicionário vazio), desfaz o turno para o usuário tentar novamente
+                    if not response:
+                        del self.estado.messages[inicio_historico:]
+                        return None
+
+                    # 3. Processa a resposta: texto e/ou chamadas de função (todas as partes, não só a primeira)
+                    content = response["candidates"][0]["content"]
+                    chamadas = [part["functionCall"] for part in content.get("parts", []) if "functionCall" in part]
+                    if not chamadas:
+                        textos = [part["text"] for part in content.get("parts", []) if "text" in part]
+                        final_text = "".join(textos) or "Não recebi uma resposta em texto do modelo. Tente reformular a pergunta."
+                        self.estado.messages.append({"role": "model", "parts": [{"text": final_text}]})
+                        break
+                    if esgotado:
+                        final_text = (
+                            "Não consegui concluir a análise dentro do limite de passos/tempo desta pergunta. "
+                            "Tente dividi-la em perguntas menores."
+                        )
+                        self.estado.messages.append({"role": "model", "parts": [{"text": final_text}]})
+                        break
+
+                    # 4. Executa as ferramentas e devolve todos os resultados ao modelo em uma única mensagem
+                    self.estado.messages.append({"role": "model", "parts": content["parts"]})
+                    self.estado.messages.append({"role": "user", "parts": self.executar_chamadas(chamadas, passo, etapas)})
+                    recarregar = recarregar or any(chamada["name"] == "carregar_dados" for chamada in chamadas)
+
+            except Exception as e:
+                del self.estado.messages[inicio_historico:]
+                self.interface.erro(f"Um erro ocorreu ao processar a resposta da API: {e}. Isso pode indicar um erro de parse do JSON da API.")
+                return None
+
+        total = time.perf_counter() - inicio_turno
+        self.estado.latencias_turno = {"total_s": total, "etapas": etapas, "trechos": turno_atual.como_dict()["trechos"]}
+        print(f"[INFO] Turno concluído em {total:.2f}s: " + ", ".join(
+            f"{etapa['passo']}/{etapa['etapa']}={etapa['duracao_s']:.2f}s" for etapa in etapas
+        ))
+        return {"texto": final_text, "total_s": total, "etapas": etapas, "recarregar": recarregar}
@@ -0,0 +1,278 @@
+"""
+Anexação incremental de novos lotes de transações (ex.: o CSV diário) ao dataset carregado.
+
+O novo arquivo é lido em blocos e conferido contra o esquema do dataset atual (mesmas colunas, valores
+conversíveis para os mesmos tipos). As colunas numéricas ficam em buffers com capacidade de sobra, no
+mesmo layout (colunas, linhas) do cache colunar: o DataFrame da sessão é uma cópia rasa (Copy-on-Write)
+de uma visão das primeiras linhas, e um lote novo é escrito depois delas, sem copiar o que já estava
+carregado (o buffer só é realocado, com folga de FATOR_CAPACIDADE, quando a capacidade acaba). Uma
+versão antiga continua válida: as linhas que ela enxerga nunca são reescritas, e quem a altera no
+lugar recebe uma cópia privada dos blocos alterados.
+
+Os agregados também não são recalculados do zero: a impressão digital do resultado combina a do dataset
+anterior com o hash das linhas novas, e o perfil (contagem por classe, momentos, amostras dos quantis),
+os índices e as estatísticas da leitura em streaming são atualizados só com as linhas novas.
+"""
+import hashlib
+import threading
+import weakref
+
+import numpy as np
+import pandas as pd
+
+from indices import obter_indice, registrar_indice
+from metricas import trecho
+from perfil import agendar_perfil, obter_perfil, perfil_incremental, registrar_perfil
+from tools import (
+    STREAMING_BLOCO_LINHAS, STREAMING_MAX_MB, _fluxo_csv, _memoria_original, _segmentos_por_dtype,
+    impressao_digital, registrar_impressao_digital,
+)
+
+# Folga de capacidade ao (re)alocar os buffers: anexações seguidas custam, em média, só as linhas novas.
+FATOR_CAPACIDADE = 1.5
+
+
+class _BufferColunar:
+    """
+    Colunas numéricas de um dataset em matrizes (colunas, capacidade) por sequência de colunas de mesmo
+    dtype. As 'linhas' primeiras posições estão ocupadas; o restante é a folga para as próximas anexações.
+    """
+
+    def __init__(self, df: pd.DataFrame, capacidade: int):
+        self.colunas = list(df.columns)
+        self.linhas = len(df)
+        self.capacidade = capacidade
+        self.segmentos = []
+        for colunas, dtype in _segmentos_por_dtype(df):
+            matriz = np.empty((len(colunas), capacidade), dtype=dtype)
+            matriz[:, :self.linhas] = df[colunas].to_numpy().T
+            self.segmentos.append((colunas, matriz))
+        self.lock = threading.Lock()
+
+    def escrever(self, novas: pd.DataFrame):
+        """Escreve as linhas novas logo após as ocupadas (a capacidade já deve ter sido verificada)."""
+        fim = self.linhas + len(novas)
+        for colunas, matriz in self.segmentos:
+            matriz[:, self.linhas:fim] = novas[colunas].to_numpy(dtype=matriz.dtype).T
+        self.linhas = fim
+
+    def dataframe(self) -> pd.DataFrame:
+        """
+        DataFrame sobre as linhas ocupadas, sem cópia dos dados. É uma cópia rasa de um DataFrame base montado
+        sobre visões somente leitura dos buffers, como a _copia_da_sessao do cache de dados: como a base continua
+        referenciada (em _buffers), os blocos são compartilhados e o Copy-on-Write copia antes de qualquer
+        alteração no lugar, em vez de tentar escrever nos buffers.
+        """
+        partes = []
+        for colunas, matriz in self.segmentos:
+            valores = matriz[:, :self.linhas].view()
+            valores.flags.writeable = False
+            partes.append(pd.DataFrame(valores.T, columns=colunas, copy=False))
+        base = pd.concat(partes, axis=1)[self.colunas]
+        df = base.copy(deep=False)
+        with _buffers_lock:
+            _buffers[id(df)] = (self, base)
+        weakref.finalize(df, _buffers.pop, id(df), None)
+        return df
+
+    def visto_por(self, df: pd.DataFrame) -> bool:
+        """Se as colunas de 'df' ainda são visões destes buffers (não foram copiadas por uma alteração no lugar)."""
+        return all(
+            np.may_share_memory(df[coluna].to_numpy(), matriz)
+            for colunas, matriz in self.segmentos for coluna in colunas
+        )
+
+
+# id(df) -> (buffer cujas primeiras linhas o DataFrame enxerga, DataFrame base). Cada entrada é removida quando o DataFrame é coletado.
+_buffers = {}
+_buffers_lock = threading.Lock()
+
+
+def _anexar_em_buffer(df: pd.DataFrame, novas: pd.DataFrame) -> tuple:
+    """
+    Escreve as linhas novas depois das de 'df' e retorna (DataFrame resultante, houve_copia). O buffer do
+    próprio 'df' é reaproveitado se ele for a versão mais recente (nenhuma outra anexação escreveu depois
+    das suas linhas), não tiver sido alterado no lugar e tiver capacidade; senão as linhas atuais são copiadas
+    para um buffer novo, com folga.
+    """
+    with _buffers_lock:
+        buffer, _ = _buffers.get(id(df), (None, None))
+    if buffer is not None:
+        with buffer.lock:
+            if buffer.linhas == len(df) and buffer.linhas + len(novas) <= buffer.capacidade and buffer.visto_por(df):
+                buffer.escrever(novas)
+                return buffer.dataframe(), False
+    buffer = _BufferColunar(df, int((len(df) + len(novas)) * FATOR_CAPACIDADE))
+    buffer.escrever(novas)
+    return buffer.dataframe(), True
+
+
+class ErroEsquema(ValueError):
+    """O arquivo anexado não segue o esquema do dataset carregado."""
+
+
+def _dtype_anexado(dtype: np.dtype, serie: pd.Series, coluna: str) -> np.dtype:
+    """
+    Tipo que a coluna precisa ter para receber os valores novos: o atual quando eles cabem nele (floats
+    são convertidos para a precisão da coluna, como na carga compacta); inteiros que recebem valores
+    fora do intervalo, decimais ou ausentes são promovidos.
+    """
+    if pd.api.types.is_bool_dtype(dtype):
+        if not pd.api.types.is_bool_dtype(serie):
+            raise ErroEsquema(f"a coluna '{coluna}' é booleana, mas o arquivo tem valores do tipo {serie.dtype}")
+        return dtype
+    if not pd.api.types.is_numeric_dtype(serie) or pd.api.types.is_bool_dtype(serie):
+        raise ErroEsquema(f"a coluna '{coluna}' é numérica, mas o arquivo tem valores do tipo {serie.dtype}")
+    if dtype.kind == "f":
+        return dtype
+    valores = serie.to_numpy(dtype=np.float64, na_value=np.nan)
+    if not len(valores):
+        return dtype
+    if np.isnan(valores).any() or not np.array_equal(valores, np.floor(valores)):
+        return np.dtype(np.float64)
+    minimo, maximo = int(valores.min()), int(valores.max())
+    limites = np.iinfo(dtype)
+    if limites.min <= minimo and maximo <= limites.max:
+        return dtype
+    return np.result_type(dtype, np.min_scalar_type(minimo), np.min_scalar_type(maximo))
+
+
+def _conferir_esquema(bloco: pd.DataFrame, dtypes: dict) -> pd.DataFrame:
+    """
+    Reordena as colunas do bloco como as do dataset e confere os tipos. 'dtypes' (coluna -> dtype) é
+    atualizado com as promoções necessárias. Colunas não numéricas são mantidas como vieram.
+    """
+    faltando = [c for c in dtypes if c not in bloco.columns]
+    sobrando = [c for c in bloco.columns if c not in dtypes]
+    if faltando or sobrando:
+        detalhes = []
+        if faltando:
+            detalhes.append(f"faltam as colunas {faltando}")
+        if sobrando:
+            detalhes.append(f"sobram as colunas {sobrando}")
+        raise ErroEsquema("; ".join(detalhes))
+    bloco = bloco[list(dtypes)]
+    convertidas = {}
+    for coluna, dtype in dtypes.items():
+        serie = bloco[coluna]
+        if not isinstance(dtype, np.dtype) or dtype.kind not in "biuf":
+            convertidas[coluna] = serie
+            continue
+        dtype = dtypes[coluna] = _dtype_anexado(dtype, serie, coluna)
+        convertidas[coluna] = serie.astype(dtype)
+    return pd.DataFrame(convertidas, index=bloco.index)
+
+
+def _impressao_anexada(impressao_anterior: str, novas: pd.DataFrame) -> str:
+    """Impressão digital do dataset anexado: a do anterior combinada com o hash das linhas novas (com suas posições)."""
+    hash_conteudo = hashlib.sha256(f"{impressao_anterior}+{len(novas)}".encode("utf-8"))
+    hash_conteudo.update(pd.util.hash_pandas_object(novas, index=True).to_numpy().tobytes())
+    return hash_conteudo.hexdigest()[:32]
+
+
+def anexar_dados(df: pd.DataFrame, fonte: str, estatisticas=None, progresso=None,
+                 tamanho_bloco: int = STREAMING_BLOCO_LINHAS, max_bytes: int | None = None):
+    """
+    Anexa as linhas do CSV 'fonte' (URL ou caminho, compactado ou não) ao final de 'df'.
+
+    Args:
+        df: O DataFrame atual (não é alterado).
+        fonte: URL ou caminho do arquivo com o mesmo esquema.
+        estatisticas: EstatisticasIncrementais da leitura em streaming, se houver (é atualizada em uma cópia).
+        progresso: Função opcional chamada como progresso(linhas_lidas, bytes_lidos) após cada bloco.
+        tamanho_bloco: Número de linhas por bloco de leitura.
+        max_bytes: Máximo de bytes lidos da fonte (padrão STREAMING_MAX_MB); um arquivo maior é recusado.
+
+    Returns:
+        Uma tupla (DataFrame anexado, estatisticas atualizadas ou None, linhas anexadas), ou uma string de erro.
+        Em caso de erro nada é alterado.
+    """
+    if not fonte:
+        return "Erro: URL não fornecida."
+    if not isinstance(df, pd.DataFrame) or df.shape[1] == 0:
+        return "Erro: Não há um DataFrame carregado ao qual anexar os dados. Use 'carregar_dados' sem anexar."
+    max_bytes = STREAMING_MAX_MB * 1024 * 1024 if max_bytes is None else max_bytes
+
+    with trecho("anexo_dados", fonte=fonte, linhas_anteriores=len(df)) as atual:
+        try:
+            print(f"[INFO] Anexando dados de: {fonte}")
+            # Perfil e índice do dataset atual (calculados em segundo plano na carga): a base da atualização
+            try:
+                perfil = obter_perfil(df)
+            except TimeoutError:
+                atual.definir(erro="TimeoutError")
+                return ("Erro: o perfil do dataset atual ainda está sendo calculado, e a anexação parte dele. "
+                        "Tente anexar novamente em instantes. Nada foi anexado.")
+            indice = obter_indice(df)
+            # Sem perfil (dataset sem linhas), o do resultado é calculado do zero em segundo plano
+            estatisticas_perfil = perfil["estatisticas"].copiar() if perfil is not None else None
+            ausentes = perfil["ausentes"].copy() if perfil is not None else None
+            estatisticas = estatisticas.copiar() if estatisticas is not None else None
+
+            dtypes = dict(df.dtypes.items())
+            blocos = []
+            linhas_novas = 0
+            with _fluxo_csv(fonte, max_bytes) as (arquivo, contador), \
+                    pd.read_csv(arquivo, chunksize=tamanho_bloco) as leitor:
+                for bloco in leitor:
+                    bloco = _conferir_esquema(bloco, dtypes)
+                    blocos.append(bloco)
+                    linhas_novas += len(bloco)
+                    if progresso:
+                        progresso(linhas_novas, contador.bytes_lidos)
+                    if contador.bytes_lidos >= max_bytes:
+                        raise ErroEsquema(f"o arquivo excede o limite de {max_bytes // (1024 * 1024)} MB")
+                bytes_lidos = contador.bytes_lidos
+            if not linhas_novas:
+                return f"Erro: '{fonte}' não tem linhas para anexar."
+
+            tipos_numericos = {c: t for c, t in dtypes.items() if isinstance(t, np.dtype) and t.kind in "biuf"}
+            promovidas = {c: t for c, t in tipos_numericos.items() if t != df.dtypes[c]}
+            novas = pd.concat(blocos, ignore_index=True).astype(tipos_numericos)
+            del blocos
+            indice_padrao = isinstance(df.index, pd.RangeIndex) and df.index.start == 0 and df.index.step == 1
+            if len(tipos_numericos) == len(dtypes) and not promovidas and indice_padrao:
+                resultado, copiado = _anexar_em_buffer(df, novas)
+            else:
+                # Colunas de texto/categoria, tipos promovidos ou índice próprio não cabem nos buffers: cópia única
+                copiado = True
+                resultado = pd.concat([df.astype(promovidas) if promovidas else df, novas], ignore_index=True)
+            resultado.attrs.update(df.attrs)
+            atual.definir(linhas=linhas_novas, bytes_recebidos=bytes_lidos, copia=copiado)
+
+            anexadas = resultado.iloc[len(df):]
+            if indice_padrao:
+                registrar_impressao_digital(resultado, _impressao_anexada(impressao_digital(df), anexadas))
+            # Perfil, índice e estatísticas da sessão: atualizados só com as linhas novas, bloco a bloco
+            for inicio in range(0, linhas_novas, tamanho_bloco):
+                parte = anexadas.iloc[inicio:inicio + tamanho_bloco]
+                if estatisticas_perfil is not None:
+                    estatisticas_perfil.atualizar(parte)
+                    ausentes = ausentes.add(parte.isna().sum(), fill_value=0).astype(np.int64)
+                if estatisticas is not None:
+                    estatisticas.atualizar(parte)
+            if estatisticas_perfil is not None:
+                registrar_perfil(resultado, perfil_incremental(resultado, estatisticas_perfil, ausentes))
+            else:
+                agendar_perfil(resultado)
+            registrar_indice(resultado, indice.anexar(anexadas))
+
+            if "memoria" in resultado.attrs:
+                memoria = dict(resultado.attrs["memoria"])
+                memoria["antes_mb"] += _memoria_original(novas) / (1024 * 1024)
+                memoria["depois_mb"] = int(resultado.memory_usage(deep=True).sum()) / (1024 * 1024)
+                resultado.attrs["memoria"] = memoria
+            if "streaming" in resultado.attrs:
+                info = dict(resultado.attrs["streaming"])
+                info["linhas_lidas"] += linhas_novas
+                info["linhas_mantidas"] += linhas_novas
+                resultado.attrs["streaming"] = info
+            resultado.attrs["anexos"] = resultado.attrs.get("anexos", []) + [{"fonte": fonte, "linhas": linhas_novas}]
+            print(f"[INFO] {linhas_novas} linhas anexadas ({len(resultado)} no total).")
+            return resultado, estatisticas, linhas_novas
+        except ErroEsquema as e:
+            atual.definir(erro="ErroEsquema")
+            return f"Erro: '{fonte}' não segue o esquema do dataset carregado ({e}). Nada foi anexado."
+        except Exception as e:
+            atual.definir(erro=type(e).__name__)
+            return f"Erro ao anexar dados ({e}). Verifique o link e a acessibilidade."
@@ -1,238 +1,160 @@
 import streamlit as st
 import pandas as pd
-import json
-import time
-import requests
-from io import BytesIO
-from tools import carregar_dados_ou_demo, consulta_tool, grafico_tool, carregar_dados_dinamicamente
+import os
+import contextlib
+from agente import Conversa, Interface
+from consulta_estruturada import estatisticas_cache_consulta_estruturada
+from tools import estatisticas_cache_dados, estatisticas_cache_consultas
+from cargas import CargaDados, carga_inicial
+from gemini_client import obter_cliente
+from metricas import METRICAS_PORTA, iniciar_servidor_metricas
 
 # --- Configurações Iniciais ---
+# O modelo, a instrução do sistema, as ferramentas e os limites de um turno ficam no motor de conversa (agente.py).
 
-# URL da API do Gemini (usada para chamadas não-streaming)
-API_URL = "https://generativelanguage.googleapis.com/v1beta/models/gemini-2.5-flash-preview-05-20:generateContent"
-MODEL_NAME = "gemini-2.5-flash-preview-05-20"
-
-# Instrução do sistema para guiar o agente
-SYSTEM_INSTRUCTION = (
-    "Você é um Agente de Análise de Fraudes especializado em DataFrames pandas. "
-    "Sua função é responder a perguntas usando as ferramentas 'carregar_dados', 'consulta_tool', 'grafico_tool' ou 'analisar_conclusoes'. "
-    "NÃO gere código Python diretamente na resposta; use as ferramentas."
-    "O DataFrame principal é chamado 'df' e contém colunas 'Time', 'V1' a 'V28', 'Amount' e 'Class'. "
-    "Se o usuário fornecer uma URL de um arquivo .csv, ou uma URL para um arquivo CSV compactado (como .zip ou .gz), use a ferramenta 'carregar_dados' com a URL."
-    "Sempre que o usuário pedir análise numérica ou estatística, use 'consulta_tool'. "
-    "Sempre que o usuário pedir visualização (gráfico, histograma, boxplot), use 'grafico_tool'."
-    "Quando o usuário solicitar um resumo, conclusões ou o que foi descoberto, use a ferramenta 'analisar_conclusoes'."
-    "Responda de forma concisa e profissional, em português."
-)
+# Respostas em streaming (streamGenerateContent): o texto aparece no chat à medida que é gerado
+STREAMING_RESPOSTAS = os.environ.get("GEMINI_STREAMING", "1") != "0"
 
-# --- Carregamento de Dados (Cache) ---
-# Inicializamos o DataFrame como None no início da sessão.
-df = None
 
-# Se o DataFrame ainda não foi carregado na sessão, carregue o de demonstração
-if "df" not in st.session_state or st.session_state.df is None:
-    st.session_state.df = carregar_dados_ou_demo()
+class InterfaceStreamlit(Interface):
+    """Ganchos do motor de conversa no Streamlit: spinners, bolha de texto em streaming, avisos e erros na página."""
 
-# --- Funções de Comunicação com a API ---
+    def chave_api(self) -> str:
+        return st.secrets.get("GEMINI_API_KEY", "") or st.session_state.get("api_key_input", "")
 
-def call_gemini_api(history: list, tools: list | None = None) -> dict:
-    """Função central para chamar a API do Gemini com backoff exponencial."""
-    
-    # 1. Obtenção da Chave API
-    api_key = st.secrets.get("GEMINI_API_KEY", "")
-    if not api_key:
-        api_key = st.session_state.get("api_key_input", "")
-    
-    if not api_key:
-        st.error("Por favor, insira sua Chave de API Gemini na barra lateral.")
-        return {}
-        
-    # 2. Construção do Payload
-    payload = {
-        "contents": history,
-        "systemInstruction": {"parts": [{"text": SYSTEM_INSTRUCTION}]},
-    }
-    
-    if tools:
-        payload["tools"] = tools
+    def aguardar(self, descricao: str):
+        return st.spinner(descricao)
 
-    headers = {
-        'Content-Type': 'application/json'
-    }
-
-    # 3. Lógica de Backoff e Requisição
-    max_retries = 5
-    for attempt in range(max_retries):
+    @contextlib.contextmanager
+    def modelo(self, aviso: str):
+        """Chama o modelo em streaming (texto incremental no chat) ou, se desativado, com um spinner."""
+        if not STREAMING_RESPOSTAS:
+            with st.spinner(aviso):
+                yield None
+            return
+        bolha = BolhaStreaming(chat_container, aviso)
         try:
-            # Anexa a chave API diretamente na URL
-            response = requests.post(f"{API_URL}?key={api_key}", headers=headers, data=json.dumps(payload))
-            response.raise_for_status()
-
-            return response.json()
-
-        except requests.exceptions.HTTPError as http_err:
-            st.warning(f"Erro de comunicação com a API: {http_err}. Resposta: {response.text}")
-            if attempt == max_retries - 1:
-                st.error(f"Falha na comunicação com a API após {max_retries} tentativas. Verifique sua chave ou o formato JSON.")
-                return {}
-            time.sleep(2 ** attempt)
-
-        except requests.exceptions.RequestException as req_err:
-            st.warning(f"Erro de conexão: {req_err}. Tentando novamente em {2**attempt}s...")
-            if attempt == max_retries - 1:
-                st.error(f"Falha na conexão com a API após {max_retries} tentativas.")
-                return {}
-            time.sleep(2 ** attempt)
-            
-    return {}
+            yield bolha
+        finally:
+            bolha.finalizar()
 
+    def nova_tentativa(self, tentativa: int, espera: float, motivo: str):
+        st.warning(f"{motivo}. Tentando novamente em {espera:.1f}s (tentativa {tentativa + 1})...")
 
-def run_conversation(prompt: str):
-    """Gerencia o ciclo de conversa, incluindo a chamada de ferramentas."""
-    
-    # 1. Adiciona a nova pergunta ao histórico de chat
-    st.session_state.messages.append({"role": "user", "parts": [{"text": prompt}]})
-
-    # 2. Prepara a lista de ferramentas disponíveis
-    available_tools = [
-        {
-            "functionDeclarations": [
-                {
-                    "name": "carregar_dados",
-                    "description": "Carrega um DataFrame a partir de uma URL de arquivo .csv fornecida. Use esta ferramenta quando o usuário mencionar uma URL de arquivo.",
-                    "parameters": {
-                        "type": "OBJECT",
-                        "properties": {
-                            "url": {"type": "STRING", "description": "A URL pública do arquivo CSV."}
-                        },
-                        "required": ["url"]
-                    }
-                },
-                {
-                    "name": "consulta_tool",
-                    "description": "Executa código Python para consultar o DataFrame 'df' e retorna resultados como string. Use para obter estatísticas, valores, linhas específicas, etc.",
-                    "parameters": {
-                        "type": "OBJECT",
-                        "properties": {
-                            "codigo_python": {"type": "STRING", "description": "O código Python a ser executado no DataFrame 'df'. Ex: df.shape[0]"}
-                        },
-                        "required": ["codigo_python"]
-                    }
-                },
-                {
-                    "name": "grafico_tool",
-                    "description": "Gera um gráfico e retorna a imagem em buffer de memória. Use para histogramas, boxplots, dispersão (scatter) e gráficos de barra.",
-                    "parameters": {
-                        "type": "OBJECT",
-                        "properties": {
-                            "tipo_grafico": {"type": "STRING", "description": "Tipo: 'hist', 'box', 'scatter' ou 'bar'."},
-                            "colunas": {"type": "ARRAY", "items": {"type": "STRING"}, "description": "Lista de 1 ou 2 colunas para o gráfico. Ex: ['Amount']"},
-                            "titulo": {"type": "STRING", "description": "Título descritivo para o gráfico."}
-                        },
-                        "required": ["tipo_grafico", "colunas", "titulo"]
-                    }
-                },
-                {
-                    "name": "analisar_conclusoes",
-                    "description": "Analisa o histórico da conversa e as análises já realizadas para tirar conclusões sobre os dados e gerar um resumo final. Use esta ferramenta quando o usuário perguntar 'quais as conclusões' ou 'o que você descobriu' etc.",
-                    "parameters": {
-                        "type": "OBJECT",
-                        "properties": {},  # Sem parâmetros, pois o histórico já é o input
-                    }
-                }
-            ]
-        }
-    ]
-
-    # 3. Primeira chamada: Envia a pergunta e o histórico para ver se o modelo usa a ferramenta
-    with st.spinner("🧠 Pensando... (Primeira Chamada)"):
-        response_1 = call_gemini_api(st.session_state.messages, tools=available_tools)
-    
-    # Se a primeira chamada falhou (retornou dicionário vazio)
-    if not response_1:
-        st.session_state.messages.pop() # Remove a última mensagem do usuário para tentar novamente
+    def erro(self, mensagem: str):
+        st.error(mensagem)
+
+
+# --- Carregamento de Dados (Cache) ---
+# O estado da conversa (histórico, DataFrame, carga em andamento) fica em st.session_state.
+conversa = Conversa(st.session_state, InterfaceStreamlit())
+
+# Se o DataFrame ainda não foi carregado na sessão, a carga do dataset padrão começa em segundo plano: a página
+# e o chat ficam disponíveis enquanto ela roda. O DataFrame vem do cache compartilhado do processo, e o perfil e os
+# índices são calculados em seguida, também em segundo plano (uma vez por conteúdo, compartilhados entre sessões).
+if st.session_state.get("df") is None and st.session_state.get("carga") is None:
+    st.session_state.df = None
+    st.session_state.carga = CargaDados("dataset padrão", carga_inicial)
+conversa.instalar_carga()
+# Agregados globais da última leitura em streaming (None quando o DataFrame foi carregado inteiro)
+if "estatisticas" not in st.session_state:
+    st.session_state.estatisticas = None
+
+# --- Exibição ---
+
+class BolhaStreaming:
+    """
+    Mostra um aviso de espera e, no primeiro trecho de texto recebido, troca-o por uma bolha do assistente
+    que é atualizada a cada novo trecho. Chamadas de função não criam bolha.
+    """
+
+    def __init__(self, container, aviso: str):
+        self.container = container
+        self.texto = ""
+        self._espaco = None
+        with self.container:
+            self._aviso = st.empty()
+            self._aviso.caption(aviso)
+
+    def __call__(self, trecho: str):
+        if self._espaco is None:
+            self._aviso.empty()
+            with self.container:
+                with st.chat_message("assistant"):
+                    self._espaco = st.empty()
+        self.texto += trecho
+        self._espaco.markdown(self.texto + "▌")
+
+    def finalizar(self):
+        """Remove o cursor da bolha (ou o aviso, se nenhum texto chegou)."""
+        self._aviso.empty()
+        if self._espaco is not None:
+            self._espaco.markdown(self.texto)
+
+
+def _exibir_resultado():
+    """
+    Exibe a resposta final. Sem streaming, a página é recarregada para mostrar o histórico; com streaming o
+    texto já está na tela e só os gráficos (se houver) são exibidos, sem recarregar a página inteira.
+    """
+    if not STREAMING_RESPOSTAS:
+        st.rerun() # FORÇA O RERUN PARA EXIBIR A RESPOSTA IMEDIATAMENTE!
+    if st.session_state.tool_images:
+        with chat_container:
+            with st.chat_message("assistant"):
+                st.image(st.session_state.tool_images, caption=["Resultado da Visualização de Dados"] * len(st.session_state.tool_images), use_container_width=True)
+        st.session_state.tool_images = []
+
+
+def exibir_latencias(espaco):
+    """
+    Mostra, no espaço indicado, quanto tempo cada passo do último turno levou (modelo e ferramentas) e,
+    com o rastreamento detalhado ativado na barra lateral, todos os trechos medidos com seus atributos.
+    """
+    latencias = st.session_state.get("latencias_turno")
+    if not latencias or not latencias["etapas"]:
+        espaco.empty()
         return
-        
-    # 4. Processa a resposta (Texto ou Chamada de Função)
-    try:
-        candidate = response_1["candidates"][0]
-        
-        # 4.1. Se o modelo chamou uma função (Function Call)
-        if candidate["content"]["parts"] and "functionCall" in candidate["content"]["parts"][0]:
-            function_call = candidate["content"]["parts"][0]["functionCall"]
-            func_name = function_call["name"]
-            func_args = dict(function_call["args"])
-            
-            # Adiciona a chamada de função ao histórico
-            st.session_state.messages.append(candidate["content"])
+    with espaco.container():
+        passos = max(etapa["passo"] for etapa in latencias["etapas"])
+        st.caption(f"⏱️ Último turno: {latencias['total_s']:.2f}s em {passos} passo(s).")
+        st.dataframe(pd.DataFrame(latencias["etapas"]).round({"duracao_s": 3}), hide_index=True)
+        if st.session_state.get("rastreamento_detalhado") and latencias.get("trechos"):
+            st.caption("Trechos do último turno (início relativo ao começo do turno):")
+            st.dataframe(pd.DataFrame(latencias["trechos"]).round({"inicio_s": 3, "duracao_s": 3}), hide_index=True)
+
+
+@st.fragment(run_every=1.0)
+def painel_carga():
+    """Progresso da carga em segundo plano, atualizado sozinho; quando ela termina, a página é recarregada com os dados."""
+    carga = st.session_state.get("carga")
+    if carga is None:
+        return
+    if carga.concluida:
+        st.rerun()
+    texto = f"⏳ Carregando {carga.descricao}... ({carga.segundos:.0f}s)"
+    if carga.linhas_lidas:
+        texto += f" {carga.linhas_lidas:,} linhas lidas ({carga.bytes_lidos / (1024 * 1024):.0f} MB)."
+    st.info(texto)
 
-            # Executa a função localmente
-            tool_output = "Erro: Ferramenta não executada."
-            
-            # --- Bloco da ferramenta 'carregar_dados' ---
-            if func_name == "carregar_dados":
-                with st.spinner("⏳ Carregando dados da URL..."):
-                    url = func_args.get("url")
-                    st.session_state.df = carregar_dados_dinamicamente(url) # Carrega o novo DataFrame
-                    if isinstance(st.session_state.df, pd.DataFrame):
-                        tool_output = f"Dados carregados com sucesso! Linhas: {st.session_state.df.shape[0]}, Colunas: {st.session_state.df.shape[1]}."
-                    else:
-                        tool_output = st.session_state.df # É uma string de erro
-            # --- Fim do bloco ---
-            
-            elif func_name == "consulta_tool":
-                with st.spinner(f"🛠️ Executando consulta: `{func_args.get('codigo_python')}`"):
-                    tool_output = consulta_tool(st.session_state.df, func_args["codigo_python"])
-                
-            elif func_name == "grafico_tool":
-                with st.spinner(f"📊 Gerando gráfico: {func_args.get('titulo')}"):
-                    buffer_ou_erro = grafico_tool(st.session_state.df, func_args.get("tipo_grafico"), func_args.get("colunas"), func_args.get("titulo"))
-                
-                if isinstance(buffer_ou_erro, BytesIO):
-                    st.session_state.tool_image = buffer_ou_erro
-                    tool_output = "Gráfico gerado com sucesso e salvo em buffer."
-                else:
-                    tool_output = f"Ocorreu um erro ao gerar o gráfico: {buffer_ou_erro}"
-            
-            elif func_name == "analisar_conclusoes":
-                with st.spinner("🧠 Analisando conclusões..."):
-                    tool_output = "Histórico analisado, por favor, gere as conclusões."
-            
-            # Adiciona o resultado da ferramenta ao histórico
-            tool_result_part = {
-                "functionResponse": {
-                    "name": func_name,
-                    "response": {"output": tool_output}
-                }
-            }
-            st.session_state.messages.append({"role": "user", "parts": [tool_result_part]})
-
-            # Segunda chamada: Envia o resultado da ferramenta para o modelo gerar o texto final
-            with st.spinner("💬 Gerando resposta final... (Segunda Chamada)"):
-                response_2 = call_gemini_api(st.session_state.messages, tools=available_tools)
-            
-            if not response_2:
-                st.session_state.messages.pop() # Remove a mensagem de resultado da ferramenta
-                st.session_state.messages.pop() # Remove a mensagem de chamada da ferramenta
-                st.session_state.messages.pop() # Remove a mensagem original do usuário
-                return
-                
-            # Extrai a resposta final do modelo
-            final_text = response_2["candidates"][0]["content"]["parts"][0]["text"]
-            
-            # Adiciona a resposta final ao histórico e à interface
-            st.session_state.messages.append({"role": "model", "parts": [{"text": final_text}]})
-            st.rerun() # FORÇA O RERUN PARA EXIBIR A RESPOSTA IMEDIATAMENTE!
-            
-        # 4.2. Se o modelo respondeu diretamente com texto
-        else:
-            final_text = candidate["content"]["parts"][0]["text"]
-            st.session_state.messages.append({"role": "model", "parts": [{"text": final_text}]})
-            st.rerun() # FORÇA O RERUN PARA EXIBIR A RESPOSTA IMEDIATAMENTE!
 
-    except Exception as e:
-        st.error(f"Um erro ocorreu ao processar a resposta da API: {e}. Isso pode indicar um erro de parse do JSON da API.")
+@st.cache_resource
+def _servidor_metricas():
+    """Endpoint /metrics do Prometheus (METRICAS_PORTA), iniciado uma vez por processo."""
+    return iniciar_servidor_metricas(METRICAS_PORTA)
+
+
+def run_conversation(prompt: str):
+    """Executa um turno da conversa (ver Conversa.responder) e atualiza a página com o resultado."""
+    resultado = conversa.responder(prompt, streaming=STREAMING_RESPOSTAS)
+    if resultado is None:
         return
+    exibir_latencias(painel_latencias)
+
+    if resultado["recarregar"]:
+        st.rerun() # O status dos dados na barra lateral precisa refletir o novo DataFrame
+    _exibir_resultado()
+
 
 # --- Interface do Streamlit ---
 
@@ -245,8 +167,8 @@ st.markdown("---")
 # 1. Inicialização do Histórico e Imagem Temporária
 if "messages" not in st.session_state:
     st.session_state.messages = []
-if "tool_image" not in st.session_state:
-    st.session_state.tool_image = None
+if "tool_images" not in st.session_state:
+    st.session_state.tool_images = []
 if "api_key_input" not in st.session_state:
     st.session_state.api_key_input = ""
 
@@ -266,7 +188,13 @@ with st.sidebar:
     is_df_loaded = "df" in st.session_state and st.session_state.df is not None
     is_valid_df = is_df_loaded and isinstance(st.session_state.df, pd.DataFrame)
     
-    if not is_valid_df:
+    # Carga em segundo plano: o chat já pode ser usado; as consultas aos dados aguardam a conclusão
+    if st.session_state.get("carga") is not None:
+        painel_carga()
+
+    if not is_df_loaded and st.session_state.get("carga") is not None:
+        st.caption("O chat já pode ser usado: as consultas aos dados aguardam o fim da carga.")
+    elif not is_valid_df:
         st.error("Nenhum DataFrame válido carregado.")
         
         # Se houve uma tentativa de carregamento que resultou em string de erro, exiba a mensagem:
@@ -283,10 +211,79 @@ with st.sidebar:
     else:
         st.success(f"Dados Carregados com Sucesso! (Linhas: {st.session_state.df.shape[0]} | Colunas: {st.session_state.df.shape[1]})")
 
+    # Memória antes/depois da carga com tipos compactos (registrada pelo carregador em df.attrs)
+    if is_valid_df and "memoria" in st.session_state.df.attrs:
+        memoria = st.session_state.df.attrs["memoria"]
+        modo = "esquema de fraudes" if memoria["modo"] == "esquema" else "redução automática"
+        st.caption(f"Memória: {memoria['antes_mb']:.1f} MB → {memoria['depois_mb']:.1f} MB (tipos compactos, {modo}).")
+    if is_valid_df and "streaming" in st.session_state.df.attrs:
+        info = st.session_state.df.attrs["streaming"]
+        st.caption(f"Leitura em streaming: {info['linhas_lidas']:,} linhas lidas, {info['linhas_mantidas']:,} em memória.")
+    if is_valid_df and "anexos" in st.session_state.df.attrs:
+        anexos = st.session_state.df.attrs["anexos"]
+        st.caption(f"Anexos: {len(anexos)} lote(s), +{sum(a['linhas'] for a in anexos):,} linhas.")
+
+    cache_info = estatisticas_cache_dados()
+    st.caption(f"Cache compartilhado: {len(cache_info['entradas'])} fonte(s), {cache_info['memoria_mb']:.1f} de {cache_info['limite_mb']} MB.")
+    cache_consultas = estatisticas_cache_consultas()
+    st.caption(f"Cache de consultas: {cache_consultas['acertos']} acerto(s), {cache_consultas['falhas']} falha(s), {cache_consultas['entradas']} resultado(s).")
+    cache_estruturada = estatisticas_cache_consulta_estruturada()
+    st.caption(f"Consultas estruturadas: {cache_estruturada['planos']} plano(s) em cache, {cache_estruturada['acertos']} acerto(s) e "
+               f"{cache_estruturada['falhas']} falha(s) no cache de resultados.")
+
+    cliente_gemini = obter_cliente()
+    if cliente_gemini.gravacao is not None:
+        st.caption(f"Gemini em modo '{cliente_gemini.gravacao.modo}': {cliente_gemini.gravacao.caminho}")
+    if cliente_gemini.cache is not None:
+        cache_respostas = cliente_gemini.cache.estatisticas()
+        st.caption(f"Cache de respostas do Gemini: {cache_respostas['acertos']} acerto(s), {cache_respostas['falhas']} falha(s).")
+    if "tokens_contexto" in st.session_state:
+        tokens = st.session_state.tokens_contexto
+        st.caption(f"Contexto da última chamada: ~{tokens['enviados']:,} tokens enviados (histórico completo: ~{tokens['historico']:,}).")
+
+    # Tempo de cada passo do último turno (atualizado ao fim de cada turno, mesmo sem recarregar a página)
+    st.checkbox("Rastreamento detalhado", key="rastreamento_detalhado",
+                help="Mostra todos os trechos medidos no último turno: chamadas ao Gemini, esperas, ferramentas e cargas.")
+    if METRICAS_PORTA:
+        _servidor_metricas()
+    painel_latencias = st.empty()
+    exibir_latencias(painel_latencias)
+
+def mensagem_boas_vindas() -> str:
+    """Mensagem de boas-vindas descrevendo os dados da sessão no momento em que é chamada."""
+    df = st.session_state.get("df")
+    if st.session_state.get("carga") is not None:
+        origem = "**Estou carregando o dataset padrão; você já pode perguntar enquanto isso.**"
+    elif not isinstance(df, pd.DataFrame):
+        origem = "**Não consegui carregar o dataset padrão.**"
+    elif df.shape[0] < 1000:
+        origem = "**Uso dados de arquivo csv de demonstração.**"
+    else:
+        origem = "**Uso dados do arquivo `creditcard.csv`.**"
+
+    # Mensagens formatadas com backticks para a URL
+    return f"""Olá! Eu sou um agente desenvolvido por Marcos para o desafio I2A2.
+
+{origem}
+
+Se quiser outro arquivo, me informe o caminho. Veja exemplos de instruções
+
+Instrução direta: Carregue e analise o arquivo CSV deste link: `https://seusite.com/dados.csv`
+
+Comando explícito: Use esta URL para os dados: `https://servidor.net/fraudes_junho.csv`
+
+Contextualizado: Quero analisar os dados de fraude de junho. O arquivo está aqui: `https://cloud.storage/fraudes.csv`"""
+
+
 # 3. Exibição do Histórico de Chat
 chat_container = st.container()
 
 with chat_container:
+    # Durante a carga inicial, a boas-vindas é exibida a partir do estado atual, sem entrar no histórico
+    if not st.session_state.messages and st.session_state.get("carga") is not None:
+        with st.chat_message("assistant"):
+            st.markdown(mensagem_boas_vindas())
+
     # Itera sobre o histórico de mensagens para exibição
     for message in st.session_state.messages:
         role = "assistant" if message["role"] == "model" else "user"
@@ -300,17 +297,17 @@ with chat_container:
             with st.chat_message(role):
                 st.markdown(message["parts"][0]["text"])
 
-    # Exibe o gráfico gerado pela ferramenta, se houver
-    if st.session_state.tool_image:
+    # Exibe os gráficos gerados pelas ferramentas, se houver
+    if st.session_state.tool_images:
         with st.chat_message("assistant"):
-            st.image(st.session_state.tool_image, caption="Resultado da Visualização de Dados", use_container_width=True)
-        st.session_state.tool_image = None # Limpa a imagem após exibição
+            st.image(st.session_state.tool_images, caption=["Resultado da Visualização de Dados"] * len(st.session_state.tool_images), use_container_width=True)
+        st.session_state.tool_images = [] # Limpa as imagens após exibição
 
 
 # 4. Input de Chat
 if prompt := st.chat_input("Pergunte sobre os dados (ex: 'Qual a média do Amount?')"):
-    # Limpa a imagem anterior antes de processar a nova pergunta
-    st.session_state.tool_image = None 
+    # Limpa as imagens anteriores antes de processar a nova pergunta
+    st.session_state.tool_images = []
     
     with chat_container:
         with st.chat_message("user"):
@@ -319,35 +316,8 @@ if prompt := st.chat_input("Pergunte sobre os dados (ex: 'Qual a média do Amoun
     # Inicia a conversa e o processamento de ferramentas
     run_conversation(prompt)
 
-# 5. Adiciona o primeiro prompt de boas-vindas se o histórico estiver vazio
-if not st.session_state.messages:
-    is_demo_df = st.session_state.df is not None and isinstance(st.session_state.df, pd.DataFrame) and st.session_state.df.shape[0] < 1000
-    
-    # Mensagens formatadas com backticks para a URL
-    if is_demo_df:
-        welcome_message = """Olá! Eu sou um agente desenvolvido por Marcos para o desafio I2A2.
-
-**Uso dados de arquivo csv de demonstração.**
-
-Se quiser outro arquivo, me informe o caminho. Veja exemplos de instruções
-
-Instrução direta: Carregue e analise o arquivo CSV deste link: `https://seusite.com/dados.csv`
-
-Comando explícito: Use esta URL para os dados: `https://servidor.net/fraudes_junho.csv`
-
-Contextualizado: Quero analisar os dados de fraude de junho. O arquivo está aqui: `https://cloud.storage/fraudes.csv`"""        
-    else:
-        welcome_message = """Olá! Eu sou um agente desenvolvido por Marcos para o desafio I2A2.
-
-**Uso dados do arquivo `creditcard.csv`.**
-
-Se quiser outro arquivo, me informe o caminho. Veja exemplos de instruções
-
-Instrução direta: Carregue e analise o arquivo CSV deste link: `https://seusite.com/dados.csv`
-
-Comando explícito: Use esta URL para os dados: `https://servidor.net/fraudes_junho.csv`
-
-Contextualizado: Quero analisar os dados de fraude de junho. O arquivo está aqui: `https://cloud.storage/fraudes.csv`"""
- 
-    st.session_state.messages.append({"role": "model", "parts": [{"text": welcome_message}]})
+# 5. Adiciona o primeiro prompt de boas-vindas se o histórico estiver vazio. Ele descreve os dados carregados,
+# então só entra no histórico depois que a carga em segundo plano termina (o fragmento de progresso recarrega a página).
+if not st.session_state.messages and st.session_state.get("carga") is None:
+    st.session_state.messages.append({"role": "model", "parts": [{"text": mensagem_boas_vindas()}]})
     st.rerun() # Reinicia para mostrar a mensagem de boas-vindas
@@ -0,0 +1,557 @@
+"""
+Benchmarks de desempenho do Agente de Análise de Fraudes.
+
+Uso:
+    python benchmarks.py cache_colunar [--arquivo data/creditcard.csv] [--repeticoes 5]
+    python benchmarks.py graficos [--linhas 284807] [--repeticoes 3]
+    python benchmarks.py cliente_gemini [--turnos 50] [--latencia 0]
+    python benchmarks.py streaming [--repeticoes 10] [--latencia-fragmento 0.02]
+    python benchmarks.py contexto [--turnos 40]
+    python benchmarks.py gerar_dados saida.csv[.gz] [--linhas 1000000]
+    python benchmarks.py suite [--linhas 10000 100000 1000000] [--saida resultados.json]
+
+A suíte completa gera datasets sintéticos no formato do creditcard.csv, mede carga (tempo e pico de
+memória), consultas, gráficos e turnos completos do app contra o servidor local de mock_gemini.py, e
+grava tudo em JSON para comparar versões.
+"""
+import argparse
+import gzip
+import json
+import multiprocessing as mp
+import os
+import platform
+import shutil
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+
+import numpy as np
+import pandas as pd
+import requests
+
+try:
+    import resource
+except ImportError:  # Windows: sem medição de pico de memória
+    resource = None
+
+import gemini_client
+import tools
+from contexto import ResumoHistorico, compactar_historico, limitar_saida
+from gemini_client import ClienteGemini
+from mock_gemini import iniciar_servidor_mock
+
+# Gráficos medidos no benchmark de renderização: (tipo_grafico, colunas).
+GRAFICOS_BENCHMARK = [
+    ("hist", ["Amount"]),
+    ("box", ["Amount"]),
+    ("scatter", ["V1", "V2"]),
+    ("line", ["Time", "Amount"]),
+    ("area", ["Time", "Amount"]),
+]
+
+# Consultas padrão medidas na suíte (mesmo estilo do código gerado pelo modelo para a consulta_tool).
+CONSULTAS_BENCHMARK = [
+    "df.shape",
+    "df['Amount'].mean()",
+    "df['Class'].value_counts()",
+    "df.groupby('Class')['Amount'].describe()",
+    "df[df['Class'] == 1]['Amount'].quantile([0.5, 0.9, 0.99])",
+    "df.corr()['Class'].sort_values()",
+    "df.describe()",
+]
+
+# Perguntas dos turnos completos medidos contra o servidor simulado (ver mock_gemini.resposta_simulada).
+PERGUNTAS_BENCHMARK = [
+    "Olá, o que você pode fazer?",
+    "Qual a média de Amount?",
+    "Mostre o perfil de desbalanceamento das classes",
+    "Faça um gráfico da distribuição de Amount",
+    "Compare a média de Amount, o perfil e faça um gráfico",
+]
+
+# Tamanho dos blocos ao gravar datasets sintéticos grandes (linhas).
+BLOCO_GERACAO = 500_000
+
+
+def _dataframe_sintetico(linhas: int, semente: int = 0) -> pd.DataFrame:
+    """DataFrame no formato do creditcard.csv (Time, V1–V28, Amount, Class) com ~0,17% de fraudes."""
+    rng = np.random.default_rng(semente)
+    dados = {"Time": rng.integers(0, 172_800, linhas).astype(np.float64)}
+    for i in range(1, 29):
+        dados[f"V{i}"] = rng.standard_normal(linhas)
+    dados["Amount"] = np.round(rng.exponential(88.0, linhas), 2)
+    dados["Class"] = (rng.random(linhas) < 0.0017).astype(np.int64)
+    return pd.DataFrame(dados)
+
+
+def gerar_csv_sintetico(caminho: str, linhas: int, semente: int = 0) -> str:
+    """
+    Grava um CSV sintético no formato do creditcard.csv em blocos de BLOCO_GERACAO linhas (10M de linhas
+    não precisam caber em memória). Caminhos terminados em .gz são gravados comprimidos.
+    """
+    abrir = gzip.open if caminho.endswith(".gz") else open
+    with abrir(caminho, "wt", encoding="utf-8", newline="") as arquivo:
+        for indice, inicio in enumerate(range(0, linhas, BLOCO_GERACAO)):
+            bloco = _dataframe_sintetico(min(BLOCO_GERACAO, linhas - inicio), semente + indice)
+            bloco.to_csv(arquivo, header=indice == 0, index=False)
+    return caminho
+
+
+def _pico_memoria_mb() -> float | None:
+    """Pico de memória residente (RSS) do processo atual, em MB."""
+    try:
+        # No Linux o ru_maxrss sobrevive ao exec (herda o pico do processo pai); o VmHWM não
+        with open("/proc/self/status") as status:
+            for linha in status:
+                if linha.startswith("VmHWM:"):
+                    return int(linha.split()[1]) / 1024
+    except OSError:
+        pass
+    if resource is None:
+        return None
+    pico = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # Linux informa em KB, macOS em bytes
+    return pico / (1024 * 1024) if sys.platform == "darwin" else pico / 1024
+
+
+def _carga_em_processo(caminho: str, fila):
+    """Executado em um processo novo: mede a carga isolada, sem memória herdada de outras etapas."""
+    memoria_inicial = _pico_memoria_mb()
+    inicio = time.perf_counter()
+    df = tools.carregar_dados_dinamicamente(caminho)
+    duracao = time.perf_counter() - inicio
+    if isinstance(df, str):
+        fila.put({"erro": df})
+        return
+    fila.put({
+        "carga_s": duracao,
+        "linhas": int(df.shape[0]),
+        "pico_rss_mb": _pico_memoria_mb(),
+        "rss_antes_mb": memoria_inicial,
+        "memoria_df_mb": float(df.memory_usage(deep=True).sum() / (1024 * 1024)),
+    })
+
+
+def benchmark_carga(caminho: str) -> dict:
+    """
+    Tempo e pico de memória de carregar_dados_dinamicamente, cada medição em um processo novo:
+    a frio (sem cache colunar, parse do CSV) e a quente (cache colunar já gravado em disco).
+    """
+    tools._remover_cache_colunar(caminho, tools._versao_fonte(caminho))
+    contexto_mp = mp.get_context("spawn")
+    resultado = {"arquivo": caminho, "tamanho_arquivo_mb": os.path.getsize(caminho) / (1024 * 1024)}
+    for modo in ("fria", "quente"):
+        fila = contexto_mp.Queue()
+        processo = contexto_mp.Process(target=_carga_em_processo, args=(caminho, fila))
+        processo.start()
+        medicao = fila.get()
+        processo.join()
+        resultado[modo] = medicao
+    return resultado
+
+
+def benchmark_consultas(df: pd.DataFrame, repeticoes: int = 3) -> dict:
+    """
+    Latência da consulta_tool para o conjunto CONSULTAS_BENCHMARK: execução (cache de resultados vazio)
+    e acerto no cache. A primeira consulta, que inclui publicar o DataFrame para o pool, é medida à parte.
+    """
+    tools._cache_consultas.clear()
+    inicio = time.perf_counter()
+    tools.consulta_tool(df, "len(df)")
+    resultado = {"primeira_consulta_s": time.perf_counter() - inicio, "consultas": []}
+
+    for codigo in CONSULTAS_BENCHMARK:
+        execucoes, acertos = [], []
+        for _ in range(repeticoes):
+            tools._cache_consultas.clear()
+            inicio = time.perf_counter()
+            saida = tools.consulta_tool(df, codigo)
+            execucoes.append(time.perf_counter() - inicio)
+            inicio = time.perf_counter()
+            tools.consulta_tool(df, codigo)
+            acertos.append(time.perf_counter() - inicio)
+        resultado["consultas"].append({
+            "codigo": codigo,
+            "execucao_s": statistics.median(execucoes),
+            "cache_s": statistics.median(acertos),
+            "erro": saida if saida.startswith("Erro") else None,
+        })
+    resultado["pico_rss_mb"] = _pico_memoria_mb()
+    return resultado
+
+
+def benchmark_graficos_suite(df: pd.DataFrame, repeticoes: int = 3) -> list:
+    """Tempo de renderização de cada tipo de gráfico com a configuração padrão e o acerto no cache do grafico_tool."""
+    resultados = []
+    for tipo_grafico, colunas in GRAFICOS_BENCHMARK:
+        tempos = []
+        for _ in range(repeticoes):
+            inicio = time.perf_counter()
+            imagem = tools._renderizar_grafico(df, tipo_grafico, colunas, "Benchmark")
+            tempos.append(time.perf_counter() - inicio)
+        tools.grafico_tool(df, tipo_grafico, colunas, "Benchmark")
+        inicio = time.perf_counter()
+        tools.grafico_tool(df, tipo_grafico, colunas, "Benchmark")
+        resultados.append({
+            "tipo_grafico": tipo_grafico,
+            "colunas": colunas,
+            "renderizacao_s": statistics.median(tempos),
+            "cache_s": time.perf_counter() - inicio,
+            "bytes": len(imagem) if not isinstance(imagem, str) else None,
+            "erro": imagem if isinstance(imagem, str) else None,
+        })
+    return resultados
+
+
+def benchmark_turnos(df: pd.DataFrame, latencia: float = 0.0, latencia_fragmento: float = 0.0) -> list:
+    """
+    Turnos completos do app (run_conversation: chamadas ao modelo, ferramentas e renderização do Streamlit)
+    contra o servidor simulado, com o script executado pelo AppTest do Streamlit.
+    """
+    from streamlit.testing.v1 import AppTest
+
+    servidor, base_url = iniciar_servidor_mock(latencia=latencia, latencia_fragmento=latencia_fragmento)
+    # O app usa o cliente compartilhado do processo: aponta-o para o servidor simulado, sem cache nem gravação
+    configuracao = {"GEMINI_BASE_URL": base_url, "GEMINI_MODO": "", "GEMINI_CACHE_RESPOSTAS": False}
+    anteriores = {nome: getattr(gemini_client, nome) for nome in configuracao}
+    for nome, valor in configuracao.items():
+        setattr(gemini_client, nome, valor)
+    # O AppTest substitui sys.modules["__main__"] pelo script do app, o que quebraria o spawn das etapas seguintes
+    principal = sys.modules["__main__"]
+    resultados = []
+    try:
+        app = AppTest.from_file(os.path.join(os.path.dirname(os.path.abspath(__file__)), "app.py"), default_timeout=600)
+        app.secrets["GEMINI_API_KEY"] = "benchmark"
+        app.session_state.df = df
+        app.run()
+        for pergunta in PERGUNTAS_BENCHMARK:
+            inicio = time.perf_counter()
+            app.chat_input[0].set_value(pergunta).run()
+            duracao = time.perf_counter() - inicio
+            turno = app.session_state.latencias_turno if "latencias_turno" in app.session_state else {"etapas": []}
+            resultados.append({
+                "pergunta": pergunta,
+                "turno_s": duracao,
+                "etapas": turno["etapas"],
+                "erro": app.exception[0].message if len(app.exception) else None,
+            })
+    finally:
+        sys.modules["__main__"] = principal
+        servidor.shutdown()
+        for nome, valor in anteriores.items():
+            setattr(gemini_client, nome, valor)
+    return resultados
+
+
+def _metadados() -> dict:
+    """Versão do código e do ambiente, para comparar resultados entre versões."""
+    try:
+        commit = subprocess.run(["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True,
+                                cwd=os.path.dirname(os.path.abspath(__file__)), timeout=10).stdout.strip() or None
+    except (OSError, subprocess.SubprocessError):
+        commit = None
+    return {
+        "commit": commit,
+        "data": time.strftime("%Y-%m-%dT%H:%M:%S%z"),
+        "python": platform.python_version(),
+        "pandas": pd.__version__,
+        "numpy": np.__version__,
+        "plataforma": platform.platform(),
+        "cpus": os.cpu_count(),
+    }
+
+
+def benchmark_suite(tamanhos: list, repeticoes: int = 3, turnos: bool = True, diretorio: str | None = None) -> dict:
+    """
+    Executa a suíte completa para cada tamanho de dataset sintético.
+
+    Args:
+        tamanhos: Números de linhas dos datasets gerados (ex.: [10_000, 1_000_000, 10_000_000]).
+        repeticoes: Repetições de cada medição de consulta/gráfico (vale a mediana).
+        turnos: Se verdadeiro, mede também turnos completos do app contra o servidor simulado.
+        diretorio: Onde gravar os CSVs gerados (padrão: diretório temporário removido ao final).
+    """
+    temporario = diretorio is None
+    diretorio = diretorio or tempfile.mkdtemp(prefix="benchmark-")
+    resultado = {"metadados": _metadados(), "resultados": []}
+    try:
+        for linhas in tamanhos:
+            print(f"[INFO] Benchmark com {linhas:,} linhas...", file=sys.stderr)
+            caminho = os.path.join(diretorio, f"creditcard_{linhas}.csv")
+            inicio = time.perf_counter()
+            gerar_csv_sintetico(caminho, linhas)
+            medicoes = {"linhas": linhas, "geracao_s": time.perf_counter() - inicio}
+            medicoes["carga"] = benchmark_carga(caminho)
+
+            df = tools.carregar_dados_dinamicamente(caminho)
+            medicoes["consultas"] = benchmark_consultas(df, repeticoes)
+            medicoes["graficos"] = benchmark_graficos_suite(df, repeticoes)
+            if turnos:
+                medicoes["turnos"] = benchmark_turnos(df)
+            resultado["resultados"].append(medicoes)
+            tools._remover_cache_colunar(caminho, tools._versao_fonte(caminho))
+    finally:
+        if temporario:
+            shutil.rmtree(diretorio, ignore_errors=True)
+    return resultado
+
+
+def _verificar_arquivo_csv(caminho: str):
+    """Garante que o arquivo existe e não é apenas um ponteiro do Git LFS."""
+    if not os.path.exists(caminho):
+        raise SystemExit(f"Erro: arquivo '{caminho}' não encontrado.")
+    with open(caminho, "rb") as f:
+        if f.read(64).startswith(b"version https://git-lfs"):
+            raise SystemExit(f"Erro: '{caminho}' é um ponteiro do Git LFS. Execute 'git lfs pull' antes do benchmark.")
+
+
+def benchmark_cache_colunar(caminho: str = "data/creditcard.csv", repeticoes: int = 5) -> dict:
+    """
+    Compara a carga a frio (parse do CSV + conversão para o cache colunar) com a carga a quente
+    (abertura do cache colunar com memory mapping).
+
+    Args:
+        caminho: CSV usado no benchmark.
+        repeticoes: Número de cargas a quente medidas.
+
+    Returns:
+        Dicionário com os tempos medidos (em segundos) e o ganho da carga a quente.
+    """
+    _verificar_arquivo_csv(caminho)
+    versao = tools._versao_fonte(caminho)
+    tools._remover_cache_colunar(caminho, versao)
+
+    inicio = time.perf_counter()
+    pd.read_csv(caminho, compression='infer')
+    tempo_read_csv = time.perf_counter() - inicio
+
+    inicio = time.perf_counter()
+    df_frio = tools._ler_csv(caminho, versao)
+    tempo_frio = time.perf_counter() - inicio
+
+    tempos_quente = []
+    for _ in range(repeticoes):
+        inicio = time.perf_counter()
+        df_quente = tools._ler_csv(caminho, versao)
+        tempos_quente.append(time.perf_counter() - inicio)
+
+    pd.testing.assert_frame_equal(df_frio, df_quente)
+    tempo_quente = statistics.median(tempos_quente)
+
+    return {
+        "arquivo": caminho,
+        "linhas": int(df_frio.shape[0]),
+        "colunas": int(df_frio.shape[1]),
+        "read_csv_s": tempo_read_csv,
+        "carga_fria_s": tempo_frio,
+        "carga_quente_s": tempo_quente,
+        "ganho": tempo_read_csv / tempo_quente if tempo_quente else None,
+    }
+
+
+def benchmark_graficos(linhas: int = 284_807, repeticoes: int = 3) -> list:
+    """
+    Compara, para cada tipo de gráfico, a renderização com todas as linhas e a renderização pré-agregada:
+    tempo mediano (s) e tamanho do PNG gerado (bytes).
+    """
+    df = _dataframe_sintetico(linhas)
+    limiar_original = tools.LIMIAR_AGREGACAO_GRAFICO
+    resultados = []
+    try:
+        for tipo_grafico, colunas in GRAFICOS_BENCHMARK:
+            resultado = {"tipo_grafico": tipo_grafico, "colunas": colunas, "linhas": linhas}
+            for modo, limiar in (("bruto", float("inf")), ("agregado", 0)):
+                tools.LIMIAR_AGREGACAO_GRAFICO = limiar
+                tempos = []
+                for _ in range(repeticoes):
+                    inicio = time.perf_counter()
+                    # Renderização direta: o cache de gráficos devolveria a imagem do modo anterior
+                    imagem = tools._renderizar_grafico(df, tipo_grafico, colunas, "Benchmark")
+                    tempos.append(time.perf_counter() - inicio)
+                resultado[f"{modo}_s"] = statistics.median(tempos)
+                if isinstance(imagem, str):
+                    # Ex.: o Agg recusa linhas não ordenadas com muitos pontos ("Exceeded cell block limit")
+                    resultado[f"{modo}_bytes"] = None
+                    resultado[f"{modo}_erro"] = imagem
+                else:
+                    resultado[f"{modo}_bytes"] = len(imagem)
+            resultado["ganho"] = resultado["bruto_s"] / resultado["agregado_s"]
+            resultados.append(resultado)
+    finally:
+        tools.LIMIAR_AGREGACAO_GRAFICO = limiar_original
+    return resultados
+
+
+def benchmark_cliente_gemini(turnos: int = 50, latencia: float = 0.0) -> dict:
+    """
+    Latência por turno (chamada com functionCall + chamada com functionResponse) contra o servidor
+    local de mock_gemini.py: um requests.post avulso por chamada vs. o ClienteGemini com conexões persistentes.
+    """
+    servidor, base_url = iniciar_servidor_mock(latencia=latencia)
+    historico = [{"role": "user", "parts": [{"text": "Qual a média de Amount?"}]}]
+    payload = {"contents": historico, "systemInstruction": {"parts": [{"text": "Benchmark"}]}}
+    resposta_ferramenta = {"role": "function", "parts": [{"functionResponse": {"name": "consulta_tool", "response": {"output": "88.35"}}}]}
+    payload_seguinte = {**payload, "contents": historico + [resposta_ferramenta]}
+    url = f"{base_url}/models/benchmark:generateContent"
+
+    def post_avulso(corpo):
+        resposta = requests.post(url, headers={"Content-Type": "application/json", "x-goog-api-key": "teste"}, data=json.dumps(corpo))
+        resposta.raise_for_status()
+        return resposta.json()
+
+    cliente = ClienteGemini(base_url)
+
+    def post_cliente(corpo):
+        return cliente.gerar_conteudo("benchmark", corpo, "teste")
+
+    resultado = {"turnos": turnos, "latencia_servidor_s": latencia}
+    try:
+        for modo, chamar in (("avulso", post_avulso), ("cliente", post_cliente)):
+            chamar(payload)  # aquecimento
+            tempos = []
+            for _ in range(turnos):
+                inicio = time.perf_counter()
+                chamar(payload)
+                chamar(payload_seguinte)
+                tempos.append(time.perf_counter() - inicio)
+            resultado[f"{modo}_turno_ms"] = statistics.median(tempos) * 1000
+            resultado[f"{modo}_p95_ms"] = float(np.percentile(tempos, 95)) * 1000
+        resultado["ganho"] = resultado["avulso_turno_ms"] / resultado["cliente_turno_ms"]
+    finally:
+        servidor.shutdown()
+    return resultado
+
+
+def benchmark_streaming(repeticoes: int = 10, latencia_fragmento: float = 0.02) -> dict:
+    """
+    Tempo até o primeiro texto visível: generateContent (resposta inteira) vs. streamGenerateContent (SSE),
+    contra o servidor local de mock_gemini.py com um atraso por fragmento gerado.
+    """
+    servidor, base_url = iniciar_servidor_mock(latencia_fragmento=latencia_fragmento)
+    cliente = ClienteGemini(base_url)
+    payload = {"contents": [{"role": "user", "parts": [{"text": "Olá"}]}]}
+    primeiro_texto, total_stream, total_completo = [], [], []
+    try:
+        for _ in range(repeticoes):
+            inicio = time.perf_counter()
+            cliente.gerar_conteudo("benchmark", payload, "teste")
+            total_completo.append(time.perf_counter() - inicio)
+
+            inicio = time.perf_counter()
+            instantes = []
+            cliente.gerar_conteudo_stream("benchmark", payload, "teste",
+                                          ao_receber_texto=lambda _: instantes.append(time.perf_counter() - inicio))
+            total_stream.append(time.perf_counter() - inicio)
+            primeiro_texto.append(instantes[0])
+    finally:
+        servidor.shutdown()
+    return {
+        "repeticoes": repeticoes,
+        "latencia_fragmento_s": latencia_fragmento,
+        "completo_primeiro_texto_ms": statistics.median(total_completo) * 1000,
+        "streaming_primeiro_texto_ms": statistics.median(primeiro_texto) * 1000,
+        "streaming_total_ms": statistics.median(total_stream) * 1000,
+    }
+
+
+def benchmark_contexto(turnos: int = 40) -> list:
+    """
+    Tamanho (bytes de JSON) do histórico enviado a cada turno de uma sessão longa em que cada turno faz
+    uma consulta com saída grande: histórico completo vs. saídas limitadas + compactação.
+    """
+    df = _dataframe_sintetico(20_000)
+    saida = tools._executar_consulta(df, "df.head(5000)")
+    saida_bruta = df.head(5000).to_markdown()
+
+    completo, compactado = [], []
+    resumo = ResumoHistorico()
+    resultados = []
+    for turno in range(1, turnos + 1):
+        for historico, texto in ((completo, saida_bruta), (compactado, limitar_saida(saida))):
+            historico += [
+                {"role": "user", "parts": [{"text": f"Mostre as primeiras linhas ({turno})"}]},
+                {"role": "model", "parts": [{"functionCall": {"name": "consulta_tool", "args": {"codigo_python": "df.head(5000)"}}}]},
+                {"role": "user", "parts": [{"functionResponse": {"name": "consulta_tool", "response": {"output": texto}}}]},
+                {"role": "model", "parts": [{"text": "Aqui estão as primeiras linhas do DataFrame."}]},
+            ]
+        if turno == 1 or turno % 10 == 0:
+            inicio = time.perf_counter()
+            enviado = compactar_historico(compactado, resumo=resumo)
+            duracao = time.perf_counter() - inicio
+            resultados.append({
+                "turno": turno,
+                "completo_bytes": len(json.dumps(completo, ensure_ascii=False).encode("utf-8")),
+                "compactado_bytes": len(json.dumps(enviado, ensure_ascii=False).encode("utf-8")),
+                "compactacao_ms": duracao * 1000,
+            })
+    return resultados
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmarks do Agente de Análise de Fraudes.")
+    subparsers = parser.add_subparsers(dest="benchmark", required=True)
+
+    parser_cache = subparsers.add_parser("cache_colunar", help="Carga a frio vs. a quente do cache colunar.")
+    parser_cache.add_argument("--arquivo", default="data/creditcard.csv")
+    parser_cache.add_argument("--repeticoes", type=int, default=5)
+
+    parser_graficos = subparsers.add_parser("graficos", help="Renderização bruta vs. pré-agregada do grafico_tool.")
+    parser_graficos.add_argument("--linhas", type=int, default=284_807)
+    parser_graficos.add_argument("--repeticoes", type=int, default=3)
+
+    parser_cliente = subparsers.add_parser("cliente_gemini", help="Latência por turno: requests.post avulso vs. ClienteGemini.")
+    parser_cliente.add_argument("--turnos", type=int, default=50)
+    parser_cliente.add_argument("--latencia", type=float, default=0.0)
+
+    parser_streaming = subparsers.add_parser("streaming", help="Tempo até o primeiro texto: resposta completa vs. streaming (SSE).")
+    parser_streaming.add_argument("--repeticoes", type=int, default=10)
+    parser_streaming.add_argument("--latencia-fragmento", type=float, default=0.02)
+
+    parser_contexto = subparsers.add_parser("contexto", help="Tamanho do histórico enviado por turno: completo vs. compactado.")
+    parser_contexto.add_argument("--turnos", type=int, default=40)
+
+    parser_gerar = subparsers.add_parser("gerar_dados", help="Gera um CSV sintético no formato do creditcard.csv.")
+    parser_gerar.add_argument("saida")
+    parser_gerar.add_argument("--linhas", type=int, default=1_000_000)
+    parser_gerar.add_argument("--semente", type=int, default=0)
+
+    parser_suite = subparsers.add_parser("suite", help="Carga, consultas, gráficos e turnos para vários tamanhos de dataset.")
+    parser_suite.add_argument("--linhas", type=int, nargs="+", default=[10_000, 100_000, 1_000_000])
+    parser_suite.add_argument("--repeticoes", type=int, default=3)
+    parser_suite.add_argument("--sem-turnos", action="store_true", help="Não mede turnos completos do app (dispensa o Streamlit).")
+    parser_suite.add_argument("--diretorio", help="Diretório para os CSVs gerados (padrão: temporário).")
+    parser_suite.add_argument("--saida", help="Arquivo JSON de resultados (padrão: saída padrão).")
+
+    args = parser.parse_args()
+    if args.benchmark == "cache_colunar":
+        resultado = benchmark_cache_colunar(args.arquivo, args.repeticoes)
+        print(json.dumps(resultado, indent=2, ensure_ascii=False))
+    elif args.benchmark == "graficos":
+        resultado = benchmark_graficos(args.linhas, args.repeticoes)
+        print(json.dumps(resultado, indent=2, ensure_ascii=False))
+    elif args.benchmark == "cliente_gemini":
+        resultado = benchmark_cliente_gemini(args.turnos, args.latencia)
+        print(json.dumps(resultado, indent=2, ensure_ascii=False))
+    elif args.benchmark == "streaming":
+        resultado = benchmark_streaming(args.repeticoes, args.latencia_fragmento)
+        print(json.dumps(resultado, indent=2, ensure_ascii=False))
+    elif args.benchmark == "contexto":
+        resultado = benchmark_contexto(args.turnos)
+        print(json.dumps(resultado, indent=2, ensure_ascii=False))
+    elif args.benchmark == "gerar_dados":
+        gerar_csv_sintetico(args.saida, args.linhas, args.semente)
+        print(f"[INFO] {args.linhas:,} linhas gravadas em '{args.saida}'.")
+    elif args.benchmark == "suite":
+        resultado = benchmark_suite(args.linhas, args.repeticoes, not args.sem_turnos, args.diretorio)
+        if args.saida:
+            with open(args.saida, "w", encoding="utf-8") as arquivo:
+                json.dump(resultado, arquivo, indent=2, ensure_ascii=False)
+            print(f"[INFO] Resultados gravados em '{args.saida}'.")
+        else:
+            print(json.dumps(resultado, indent=2, ensure_ascii=False))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,111 @@
+"""
+Cargas de dados em segundo plano.
+
+A carga inicial do dataset e a ferramenta 'carregar_dados' rodam em um pool de threads do processo:
+a página é exibida e o chat responde enquanto o arquivo é baixado e convertido. A sessão guarda a
+CargaDados em andamento e instala o resultado quando ele fica pronto; só as ferramentas que precisam
+do DataFrame esperam pela carga. As funções de carga não usam st.session_state (que só é acessível
+na thread do Streamlit) e retornam uma tupla (df ou mensagem de erro, estatisticas, mensagem).
+"""
+import contextvars
+import os
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import pandas as pd
+
+from anexos import anexar_dados
+from indices import agendar_indice
+from perfil import agendar_perfil
+from tools import carregar_dados_dinamicamente, carregar_dados_ou_demo, carregar_dados_streaming, deve_usar_streaming
+
+CARGAS_TRABALHADORES = int(os.environ.get("CARGAS_TRABALHADORES", "2"))
+
+_executor_cargas = ThreadPoolExecutor(max_workers=CARGAS_TRABALHADORES, thread_name_prefix="carga")
+
+
+class CargaDados:
+    """Uma carga em andamento: o Future do resultado, o progresso informado pela leitura e o tempo decorrido."""
+
+    def __init__(self, descricao: str, funcao, *args):
+        self.descricao = descricao
+        self.inicio = time.monotonic()
+        self.linhas_lidas = 0
+        self.bytes_lidos = 0
+        # O contexto é copiado para que os trechos de métricas da carga entrem no turno que a iniciou
+        self.futuro = _executor_cargas.submit(contextvars.copy_context().run, funcao, *args, self._progresso)
+
+    def _progresso(self, linhas: int, bytes_lidos: int):
+        self.linhas_lidas = linhas
+        self.bytes_lidos = bytes_lidos
+
+    @property
+    def concluida(self) -> bool:
+        return self.futuro.done()
+
+    @property
+    def segundos(self) -> float:
+        return time.monotonic() - self.inicio
+
+    def resultado(self, tempo_limite: float | None = None) -> tuple:
+        """Aguarda a carga e retorna (df ou mensagem de erro, estatisticas, mensagem)."""
+        try:
+            return self.futuro.result(timeout=tempo_limite)
+        except TimeoutError:
+            raise
+        except Exception as e:
+            mensagem = f"Erro ao carregar dados ({e})."
+            return mensagem, None, mensagem
+
+
+def _preparar(df):
+    """Agenda o perfil e os índices de um DataFrame recém-carregado (ambos em segundo plano)."""
+    if isinstance(df, pd.DataFrame):
+        agendar_perfil(df)
+        agendar_indice(df)
+
+
+def carga_inicial(progresso=None) -> tuple:
+    """Carrega o dataset padrão da sessão (URL pública, arquivo local ou demonstração), informando o progresso da leitura."""
+    df = carregar_dados_ou_demo(progresso)
+    _preparar(df)
+    return df, None, f"Dados carregados! Linhas: {df.shape[0]}, Colunas: {df.shape[1]}."
+
+
+def carga_url(url: str, streaming: bool = False, progresso=None) -> tuple:
+    """Carrega o CSV da URL, em streaming se pedido ou se o arquivo for grande; a mensagem vai para o modelo."""
+    if streaming or deve_usar_streaming(url):
+        resultado = carregar_dados_streaming(url, progresso=progresso)
+        if not isinstance(resultado, tuple):
+            return resultado, None, resultado  # É uma string de erro
+        df, estatisticas = resultado
+        _preparar(df)
+        info = df.attrs["streaming"]
+        mensagem = (
+            f"Dados lidos em streaming! Linhas lidas: {info['linhas_lidas']}, mantidas em 'df': {info['linhas_mantidas']}, "
+            f"Colunas: {df.shape[1]}. Estatísticas globais disponíveis no objeto 'estatisticas'."
+        )
+        if info["truncado"]:
+            mensagem += " A leitura foi interrompida pelo limite de bytes: as estatísticas cobrem apenas as linhas lidas."
+        return df, estatisticas, mensagem
+
+    df = carregar_dados_dinamicamente(url, progresso)
+    if not isinstance(df, pd.DataFrame):
+        return df, None, df  # É uma string de erro
+    _preparar(df)
+    return df, None, f"Dados carregados com sucesso! Linhas: {df.shape[0]}, Colunas: {df.shape[1]}."
+
+
+def carga_anexo(url: str, df, estatisticas=None, progresso=None) -> tuple:
+    """
+    Anexa o CSV da URL ao dataset atual. O perfil e os índices do resultado já saem atualizados; em caso
+    de erro o dataset atual é mantido e só a mensagem muda.
+    """
+    resultado = anexar_dados(df, url, estatisticas, progresso=progresso)
+    if not isinstance(resultado, tuple):
+        return df, estatisticas, resultado  # É uma string de erro: nada foi anexado
+    df_anexado, estatisticas, linhas = resultado
+    return df_anexado, estatisticas, (
+        f"Dados anexados! Linhas novas: {linhas}, total: {df_anexado.shape[0]}, Colunas: {df_anexado.shape[1]}. "
+        "Perfil, índices e estatísticas foram atualizados com as linhas novas."
+    )
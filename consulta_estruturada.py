@@ -0,0 +1,476 @@
+"""
+Consulta estruturada: filtros, agrupamento, agregações, top-k e quantis sobre colunas nomeadas, sem exec.
+
+A ferramenta 'consulta_estruturada' recebe a especificação da consulta (e não código Python), e um
+planejador a compila em operações vetorizadas de NumPy: máscaras booleanas para os filtros, códigos de
+grupo (pd.factorize) com bincount/ordenação por grupo para as agregações e argpartition para o top-k.
+Filtros por Class e por intervalos de Time partem do índice do dataset (indices.py) em vez de percorrer
+todas as linhas. O plano compilado fica em cache por especificação e esquema do DataFrame; o resultado
+formatado, por conteúdo de DataFrame (impressão digital), como na consulta_tool. Sem código arbitrário
+não há laços por linha nem objetos intermediários grandes: o custo é proporcional às linhas lidas, a
+consulta roda no próprio processo e a saída tem no máximo CONSULTA_ESTRUTURADA_MAX_LINHAS linhas.
+
+Especificação (argumentos da ferramenta):
+    filtros       [{"coluna", "operador", "valor" | "valores"}], com os operadores de OPERADORES
+    agrupar_por   colunas de agrupamento
+    agregacoes    [{"funcao", "coluna", "q"}], com as funções de FUNCOES_AGREGACAO
+    colunas       colunas exibidas quando não há agregações (o resultado são as linhas selecionadas)
+    ordenar_por   coluna ou agregação (ex.: "media(Amount)") que ordena as linhas/grupos
+    decrescente   ordem decrescente (padrão: verdadeiro)
+    limite        número de linhas/grupos retornados (top-k)
+"""
+import json
+import os
+import threading
+from collections import OrderedDict
+
+import numpy as np
+import pandas as pd
+
+from metricas import anotar, trecho
+from tools import CACHE_CONSULTAS_MAX_ENTRADAS, CONSULTA_MAX_LINHAS_SAIDA, impressao_digital
+
+# Máximo de linhas/grupos na saída (o 'limite' pedido é reduzido a este valor).
+CONSULTA_ESTRUTURADA_MAX_LINHAS = int(os.environ.get("CONSULTA_ESTRUTURADA_MAX_LINHAS", "100"))
+# Número de planos compilados mantidos em cache.
+MAX_PLANOS = 256
+
+OPERADORES = {
+    "==": np.equal,
+    "!=": np.not_equal,
+    "<": np.less,
+    "<=": np.less_equal,
+    ">": np.greater,
+    ">=": np.greater_equal,
+    "entre": None,  # valores = [mínimo, máximo], inclusive
+    "em": None,  # valores = lista de valores aceitos
+}
+FUNCOES_AGREGACAO = ("contagem", "soma", "media", "min", "max", "desvio", "mediana", "quantil")
+
+# (especificação normalizada, esquema) -> PlanoConsulta, em ordem LRU
+_planos = OrderedDict()
+# (impressão digital do df, especificação normalizada) -> resultado formatado, em ordem LRU
+_resultados = OrderedDict()
+_cache_lock = threading.Lock()
+_contadores = {"planos_reaproveitados": 0, "acertos": 0, "falhas": 0}
+
+
+class ErroConsulta(ValueError):
+    """Especificação de consulta inválida para o DataFrame (coluna, operador ou função desconhecidos)."""
+
+
+def _numerica(dtype) -> bool:
+    return pd.api.types.is_numeric_dtype(dtype) or pd.api.types.is_bool_dtype(dtype)
+
+
+def _coluna(df: pd.DataFrame, coluna: str) -> np.ndarray:
+    """Valores da coluna como array NumPy: sem cópia para dtypes numéricos nativos, float64 para os numéricos de extensão."""
+    serie = df[coluna]
+    if isinstance(serie.dtype, np.dtype) and serie.dtype.kind in "biuf":
+        return serie.to_numpy()
+    if _numerica(serie.dtype):
+        return serie.to_numpy(dtype=np.float64, na_value=np.nan)
+    return serie.to_numpy(dtype=object)
+
+
+def _nome_agregacao(funcao: str, coluna: str | None, q: float | None) -> str:
+    if coluna is None:
+        return funcao
+    if funcao == "quantil":
+        return f"quantil({coluna}, {q:g})"
+    return f"{funcao}({coluna})"
+
+
+class PlanoConsulta:
+    """Consulta validada contra um esquema de DataFrame, pronta para executar em qualquer DataFrame com esse esquema."""
+
+    def __init__(self, especificacao: dict, dtypes: dict):
+        def conferir_coluna(coluna, uso):
+            if coluna not in dtypes:
+                raise ErroConsulta(f"coluna '{coluna}' ({uso}) não existe. Colunas disponíveis: {', '.join(map(str, dtypes))}.")
+            return coluna
+
+        # Filtros: (coluna, operador, argumento)
+        self.filtros = []
+        for filtro in especificacao.get("filtros") or []:
+            coluna = conferir_coluna(filtro.get("coluna"), "filtro")
+            operador = filtro.get("operador")
+            if operador not in OPERADORES:
+                raise ErroConsulta(f"operador '{operador}' inválido. Use um de: {', '.join(OPERADORES)}.")
+            if operador in ("entre", "em"):
+                argumento = filtro.get("valores")
+                if not isinstance(argumento, list) or not argumento or (operador == "entre" and len(argumento) != 2):
+                    raise ErroConsulta(f"o operador '{operador}' exige 'valores' ({'[mínimo, máximo]' if operador == 'entre' else 'lista não vazia'}).")
+                argumento = tuple(argumento)
+            else:
+                if "valor" not in filtro:
+                    raise ErroConsulta(f"o operador '{operador}' exige 'valor'.")
+                argumento = filtro["valor"]
+            valores = argumento if isinstance(argumento, tuple) else (argumento,)
+            if _numerica(dtypes[coluna]) and not all(isinstance(v, (int, float)) for v in valores):
+                raise ErroConsulta(f"a coluna '{coluna}' é numérica: o filtro exige valores numéricos.")
+            if not _numerica(dtypes[coluna]) and operador not in ("==", "!=", "em"):
+                raise ErroConsulta(f"a coluna '{coluna}' não é numérica: use '==', '!=' ou 'em'.")
+            self.filtros.append((coluna, operador, argumento))
+
+        self.agrupar_por = [conferir_coluna(c, "agrupar_por") for c in especificacao.get("agrupar_por") or []]
+
+        # Agregações: nome -> (funcao, coluna, q)
+        self.agregacoes = {}
+        for agregacao in especificacao.get("agregacoes") or []:
+            funcao = agregacao.get("funcao")
+            if funcao not in FUNCOES_AGREGACAO:
+                raise ErroConsulta(f"função de agregação '{funcao}' inválida. Use uma de: {', '.join(FUNCOES_AGREGACAO)}.")
+            coluna = agregacao.get("coluna")
+            if coluna is None and funcao != "contagem":
+                raise ErroConsulta(f"a agregação '{funcao}' exige 'coluna'.")
+            if coluna is not None:
+                conferir_coluna(coluna, "agregação")
+                if funcao != "contagem" and not _numerica(dtypes[coluna]):
+                    raise ErroConsulta(f"a agregação '{funcao}' exige uma coluna numérica ('{coluna}' não é).")
+            q = None
+            if funcao in ("quantil", "mediana"):
+                q = 0.5 if funcao == "mediana" else agregacao.get("q")
+                if not isinstance(q, (int, float)) or not 0 <= q <= 1:
+                    raise ErroConsulta("a agregação 'quantil' exige 'q' entre 0 e 1.")
+            self.agregacoes.setdefault(_nome_agregacao(funcao, coluna, q), (funcao, coluna, q))
+        if self.agrupar_por and not self.agregacoes:
+            self.agregacoes["contagem"] = ("contagem", None, None)
+
+        self.colunas = [conferir_coluna(c, "colunas") for c in especificacao.get("colunas") or []] or list(dtypes)
+
+        # Ordenação: uma agregação, uma coluna de agrupamento ou (sem agregações) uma coluna das linhas
+        self.ordenar_por = especificacao.get("ordenar_por")
+        if self.ordenar_por is not None:
+            if self.agregacoes:
+                if self.ordenar_por not in self.agregacoes and self.ordenar_por not in self.agrupar_por:
+                    candidatas = [nome for nome, (_, coluna, _) in self.agregacoes.items() if coluna == self.ordenar_por]
+                    if len(candidatas) != 1:
+                        raise ErroConsulta(f"'ordenar_por' deve ser uma das agregações ({', '.join(self.agregacoes)}) ou colunas de agrupamento.")
+                    self.ordenar_por = candidatas[0]
+            else:
+                conferir_coluna(self.ordenar_por, "ordenar_por")
+                if not _numerica(dtypes[self.ordenar_por]):
+                    raise ErroConsulta(f"'ordenar_por' exige uma coluna numérica ('{self.ordenar_por}' não é).")
+        self.decrescente = bool(especificacao.get("decrescente", True))
+        limite = especificacao.get("limite") or CONSULTA_MAX_LINHAS_SAIDA
+        self.limite = max(1, min(int(limite), CONSULTA_ESTRUTURADA_MAX_LINHAS))
+
+        # Filtros que o índice do dataset atende: igualdade/pertinência em Class e limites de Time
+        self.classes_indice = None
+        self.filtro_classe_indice = None  # posição em self.filtros do filtro de Class atendido pelo índice
+        self.janela_indice = None
+        for i, (coluna, operador, argumento) in enumerate(self.filtros):
+            if coluna == "Class" and self.classes_indice is None and operador in ("==", "em"):
+                self.classes_indice = argumento if operador == "em" else (argumento,)
+                self.filtro_classe_indice = i
+            elif coluna == "Time" and operador in ("==", ">", ">=", "<", "<=", "entre"):
+                t0, t1 = self.janela_indice or (None, None)
+                if operador in ("==", ">", ">=", "entre"):
+                    inferior = argumento[0] if operador == "entre" else argumento
+                    t0 = inferior if t0 is None else max(t0, inferior)
+                if operador in ("==", "<", "<=", "entre"):
+                    superior = argumento[1] if operador == "entre" else argumento
+                    t1 = superior if t1 is None else min(t1, superior)
+                self.janela_indice = (t0, t1)
+
+    def _posicoes_indice(self, df: pd.DataFrame):
+        """
+        Posições candidatas (crescentes) obtidas do índice pelo filtro mais seletivo entre Class e Time, e se
+        o filtro de Class já foi resolvido por elas. (None, False) se nenhum filtro usa o índice.
+        """
+        if self.classes_indice is None and self.janela_indice is None:
+            return None, False
+        # Importado aqui: o módulo de índices depende de tools, como este
+        from indices import obter_indice
+        indice = obter_indice(df)
+        candidatas = []
+        if self.classes_indice is not None and indice.posicoes_classe is not None:
+            partes = [indice.posicoes_classe.get(classe) for classe in self.classes_indice]
+            partes = [p for p in partes if p is not None]
+            posicoes = np.sort(np.concatenate(partes)) if len(partes) > 1 else (partes[0] if partes else np.empty(0, np.int64))
+            candidatas.append((len(posicoes), posicoes, True))
+        if self.janela_indice is not None and indice.tempos is not None:
+            t0, t1 = self.janela_indice
+            inicio = 0 if t0 is None else int(np.searchsorted(indice.tempos, t0, side="left"))
+            fim = int(np.searchsorted(indice.tempos, np.inf if t1 is None else t1, side="right"))
+            fim = max(inicio, fim)
+            posicoes = np.arange(inicio, fim) if indice.ordem_tempo is None else np.sort(indice.ordem_tempo[inicio:fim])
+            candidatas.append((len(posicoes), posicoes, False))
+        if not candidatas:
+            return None, False
+        tamanho, posicoes, resolve_classe = min(candidatas, key=lambda c: c[0])
+        if tamanho >= len(df):
+            return None, False
+        return posicoes, resolve_classe
+
+    def selecionar(self, df: pd.DataFrame):
+        """Posições das linhas que passam por todos os filtros (None = todas as linhas) e o uso do índice."""
+        posicoes, resolve_classe = self._posicoes_indice(df)
+        uso_indice = None if posicoes is None else ("Class" if resolve_classe else "Time")
+        mascara = None
+        for i, (coluna, operador, argumento) in enumerate(self.filtros):
+            if resolve_classe and i == self.filtro_classe_indice:
+                continue
+            valores = _coluna(df, coluna)
+            if posicoes is not None:
+                valores = valores[posicoes]
+            if operador == "entre":
+                parcial = (valores >= argumento[0]) & (valores <= argumento[1])
+            elif operador == "em":
+                parcial = np.isin(valores, list(argumento))
+            else:
+                parcial = OPERADORES[operador](valores, argumento)
+            mascara = parcial if mascara is None else mascara & parcial
+        if mascara is not None:
+            posicoes = np.flatnonzero(mascara) if posicoes is None else posicoes[mascara]
+        return posicoes, uso_indice
+
+    def executar(self, df: pd.DataFrame) -> tuple:
+        """Executa o plano. Retorna (resultado, linhas selecionadas, total de grupos ou None, uso do índice)."""
+        posicoes, uso_indice = self.selecionar(df)
+        selecionadas = len(df) if posicoes is None else len(posicoes)
+
+        def valores(coluna):
+            todos = _coluna(df, coluna)
+            return todos if posicoes is None else todos[posicoes]
+
+        if not self.agregacoes:
+            return self._linhas(df, posicoes, valores), selecionadas, None, uso_indice
+        if not self.agrupar_por:
+            resultado = pd.Series(
+                {nome: _agregar(funcao, None if coluna is None else valores(coluna), q, selecionadas)
+                 for nome, (funcao, coluna, q) in self.agregacoes.items()},
+                dtype=object,
+            )
+            return resultado, selecionadas, None, uso_indice
+        resultado = self._agrupar(valores, selecionadas)
+        return self._ordenar_e_limitar(resultado), selecionadas, len(resultado), uso_indice
+
+    def _linhas(self, df: pd.DataFrame, posicoes, valores) -> pd.DataFrame:
+        """Linhas selecionadas (top-k pela coluna de ordenação, ou as primeiras), só com as colunas pedidas."""
+        total = len(df) if posicoes is None else len(posicoes)
+        k = min(self.limite, total)
+        if self.ordenar_por is None:
+            linhas = np.arange(k) if posicoes is None else posicoes[:k]
+        else:
+            chave = valores(self.ordenar_por).astype(np.float64, copy=True)
+            # NaN sempre por último; argpartition acha os k primeiros sem ordenar tudo
+            chave[np.isnan(chave)] = np.inf if not self.decrescente else -np.inf
+            if self.decrescente:
+                chave = -chave
+            if 0 < k < total:
+                # Empates no k-ésimo valor: ficam as primeiras linhas, como no nlargest/nsmallest do pandas
+                kesimo = chave[np.argpartition(chave, k - 1)[k - 1]]
+                menores = np.flatnonzero(chave < kesimo)
+                primeiros = np.concatenate([menores, np.flatnonzero(chave == kesimo)[:k - len(menores)]])
+            else:
+                primeiros = np.arange(total)
+            primeiros = primeiros[np.argsort(chave[primeiros], kind="stable")]
+            linhas = primeiros if posicoes is None else posicoes[primeiros]
+        return df.iloc[linhas, [df.columns.get_loc(c) for c in self.colunas]]
+
+    def _agrupar(self, valores, selecionadas: int) -> pd.DataFrame:
+        """Agregações por grupo: códigos de grupo vetorizados e bincount/valores ordenados por grupo."""
+        chaves = [valores(coluna) for coluna in self.agrupar_por]
+        codigo = None
+        for chave in chaves:
+            codigos, unicos = pd.factorize(chave, sort=True)
+            if codigo is None:
+                codigo = codigos.astype(np.int64)
+            else:
+                # Códigos combinados (grupos em ordem lexicográfica das chaves), refatorados para não estourar int64
+                combinado = np.where((codigo < 0) | (codigos < 0), -1, codigo * len(unicos) + codigos)
+                codigo = pd.factorize(combinado, sort=True)[0].astype(np.int64)
+                codigo[combinado < 0] = -1
+        validas = codigo >= 0  # linhas com chave ausente (NaN) ficam fora, como no groupby do pandas
+        grupos, _ = pd.factorize(codigo[validas], sort=True)
+        total_grupos = int(grupos.max()) + 1 if len(grupos) else 0
+        contagens = np.bincount(grupos, minlength=total_grupos)
+        # Primeira linha de cada grupo (de onde saem as chaves): na atribuição invertida vence a última escrita
+        primeiras = np.empty(total_grupos, dtype=np.int64)
+        primeiras[grupos[::-1]] = np.arange(len(grupos) - 1, -1, -1)
+        if len(chaves) == 1:
+            indice = pd.Index(chaves[0][validas][primeiras], name=self.agrupar_por[0])
+        else:
+            indice = pd.MultiIndex.from_arrays([chave[validas][primeiras] for chave in chaves], names=self.agrupar_por)
+
+        colunas = {}
+        ordenados = {}  # coluna -> (grupos, valores) sem NaN, ordenados por grupo e valor
+        for nome, (funcao, coluna, q) in self.agregacoes.items():
+            if coluna is None:
+                colunas[nome] = contagens
+                continue
+            numeros = valores(coluna)[validas]
+            if numeros.dtype.kind not in "biuf":
+                colunas[nome] = np.bincount(grupos[~pd.isna(numeros)], minlength=total_grupos)
+                continue
+            numeros = numeros.astype(np.float64, copy=False)
+            presentes = ~np.isnan(numeros)
+            g, v = grupos[presentes], numeros[presentes]
+            n = np.bincount(g, minlength=total_grupos)
+            if funcao == "contagem":
+                colunas[nome] = n
+            elif funcao in ("soma", "media", "desvio"):
+                soma = np.bincount(g, weights=v, minlength=total_grupos)
+                if funcao == "soma":
+                    colunas[nome] = soma
+                    continue
+                with np.errstate(invalid="ignore", divide="ignore"):
+                    media = soma / n
+                    if funcao == "media":
+                        colunas[nome] = media
+                        continue
+                    desvios = v - media[g]
+                    colunas[nome] = np.sqrt(np.bincount(g, weights=desvios * desvios, minlength=total_grupos) / (n - 1))
+                    colunas[nome][n < 2] = np.nan
+            else:
+                if coluna not in ordenados:
+                    # Ordena pelo valor e depois, de forma estável, pelo grupo (radix sort com códigos de até 16 bits);
+                    # bem mais rápido que np.lexsort
+                    ordem_valores = np.argsort(v)
+                    codigos_grupo = g[ordem_valores].astype(np.uint16 if total_grupos <= 65536 else np.int64)
+                    ordenados[coluna] = v[ordem_valores[np.argsort(codigos_grupo, kind="stable")]]
+                v_ordenados = ordenados[coluna]
+                inicio = np.concatenate([[0], np.cumsum(n)[:-1]]).astype(np.int64)
+                vazio = n == 0
+                ultimo = np.maximum(inicio + n - 1, 0)
+                if funcao == "min":
+                    resultado = v_ordenados[np.minimum(inicio, max(len(v_ordenados) - 1, 0))] if len(v_ordenados) else np.full(total_grupos, np.nan)
+                elif funcao == "max":
+                    resultado = v_ordenados[ultimo] if len(v_ordenados) else np.full(total_grupos, np.nan)
+                else:
+                    # Interpolação linear entre os vizinhos, como o quantile padrão do pandas/NumPy
+                    posicao = inicio + q * np.maximum(n - 1, 0)
+                    abaixo = np.floor(posicao).astype(np.int64)
+                    acima = np.minimum(abaixo + 1, ultimo)
+                    if len(v_ordenados):
+                        abaixo = np.minimum(abaixo, len(v_ordenados) - 1)
+                        resultado = v_ordenados[abaixo] + (v_ordenados[acima] - v_ordenados[abaixo]) * (posicao - abaixo)
+                    else:
+                        resultado = np.full(total_grupos, np.nan)
+                resultado = np.asarray(resultado, dtype=np.float64)
+                resultado[vazio] = np.nan
+                colunas[nome] = resultado
+        return pd.DataFrame(colunas, index=indice)
+
+    def _ordenar_e_limitar(self, resultado: pd.DataFrame) -> pd.DataFrame:
+        if self.ordenar_por is not None:
+            if self.ordenar_por in resultado.columns:
+                resultado = resultado.sort_values(self.ordenar_por, ascending=not self.decrescente, kind="stable", na_position="last")
+            else:
+                resultado = resultado.sort_index(level=self.ordenar_por, ascending=not self.decrescente, kind="stable", sort_remaining=False)
+        return resultado.head(self.limite)
+
+
+def _agregar(funcao: str, valores, q: float | None, selecionadas: int):
+    """Agregação de uma coluna inteira (sem agrupamento), ignorando valores ausentes como o pandas."""
+    if valores is None:
+        return selecionadas
+    if valores.dtype.kind not in "biuf":
+        return int((~pd.isna(valores)).sum())
+    valores = valores.astype(np.float64, copy=False)
+    valores = valores[~np.isnan(valores)]
+    if funcao == "contagem":
+        return len(valores)
+    if funcao == "soma":
+        return float(valores.sum())
+    if not len(valores) or (funcao == "desvio" and len(valores) < 2):
+        return np.nan
+    if funcao == "media":
+        return float(valores.mean())
+    if funcao == "desvio":
+        return float(valores.std(ddof=1))
+    if funcao == "min":
+        return float(valores.min())
+    if funcao == "max":
+        return float(valores.max())
+    return float(np.quantile(valores, q))
+
+
+def _normalizar_especificacao(especificacao: dict) -> str:
+    """Forma canônica da especificação (chaves ordenadas, sem entradas vazias), usada como chave dos caches."""
+    limpa = {chave: valor for chave, valor in especificacao.items() if valor not in (None, [], "")}
+    return json.dumps(limpa, sort_keys=True, ensure_ascii=False, default=str)
+
+
+def obter_plano(especificacao: dict, df: pd.DataFrame) -> PlanoConsulta:
+    """Plano compilado da especificação para o esquema do DataFrame, do cache quando já existe. Levanta ErroConsulta."""
+    dtypes = dict(df.dtypes.items())
+    chave = (_normalizar_especificacao(especificacao), tuple((str(c), str(d)) for c, d in dtypes.items()))
+    with _cache_lock:
+        plano = _planos.get(chave)
+        if plano is not None:
+            _planos.move_to_end(chave)
+            _contadores["planos_reaproveitados"] += 1
+            return plano
+    plano = PlanoConsulta(especificacao, dtypes)
+    with _cache_lock:
+        _planos[chave] = plano
+        while len(_planos) > MAX_PLANOS:
+            _planos.popitem(last=False)
+    return plano
+
+
+def estatisticas_cache_consulta_estruturada() -> dict:
+    """Planos em cache, planos reaproveitados e acertos/falhas do cache de resultados da consulta estruturada."""
+    with _cache_lock:
+        return {**_contadores, "planos": len(_planos), "resultados": len(_resultados)}
+
+
+def _formatar(resultado, selecionadas: int, total_linhas: int, total_grupos: int | None, plano: PlanoConsulta) -> str:
+    cabecalho = f"Linhas selecionadas: {selecionadas:,} de {total_linhas:,}."
+    if total_grupos is not None:
+        cabecalho += f" Grupos: {total_grupos:,}"
+        cabecalho += f" (exibindo {len(resultado):,})." if total_grupos > len(resultado) else "."
+    elif not plano.agregacoes and selecionadas > len(resultado):
+        cabecalho += f" Exibindo {len(resultado):,} linha(s)" + (f" ordenadas por {plano.ordenar_por}." if plano.ordenar_por else ".")
+    if isinstance(resultado, pd.Series):
+        return f"{cabecalho}\n{resultado.to_frame('valor').to_markdown()}"
+    return f"{cabecalho}\n{resultado.to_markdown()}"
+
+
+def consulta_estruturada(df: pd.DataFrame, especificacao: dict) -> str:
+    """
+    Executa uma consulta estruturada (filtros, agrupamento, agregações, top-k, quantis) no DataFrame 'df'.
+
+    Args:
+        df: O DataFrame de dados.
+        especificacao: Os argumentos da ferramenta (ver a docstring do módulo).
+
+    Returns:
+        O resultado formatado em markdown, precedido do número de linhas selecionadas, ou uma mensagem de erro.
+    """
+    if df is None:
+        return "Erro: O DataFrame não foi carregado corretamente."
+
+    with trecho("consulta_estruturada", linhas=len(df)):
+        chave = (impressao_digital(df), _normalizar_especificacao(especificacao))
+        with _cache_lock:
+            resultado = _resultados.get(chave)
+            if resultado is not None:
+                _resultados.move_to_end(chave)
+                _contadores["acertos"] += 1
+                anotar(cache="acerto", caracteres_saida=len(resultado))
+                return resultado
+            _contadores["falhas"] += 1
+        anotar(cache="falha")
+
+        try:
+            plano = obter_plano(especificacao, df)
+            tabela, selecionadas, total_grupos, uso_indice = plano.executar(df)
+        except ErroConsulta as e:
+            return f"Erro na consulta estruturada: {e}"
+        except MemoryError:
+            return "Erro na consulta estruturada: a consulta excedeu o limite de memória."
+        except Exception as e:
+            return f"Erro na consulta estruturada: {type(e).__name__}: {e}"
+        resultado = _formatar(tabela, selecionadas, len(df), total_grupos, plano)
+        anotar(linhas_selecionadas=selecionadas, indice=uso_indice, caracteres_saida=len(resultado))
+
+        with _cache_lock:
+            _resultados[chave] = resultado
+            _resultados.move_to_end(chave)
+            while len(_resultados) > CACHE_CONSULTAS_MAX_ENTRADAS:
+                _resultados.popitem(last=False)
+        return resultado
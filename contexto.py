@@ -0,0 +1,152 @@
+"""
+Controle do tamanho do contexto enviado ao Gemini.
+
+As saídas das ferramentas são limitadas antes de entrarem no histórico, e o histórico enviado em cada
+chamada é compactado quando a estimativa de tokens passa do orçamento: os turnos mais antigos viram um
+resumo acumulado (pergunta, ferramentas usadas e resposta de cada turno) e só os turnos recentes vão
+na íntegra. O resumo (ResumoHistorico) fica no estado da conversa e cresce de forma incremental: cada
+turno é resumido uma única vez, quando sai da janela de turnos recentes, e o texto já enviado não muda
+de uma chamada para a outra. O histórico exibido no chat (st.session_state.messages) não é alterado.
+"""
+import json
+import os
+
+# Estimativa grosseira de caracteres por token (texto em português e JSON).
+CARACTERES_POR_TOKEN = 4
+# Tamanho máximo (caracteres) da saída de uma ferramenta guardada no histórico.
+MAX_CARACTERES_SAIDA_FERRAMENTA = int(os.environ.get("MAX_CARACTERES_SAIDA_FERRAMENTA", "4000"))
+# Orçamento (tokens estimados) do histórico enviado em cada chamada e turnos mantidos na íntegra.
+ORCAMENTO_HISTORICO_TOKENS = int(os.environ.get("ORCAMENTO_HISTORICO_TOKENS", "24000"))
+TURNOS_RECENTES = int(os.environ.get("TURNOS_RECENTES", "4"))
+# Tamanho máximo (caracteres) do resumo dos turnos antigos; os turnos mais antigos saem primeiro, inteiros.
+MAX_CARACTERES_RESUMO = int(os.environ.get("MAX_CARACTERES_RESUMO", "6000"))
+
+
+def estimar_tokens(conteudo) -> int:
+    """Estimativa do número de tokens de um texto ou de uma estrutura JSON (mensagens, payload)."""
+    if not isinstance(conteudo, str):
+        conteudo = json.dumps(conteudo, ensure_ascii=False, separators=(",", ":"))
+    return len(conteudo) // CARACTERES_POR_TOKEN + 1
+
+
+def limitar_saida(texto: str, max_caracteres: int = MAX_CARACTERES_SAIDA_FERRAMENTA) -> str:
+    """Mantém o início e o fim de uma saída longa, indicando quantos caracteres foram omitidos."""
+    texto = str(texto)
+    if len(texto) <= max_caracteres:
+        return texto
+    inicio = texto[:max_caracteres * 2 // 3]
+    fim = texto[-(max_caracteres // 3):]
+    return f"{inicio}\n... [{len(texto) - len(inicio) - len(fim)} caracteres omitidos] ...\n{fim}"
+
+
+def _encurtar(texto: str, max_caracteres: int) -> str:
+    texto = " ".join(str(texto).split())
+    return texto if len(texto) <= max_caracteres else texto[:max_caracteres - 3] + "..."
+
+
+def _dividir_turnos(mensagens: list) -> list:
+    """Agrupa as mensagens em turnos: cada turno começa em uma mensagem de texto do usuário."""
+    turnos = []
+    for mensagem in mensagens:
+        inicia_turno = mensagem["role"] == "user" and any("text" in parte for parte in mensagem["parts"])
+        if inicia_turno or not turnos:
+            turnos.append([])
+        turnos[-1].append(mensagem)
+    return turnos
+
+
+def resumir_turno(turno: list) -> str:
+    """Resumo de um turno em poucas linhas: pergunta, chamadas de ferramentas com resultado e resposta final."""
+    linhas = []
+    for mensagem in turno:
+        for parte in mensagem["parts"]:
+            if "text" in parte and mensagem["role"] == "user":
+                linhas.append(f"- Usuário: {_encurtar(parte['text'], 300)}")
+            elif "text" in parte:
+                linhas.append(f"  Resposta: {_encurtar(parte['text'], 400)}")
+            elif "functionCall" in parte:
+                chamada = parte["functionCall"]
+                argumentos = json.dumps(chamada.get("args") or {}, ensure_ascii=False)
+                linhas.append(f"  Ferramenta: {chamada['name']}({_encurtar(argumentos, 200)})")
+            elif "functionResponse" in parte:
+                saida = parte["functionResponse"].get("response", {}).get("output", "")
+                linhas.append(f"  Resultado: {_encurtar(saida, 200)}")
+    return "\n".join(linhas)
+
+
+class ResumoHistorico:
+    """
+    Resumo acumulado dos turnos que saíram da janela de turnos recentes, guardado no estado da conversa.
+    Cada turno é resumido uma única vez; acima de MAX_CARACTERES_RESUMO, os resumos dos turnos mais antigos
+    saem inteiros (nunca no meio de uma linha), então o início do resumo só muda quando um turno sai.
+    """
+
+    def __init__(self, max_caracteres: int = MAX_CARACTERES_RESUMO):
+        self.max_caracteres = max_caracteres
+        self.turnos = 0  # turnos do início do histórico já incorporados
+        self.omitidos = 0  # turnos incorporados cujo resumo saiu pelo limite de tamanho
+        self._itens = []  # resumo de cada turno mantido, do mais antigo ao mais recente
+
+    def limpar(self):
+        self.turnos = 0
+        self.omitidos = 0
+        self._itens = []
+
+    def incorporar(self, turnos: list):
+        """Acrescenta o resumo dos turnos que acabaram de sair da janela e descarta os mais antigos se passar do limite."""
+        for turno in turnos:
+            self._itens.append(resumir_turno(turno))
+        self.turnos += len(turnos)
+        while len(self._itens) > 1 and sum(len(item) + 1 for item in self._itens) > self.max_caracteres:
+            self._itens.pop(0)
+            self.omitidos += 1
+        if self._itens and len(self._itens[0]) > self.max_caracteres:
+            # Um único turno maior que o limite: ficam as suas primeiras linhas inteiras
+            linhas, tamanho = [], 0
+            for linha in self._itens[0].split("\n"):
+                if tamanho + len(linha) + 1 > self.max_caracteres:
+                    break
+                linhas.append(linha)
+                tamanho += len(linha) + 1
+            self._itens[0] = "\n".join(linhas)
+
+    def texto(self) -> str:
+        cabecalho = [f"- ({self.omitidos} interação(ões) mais antiga(s) omitida(s))"] if self.omitidos else []
+        return "\n".join(cabecalho + self._itens)
+
+    def mensagens(self) -> list:
+        """Mensagens que substituem os turnos resumidos: o resumo acumulado e uma confirmação do modelo."""
+        if not self.turnos:
+            return []
+        return [
+            {"role": "user", "parts": [{"text": f"Resumo das interações anteriores desta conversa:\n{self.texto()}"}]},
+            {"role": "model", "parts": [{"text": "Entendido, vou considerar esse histórico."}]},
+        ]
+
+
+def compactar_historico(mensagens: list, orcamento_tokens: int = ORCAMENTO_HISTORICO_TOKENS,
+                        turnos_recentes: int = TURNOS_RECENTES, resumo: ResumoHistorico | None = None) -> list:
+    """
+    Retorna o histórico a enviar ao modelo dentro do orçamento de tokens estimados.
+
+    Se o histórico couber, ele é devolvido sem alterações. Caso contrário, os turnos anteriores aos
+    'turnos_recentes' últimos são substituídos pelo resumo; se ainda assim não couber, menos turnos
+    são mantidos na íntegra (no mínimo o turno atual, que o modelo precisa ver completo).
+
+    'resumo' é o ResumoHistorico da conversa, atualizado aqui só com os turnos que saíram da janela desde
+    a chamada anterior (um turno resumido continua resumido). Sem ele, o resumo é montado do zero.
+    """
+    if estimar_tokens(mensagens) <= orcamento_tokens:
+        return mensagens
+    resumo = resumo if resumo is not None else ResumoHistorico()
+    turnos = _dividir_turnos(mensagens)
+    if resumo.turnos >= len(turnos):
+        # O histórico foi reiniciado (nova conversa): o resumo anterior não vale mais
+        resumo.limpar()
+    for mantidos in range(min(turnos_recentes, len(turnos)), 0, -1):
+        corte = max(resumo.turnos, len(turnos) - mantidos)
+        resumo.incorporar(turnos[resumo.turnos:corte])
+        compactado = resumo.mensagens() + [m for turno in turnos[corte:] for m in turno]
+        if estimar_tokens(compactado) <= orcamento_tokens:
+            break
+    return compactado
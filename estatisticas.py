@@ -0,0 +1,232 @@
+"""
+Agregados incrementais de um dataset: contagem por Class, momentos por coluna numérica e quantis
+aproximados, calculados bloco a bloco (leitura em streaming, perfil e anexação de lotes).
+
+Para cada coluna, um bloco se resume a contagem, média, M2 (soma dos quadrados dos desvios em relação à
+média), mínimo e máximo, obtidos em uma passada vetorizada. Blocos são combinados pela fórmula paralela
+de Chan et al.: a média e o M2 do todo saem dos dois resumos e da diferença entre as médias, sem revisitar
+as linhas e sem o cancelamento numérico de acumular soma e soma dos quadrados. A variância é M2 / (n - 1).
+O mesmo vale por classe, o que permite ao perfil derivar a correlação com Class só dos momentos.
+
+Os quantis vêm de amostras reservatório (Algoritmo R) de tamanho fixo, uma geral e uma por classe: cada
+linha vista tem a mesma probabilidade de estar na amostra, qualquer que seja a ordem dos blocos. Enquanto
+o dataset, ou a classe, cabe na amostra, os quantis são exatos.
+"""
+import copy
+
+import numpy as np
+import pandas as pd
+
+
+def _momentos(valores: np.ndarray) -> tuple:
+    """
+    Calcula contagem (sem NaN), média, soma dos quadrados dos desvios (M2), mínimo e máximo
+    de cada coluna de uma matriz 2D, ignorando NaN, em uma única passada vetorizada.
+    """
+    validos = ~np.isnan(valores)
+    contagem = validos.sum(axis=0)
+    soma = np.where(validos, valores, 0.0).sum(axis=0)
+    with np.errstate(invalid="ignore", divide="ignore"):
+        media = np.where(contagem > 0, soma / np.maximum(contagem, 1), 0.0)
+    desvios = np.where(validos, valores - media, 0.0)
+    m2 = (desvios * desvios).sum(axis=0)
+    minimo = np.where(validos, valores, np.inf).min(axis=0, initial=np.inf)
+    maximo = np.where(validos, valores, -np.inf).max(axis=0, initial=-np.inf)
+    return contagem, media, m2, minimo, maximo
+
+
+def _combinar_momentos(a: tuple, b: tuple) -> tuple:
+    """Combina os momentos de dois blocos de dados (fórmula paralela de Chan et al.), coluna a coluna."""
+    n_a, media_a, m2_a, min_a, max_a = a
+    n_b, media_b, m2_b, min_b, max_b = b
+    n = n_a + n_b
+    delta = media_b - media_a
+    with np.errstate(invalid="ignore", divide="ignore"):
+        peso_b = np.where(n > 0, n_b / np.maximum(n, 1), 0.0)
+        media = media_a + delta * peso_b
+        m2 = m2_a + m2_b + delta * delta * np.where(n > 0, n_a * n_b / np.maximum(n, 1), 0.0)
+    return n, media, m2, np.minimum(min_a, min_b), np.maximum(max_a, max_b)
+
+
+class _Reservatorio:
+    """Amostra reservatório uniforme (Algoritmo R) de tamanho fixo sobre as linhas vistas até agora."""
+
+    def __init__(self, tamanho: int, colunas: int, rng: np.random.Generator):
+        self.tamanho = tamanho
+        self.vistas = 0
+        self.preenchida = 0
+        self.valores = np.empty((tamanho, colunas), dtype=np.float64)
+        self._rng = rng
+
+    def atualizar(self, valores: np.ndarray):
+        """Amostragem reservatório vetorizada sobre as linhas do bloco."""
+        livres = self.tamanho - self.preenchida
+        if livres > 0:
+            novas = valores[:livres]
+            self.valores[self.preenchida:self.preenchida + len(novas)] = novas
+            self.preenchida += len(novas)
+            self.vistas += len(novas)
+            valores = valores[len(novas):]
+        if not len(valores):
+            return
+        # A i-ésima linha vista (1-based) ocupa uma posição aleatória do reservatório com probabilidade k/i
+        vistas = self.vistas + np.arange(1, len(valores) + 1)
+        posicoes = np.floor(self._rng.random(len(valores)) * vistas).astype(np.int64)
+        selecionadas = posicoes < self.tamanho
+        self.valores[posicoes[selecionadas]] = valores[selecionadas]
+        self.vistas += len(valores)
+
+    def amostra(self) -> np.ndarray:
+        return self.valores[:self.preenchida]
+
+
+class EstatisticasIncrementais:
+    """
+    Agregados de um dataset calculados bloco a bloco, sem manter o DataFrame completo em memória.
+
+    São exatos: contagem por Class e, para cada coluna numérica, contagem, média, variância,
+    mínimo e máximo (no geral e por classe). Os quantis são aproximados a partir de amostras
+    reservatório uniformes de 'tamanho_amostra' linhas, uma geral e uma por classe (exatos enquanto
+    o dataset, ou a classe, couber na amostra: a classe das fraudes costuma caber inteira).
+    """
+
+    def __init__(self, tamanho_amostra: int = 20_000, semente: int = 0):
+        self.tamanho_amostra = tamanho_amostra
+        self.linhas = 0
+        self.colunas = None
+        self.momentos = None
+        self.momentos_por_classe = {}
+        self.contagem_classes = {}
+        self._reservatorio = None
+        self._reservatorios_classe = {}
+        self._rng = np.random.default_rng(semente)
+
+    @classmethod
+    def de_dataframe(cls, df: pd.DataFrame, tamanho_bloco: int = 100_000, **kwargs) -> "EstatisticasIncrementais":
+        """Calcula os agregados de um DataFrame já carregado, em blocos de 'tamanho_bloco' linhas."""
+        estatisticas = cls(**kwargs)
+        for inicio in range(0, len(df), tamanho_bloco):
+            estatisticas.atualizar(df.iloc[inicio:inicio + tamanho_bloco])
+        return estatisticas
+
+    @classmethod
+    def de_matriz(cls, colunas: list, valores: np.ndarray, classes: np.ndarray | None = None,
+                  **kwargs) -> "EstatisticasIncrementais":
+        """Calcula os agregados a partir de uma matriz float64 já materializada (ex.: a do perfil), sem nova conversão."""
+        estatisticas = cls(**kwargs)
+        estatisticas._iniciar(colunas)
+        estatisticas._incorporar(valores, classes)
+        return estatisticas
+
+    def copiar(self) -> "EstatisticasIncrementais":
+        """Cópia independente: atualizar a cópia não altera os agregados originais."""
+        return copy.deepcopy(self)
+
+    @property
+    def amostra(self) -> np.ndarray:
+        """Amostra reservatório geral (linhas x colunas numéricas)."""
+        return self._reservatorio.amostra() if self._reservatorio is not None else np.empty((0, 0))
+
+    def _iniciar(self, colunas: list):
+        self.colunas = list(colunas)
+        self._reservatorio = _Reservatorio(self.tamanho_amostra, len(self.colunas), self._rng)
+
+    def atualizar(self, bloco: pd.DataFrame):
+        """Incorpora um bloco de linhas aos agregados."""
+        if self.colunas is None:
+            self._iniciar([c for c in bloco.columns if pd.api.types.is_numeric_dtype(bloco[c])])
+        if bloco.empty:
+            return
+        valores = bloco[self.colunas].to_numpy(dtype=np.float64, na_value=np.nan)
+        classes = bloco['Class'].to_numpy() if 'Class' in bloco.columns else None
+        self._incorporar(valores, classes)
+
+    def _incorporar(self, valores: np.ndarray, classes: np.ndarray | None):
+        """Combina os momentos e as amostras de uma matriz de valores (e suas classes) com os agregados."""
+        if not len(valores):
+            return
+        momentos_bloco = _momentos(valores)
+        self.momentos = momentos_bloco if self.momentos is None else _combinar_momentos(self.momentos, momentos_bloco)
+
+        if classes is not None:
+            for classe in pd.unique(classes):
+                if pd.isna(classe):
+                    continue
+                mascara = classes == classe
+                chave = classe.item() if hasattr(classe, "item") else classe
+                self.contagem_classes[chave] = self.contagem_classes.get(chave, 0) + int(mascara.sum())
+                valores_classe = valores[mascara]
+                momentos_classe = _momentos(valores_classe)
+                anteriores = self.momentos_por_classe.get(chave)
+                self.momentos_por_classe[chave] = (
+                    momentos_classe if anteriores is None else _combinar_momentos(anteriores, momentos_classe)
+                )
+                reservatorio = self._reservatorios_classe.get(chave)
+                if reservatorio is None:
+                    reservatorio = self._reservatorios_classe[chave] = _Reservatorio(
+                        self.tamanho_amostra, len(self.colunas), self._rng
+                    )
+                reservatorio.atualizar(valores_classe)
+
+        self._reservatorio.atualizar(valores)
+        self.linhas += len(valores)
+
+    @staticmethod
+    def _tabela(momentos: tuple, colunas: list) -> pd.DataFrame:
+        """Converte uma tupla de momentos em tabela (count, mean, std, min, max) por coluna."""
+        contagem, media, m2, minimo, maximo = momentos
+        with np.errstate(invalid="ignore", divide="ignore"):
+            desvio = np.sqrt(np.where(contagem > 1, m2 / np.maximum(contagem - 1, 1), np.nan))
+        vazia = contagem == 0
+        return pd.DataFrame(
+            {
+                "count": contagem,
+                "mean": np.where(vazia, np.nan, media),
+                "std": desvio,
+                "min": np.where(vazia, np.nan, minimo),
+                "max": np.where(vazia, np.nan, maximo),
+            },
+            index=colunas,
+        ).T
+
+    def tabela(self, classe=None) -> pd.DataFrame:
+        """Contagem, média, desvio, mínimo e máximo exatos de cada coluna numérica (de todas as linhas ou de uma classe)."""
+        momentos = self.momentos if classe is None else self.momentos_por_classe.get(classe)
+        if momentos is None:
+            return pd.DataFrame(np.nan, index=["count", "mean", "std", "min", "max"], columns=self.colunas or [])
+        return self._tabela(momentos, self.colunas)
+
+    def quantis(self, qs=(0.25, 0.5, 0.75), classe=None) -> pd.DataFrame:
+        """Quantis aproximados de cada coluna numérica (de todas as linhas ou de uma classe), estimados pelas amostras."""
+        if classe is None:
+            reservatorio = self._reservatorio
+        else:
+            reservatorio = self._reservatorios_classe.get(classe)
+        amostra = reservatorio.amostra() if reservatorio is not None else np.empty((0, 0))
+        qs = [qs] if np.isscalar(qs) else list(qs)
+        if not len(amostra):
+            return pd.DataFrame(np.nan, index=qs, columns=self.colunas or [])
+        return pd.DataFrame(np.nanquantile(amostra, qs, axis=0), index=qs, columns=self.colunas)
+
+    def resumo(self) -> pd.DataFrame:
+        """Tabela no formato de df.describe() com os agregados globais de todas as linhas lidas."""
+        if self.momentos is None:
+            return pd.DataFrame()
+        tabela = self._tabela(self.momentos, self.colunas)
+        quantis = self.quantis()
+        quantis.index = ["25%", "50%", "75%"]
+        return pd.concat([tabela.loc[["count", "mean", "std", "min"]], quantis, tabela.loc[["max"]]])
+
+    def resumo_por_classe(self, coluna: str = 'Amount') -> pd.DataFrame:
+        """Contagem, média, desvio, mínimo e máximo de uma coluna para cada valor de Class."""
+        linhas = {
+            classe: self._tabela(momentos, self.colunas)[coluna]
+            for classe, momentos in sorted(self.momentos_por_classe.items())
+        }
+        return pd.DataFrame(linhas).T.rename_axis('Class')
+
+    def __repr__(self) -> str:
+        return (
+            f"EstatisticasIncrementais(linhas={self.linhas}, colunas={len(self.colunas or [])}, "
+            f"contagem_classes={self.contagem_classes})"
+        )
@@ -0,0 +1,548 @@
+"""
+Cliente HTTP da API do Gemini.
+
+Uma única sessão HTTP (keep-alive, pool de conexões) é compartilhada por todas as sessões do
+Streamlit, então as chamadas de um mesmo turno reaproveitam a conexão TCP/TLS já aberta. O corpo
+é serializado uma vez por chamada e comprimido com gzip quando grande. As novas tentativas usam
+backoff exponencial com jitter e respeitam Retry-After/RetryInfo; um disjuntor (circuit breaker)
+interrompe as chamadas por um tempo quando a API falha repetidamente. O modo streaming
+(streamGenerateContent com SSE) entrega o texto à medida que é gerado.
+
+Opcionalmente, as respostas são memorizadas em disco (GEMINI_CACHE_RESPOSTAS) ou gravadas e
+reproduzidas sem rede (GEMINI_MODO=gravar|reproduzir), pela chave canônica da requisição.
+"""
+import email.utils
+import gzip
+import hashlib
+import json
+import os
+import random
+import re
+import threading
+import time
+
+import requests
+from requests.adapters import HTTPAdapter
+
+from metricas import anotar, contar, trecho
+
+# URL base da API (pode apontar para o servidor local de mock_gemini.py).
+GEMINI_BASE_URL = os.environ.get("GEMINI_BASE_URL", "https://generativelanguage.googleapis.com/v1beta")
+GEMINI_MAX_TENTATIVAS = int(os.environ.get("GEMINI_MAX_TENTATIVAS", "5"))
+# Timeouts (s) de conexão e de leitura.
+GEMINI_TIMEOUT = (10, 120)
+# Corpos a partir deste tamanho (bytes) são enviados com Content-Encoding: gzip; 0 desativa.
+GEMINI_COMPRIMIR_MIN_BYTES = int(os.environ.get("GEMINI_COMPRIMIR_MIN_BYTES", "16384"))
+# Backoff: espera base e máxima (s) entre tentativas.
+BACKOFF_BASE_S = 1.0
+BACKOFF_MAX_S = 30.0
+# Disjuntor: chamadas consecutivas com as tentativas esgotadas para abrir e tempo (s) aberto antes de permitir uma nova.
+DISJUNTOR_FALHAS = 5
+DISJUNTOR_ESPERA_S = 30.0
+
+# Cache de respostas em disco (desativado por padrão): mesma requisição -> mesma resposta, até expirar.
+GEMINI_CACHE_RESPOSTAS = os.environ.get("GEMINI_CACHE_RESPOSTAS", "0") != "0"
+GEMINI_CACHE_DIR = os.environ.get("GEMINI_CACHE_DIR", os.path.join(".cache", "gemini"))
+GEMINI_CACHE_TTL_S = float(os.environ.get("GEMINI_CACHE_TTL_S", str(24 * 3600)))
+GEMINI_CACHE_MAX_MB = int(os.environ.get("GEMINI_CACHE_MAX_MB", "256"))
+# Gravação/reprodução de conversas: 'gravar' guarda cada resposta no arquivo GEMINI_GRAVACAO;
+# 'reproduzir' responde só a partir dele, sem rede (requisições não gravadas geram erro).
+GEMINI_MODO = os.environ.get("GEMINI_MODO", "").lower()
+GEMINI_GRAVACAO = os.environ.get("GEMINI_GRAVACAO", os.path.join(".cache", "gravacoes", "conversa.jsonl"))
+
+# Status HTTP considerados temporários (vale a pena tentar novamente).
+STATUS_TEMPORARIOS = {408, 429, 500, 502, 503, 504}
+
+
+class ErroGemini(Exception):
+    """Falha definitiva em uma chamada à API do Gemini."""
+
+    def __init__(self, mensagem: str, status: int | None = None):
+        super().__init__(mensagem)
+        self.status = status
+
+
+class DisjuntorAberto(ErroGemini):
+    """O disjuntor está aberto: a API falhou repetidamente e as chamadas estão suspensas."""
+
+
+class Disjuntor:
+    """
+    Circuit breaker simples, seguro para várias threads. Fechado: as chamadas passam. Aberto (após
+    'falhas_para_abrir' chamadas seguidas com as tentativas esgotadas): as chamadas são recusadas por
+    'espera_s'. Meio-aberto: vencida a espera, uma única chamada de teste passa; ela pertence à thread
+    que a fez, que pode usar todas as suas tentativas, e o resultado final fecha ou reabre o disjuntor.
+    """
+
+    def __init__(self, falhas_para_abrir: int = DISJUNTOR_FALHAS, espera_s: float = DISJUNTOR_ESPERA_S):
+        self.falhas_para_abrir = falhas_para_abrir
+        self.espera_s = espera_s
+        self._falhas = 0
+        self._aberto_ate = 0.0
+        # Thread da chamada de teste em andamento no estado meio-aberto (None se não houver)
+        self._sonda = None
+        self._lock = threading.Lock()
+
+    @property
+    def estado(self) -> str:
+        """'fechado', 'aberto' ou 'meio-aberto'."""
+        with self._lock:
+            if self._falhas < self.falhas_para_abrir:
+                return "fechado"
+            if self._sonda is not None or time.monotonic() >= self._aberto_ate:
+                return "meio-aberto"
+            return "aberto"
+
+    def permitir(self) -> bool:
+        """
+        Indica se uma chamada pode começar agora. Deve ser consultado uma vez por chamada (não por tentativa);
+        no estado meio-aberto, a chamada liberada passa a ser a chamada de teste.
+        """
+        with self._lock:
+            if self._falhas < self.falhas_para_abrir:
+                return True
+            if self._sonda is None and time.monotonic() >= self._aberto_ate:
+                self._sonda = threading.get_ident()
+                return True
+            return False
+
+    def segundos_restantes(self) -> float:
+        with self._lock:
+            return max(0.0, self._aberto_ate - time.monotonic())
+
+    def registrar_sucesso(self):
+        with self._lock:
+            self._falhas = 0
+            self._sonda = None
+
+    def registrar_falha(self):
+        """Registra uma chamada com as tentativas esgotadas; ao atingir o limite (ou se a chamada de teste falhar), abre o disjuntor."""
+        with self._lock:
+            self._falhas += 1
+            self._sonda = None
+            if self._falhas >= self.falhas_para_abrir:
+                self._aberto_ate = time.monotonic() + self.espera_s
+
+    def liberar(self):
+        """Encerra sem resultado (cancelamento, erro do cliente) a chamada de teste da thread atual, se houver."""
+        with self._lock:
+            if self._sonda == threading.get_ident():
+                self._sonda = None
+
+
+def _espera_sugerida(resposta: requests.Response) -> float | None:
+    """Espera (s) sugerida pelo servidor: cabeçalho Retry-After ou RetryInfo.retryDelay do corpo de erro."""
+    retry_after = resposta.headers.get("Retry-After")
+    if retry_after:
+        try:
+            return max(0.0, float(retry_after))
+        except ValueError:
+            try:
+                data = email.utils.parsedate_to_datetime(retry_after)
+            except (TypeError, ValueError):
+                # Cabeçalho malformado: sem sugestão, quem chama usa o backoff exponencial
+                data = None
+            if data is not None:
+                return max(0.0, data.timestamp() - time.time())
+    try:
+        detalhes = resposta.json().get("error", {}).get("details", [])
+    except ValueError:
+        return None
+    for detalhe in detalhes:
+        if detalhe.get("@type", "").endswith("google.rpc.RetryInfo"):
+            encontrado = re.match(r"([\d.]+)s", str(detalhe.get("retryDelay", "")))
+            if encontrado:
+                return float(encontrado.group(1))
+    return None
+
+
+def chave_requisicao(modelo: str, payload: dict) -> str:
+    """
+    Hash canônico de uma requisição: modelo, instrução do sistema, ferramentas, configuração de
+    ferramentas e histórico, serializados com chaves ordenadas (a ordem dos campos não importa).
+    """
+    canonico = {
+        "modelo": modelo,
+        **{campo: payload.get(campo) for campo in ("systemInstruction", "tools", "toolConfig", "generationConfig", "contents")},
+    }
+    texto = json.dumps(canonico, ensure_ascii=False, sort_keys=True, separators=(",", ":"))
+    return hashlib.sha256(texto.encode("utf-8")).hexdigest()
+
+
+def _resposta_reutilizavel(resposta: dict) -> bool:
+    """Só respostas completas (com conteúdo e sem bloqueio) são guardadas no cache ou na gravação."""
+    candidatos = resposta.get("candidates") or []
+    return bool(candidatos) and bool(candidatos[0].get("content", {}).get("parts")) \
+        and candidatos[0].get("finishReason", "STOP") in ("STOP", "MAX_TOKENS")
+
+
+class CacheRespostas:
+    """
+    Cache de respostas em disco: um arquivo JSON por chave de requisição, com validade (TTL) e limite de
+    tamanho. Ao passar do limite, as entradas usadas há mais tempo (mtime, atualizado a cada acerto) saem.
+    """
+
+    def __init__(self, diretorio: str = GEMINI_CACHE_DIR, ttl_s: float = GEMINI_CACHE_TTL_S, max_mb: int = GEMINI_CACHE_MAX_MB):
+        self.diretorio = diretorio
+        self.ttl_s = ttl_s
+        self.max_bytes = max_mb * 1024 * 1024
+        self.acertos = 0
+        self.falhas = 0
+        self._lock = threading.Lock()
+
+    def _caminho(self, chave: str) -> str:
+        return os.path.join(self.diretorio, f"{chave}.json")
+
+    def obter(self, chave: str) -> dict | None:
+        caminho = self._caminho(chave)
+        try:
+            if time.time() - os.path.getmtime(caminho) > self.ttl_s:
+                os.remove(caminho)
+                raise FileNotFoundError(caminho)
+            with open(caminho, encoding="utf-8") as arquivo:
+                resposta = json.load(arquivo)
+            os.utime(caminho)
+        except (OSError, ValueError):
+            with self._lock:
+                self.falhas += 1
+            return None
+        with self._lock:
+            self.acertos += 1
+        return resposta
+
+    def guardar(self, chave: str, resposta: dict):
+        os.makedirs(self.diretorio, exist_ok=True)
+        caminho = self._caminho(chave)
+        temporario = f"{caminho}.tmp-{os.getpid()}-{threading.get_ident()}"
+        with open(temporario, "w", encoding="utf-8") as arquivo:
+            json.dump(resposta, arquivo, ensure_ascii=False)
+        os.replace(temporario, caminho)
+        self._limpar()
+
+    def _limpar(self):
+        """Remove entradas expiradas e, se ainda passar do limite, as usadas há mais tempo."""
+        entradas = []
+        agora = time.time()
+        for nome in os.listdir(self.diretorio):
+            caminho = os.path.join(self.diretorio, nome)
+            try:
+                modificado = os.path.getmtime(caminho)
+                if agora - modificado > self.ttl_s or (".tmp-" in nome and agora - modificado > 3600):
+                    os.remove(caminho)
+                    continue
+                if nome.endswith(".json"):
+                    entradas.append((modificado, os.path.getsize(caminho), caminho))
+            except OSError:
+                continue
+        total = sum(tamanho for _, tamanho, _ in entradas)
+        for _, tamanho, caminho in sorted(entradas):
+            if total <= self.max_bytes:
+                break
+            try:
+                os.remove(caminho)
+            except OSError:
+                pass
+            total -= tamanho
+
+    def estatisticas(self) -> dict:
+        with self._lock:
+            return {"acertos": self.acertos, "falhas": self.falhas}
+
+
+class Gravacao:
+    """
+    Arquivo JSON Lines com as respostas de conversas inteiras, indexadas pela chave da requisição.
+    No modo 'gravar' cada resposta é acrescentada ao arquivo; no modo 'reproduzir' as respostas são
+    servidas a partir dele, sem rede e sem latência.
+    """
+
+    def __init__(self, caminho: str = GEMINI_GRAVACAO, modo: str = GEMINI_MODO):
+        if modo not in ("gravar", "reproduzir"):
+            raise ValueError(f"Modo de gravação inválido: '{modo}' (use 'gravar' ou 'reproduzir').")
+        self.caminho = caminho
+        self.modo = modo
+        self._respostas = {}
+        self._lock = threading.Lock()
+        if os.path.exists(caminho):
+            with open(caminho, encoding="utf-8") as arquivo:
+                for linha in arquivo:
+                    if linha.strip():
+                        registro = json.loads(linha)
+                        self._respostas[registro["chave"]] = registro["resposta"]
+        elif modo == "reproduzir":
+            raise ErroGemini(f"Arquivo de gravação não encontrado: '{caminho}'.")
+
+    def obter(self, chave: str) -> dict | None:
+        with self._lock:
+            resposta = self._respostas.get(chave)
+        return json.loads(json.dumps(resposta)) if resposta is not None else None
+
+    def gravar(self, chave: str, payload: dict, resposta: dict):
+        with self._lock:
+            if chave in self._respostas:
+                return
+            self._respostas[chave] = resposta
+            os.makedirs(os.path.dirname(self.caminho) or ".", exist_ok=True)
+            # A última mensagem acompanha o registro só para facilitar a leitura do arquivo
+            ultima = (payload.get("contents") or [{}])[-1]
+            with open(self.caminho, "a", encoding="utf-8") as arquivo:
+                arquivo.write(json.dumps({"chave": chave, "ultima_mensagem": ultima, "resposta": resposta}, ensure_ascii=False) + "\n")
+
+
+def _entregar_texto(resposta: dict, ao_receber_texto):
+    """Repassa de uma vez o texto de uma resposta memorizada a quem esperava o streaming."""
+    if ao_receber_texto is None:
+        return
+    for candidato in resposta.get("candidates", [])[:1]:
+        for parte in candidato.get("content", {}).get("parts", []):
+            if parte.get("text") and not parte.get("thought"):
+                ao_receber_texto(parte["text"])
+
+
+class ClienteGemini:
+    """Cliente da API generateContent com conexões persistentes, compressão, retry com jitter e disjuntor."""
+
+    def __init__(self, base_url: str = GEMINI_BASE_URL, max_tentativas: int = GEMINI_MAX_TENTATIVAS,
+                 timeout: tuple = GEMINI_TIMEOUT, comprimir_min_bytes: int = GEMINI_COMPRIMIR_MIN_BYTES,
+                 conexoes: int = 16, cache: CacheRespostas | None = None, gravacao: Gravacao | None = None):
+        self.base_url = base_url.rstrip("/")
+        self.cache = cache
+        self.gravacao = gravacao
+        self.max_tentativas = max_tentativas
+        self.timeout = timeout
+        self.comprimir_min_bytes = comprimir_min_bytes
+        self.disjuntor = Disjuntor()
+        self._sessao = requests.Session()
+        # As novas tentativas são controladas aqui, não pelo urllib3
+        adaptador = HTTPAdapter(pool_connections=4, pool_maxsize=conexoes, max_retries=0)
+        self._sessao.mount("https://", adaptador)
+        self._sessao.mount("http://", adaptador)
+        self._sessao.headers.update({"Content-Type": "application/json", "Accept-Encoding": "gzip"})
+
+    def _preparar_corpo(self, payload: dict) -> tuple:
+        """Serializa o payload uma única vez (JSON compacto, UTF-8) e o comprime se for grande."""
+        corpo = json.dumps(payload, ensure_ascii=False, separators=(",", ":")).encode("utf-8")
+        cabecalhos = {}
+        if self.comprimir_min_bytes and len(corpo) >= self.comprimir_min_bytes:
+            corpo = gzip.compress(corpo, compresslevel=5)
+            cabecalhos["Content-Encoding"] = "gzip"
+        return corpo, cabecalhos
+
+    def _backoff(self, tentativa: int) -> float:
+        """Backoff exponencial com 'full jitter'."""
+        return random.uniform(0, min(BACKOFF_MAX_S, BACKOFF_BASE_S * 2 ** tentativa))
+
+    def _post(self, metodo: str, modelo: str, payload: dict, api_key: str, ao_tentar_novamente=None,
+              cancelamento: threading.Event | None = None, stream: bool = False, parametros: dict | None = None):
+        """
+        POST com novas tentativas para erros temporários. Retorna a resposta HTTP bem-sucedida.
+        Com 'stream', o corpo não é lido aqui: as tentativas cobrem apenas o estabelecimento da resposta.
+        """
+        url = f"{self.base_url}/models/{modelo}:{metodo}"
+        corpo, cabecalhos = self._preparar_corpo(payload)
+        cabecalhos["x-goog-api-key"] = api_key
+        anotar(bytes_enviados=len(corpo), comprimido="Content-Encoding" in cabecalhos)
+
+        # O disjuntor é consultado uma vez por chamada: as novas tentativas de uma chamada liberada (inclusive a de
+        # teste do estado meio-aberto) não são interrompidas, e o resultado final é registrado uma única vez
+        if not self.disjuntor.permitir():
+            raise DisjuntorAberto(
+                f"A API do Gemini falhou repetidamente; novas chamadas suspensas por {self.disjuntor.segundos_restantes():.0f}s."
+            )
+        try:
+            return self._post_com_tentativas(url, corpo, cabecalhos, ao_tentar_novamente, cancelamento, stream, parametros)
+        finally:
+            # Sem resultado registrado (erro do cliente, cancelamento), a chamada de teste é devolvida
+            self.disjuntor.liberar()
+
+    def _post_com_tentativas(self, url: str, corpo: bytes, cabecalhos: dict, ao_tentar_novamente,
+                             cancelamento: threading.Event | None, stream: bool, parametros: dict | None):
+        for tentativa in range(self.max_tentativas):
+            try:
+                resposta = self._sessao.post(url, data=corpo, headers=cabecalhos, params=parametros,
+                                             timeout=self.timeout, stream=stream)
+            except requests.exceptions.RequestException as e:
+                motivo = f"Erro de conexão: {e}"
+                espera = self._backoff(tentativa)
+            else:
+                if resposta.ok:
+                    self.disjuntor.registrar_sucesso()
+                    return resposta
+                if resposta.status_code not in STATUS_TEMPORARIOS:
+                    # Erros do cliente (chave inválida, payload malformado) não melhoram com novas tentativas
+                    raise ErroGemini(f"Erro de comunicação com a API (HTTP {resposta.status_code}): {resposta.text}", resposta.status_code)
+                motivo = f"Erro de comunicação com a API (HTTP {resposta.status_code})"
+                sugerida = _espera_sugerida(resposta)
+                espera = min(BACKOFF_MAX_S, sugerida) if sugerida is not None else self._backoff(tentativa)
+                resposta.close()
+
+            if tentativa == self.max_tentativas - 1:
+                # Uma falha por chamada (e não por tentativa): uma só chamada com as tentativas esgotadas
+                # não abre o disjuntor, que é compartilhado por todas as sessões do processo
+                self.disjuntor.registrar_falha()
+                raise ErroGemini(f"Falha na comunicação com a API após {self.max_tentativas} tentativas. {motivo}")
+            contar("novas_tentativas")
+            if ao_tentar_novamente:
+                ao_tentar_novamente(tentativa + 1, espera, motivo)
+            # Espera interrompível: um evento de cancelamento encerra a chamada imediatamente
+            with trecho("gemini.espera", tentativa=tentativa + 1, motivo=motivo):
+                if cancelamento is not None:
+                    if cancelamento.wait(espera):
+                        raise ErroGemini("Chamada à API cancelada.")
+                else:
+                    time.sleep(espera)
+
+    def gerar_conteudo(self, modelo: str, payload: dict, api_key: str, ao_tentar_novamente=None,
+                       cancelamento: threading.Event | None = None) -> dict:
+        """
+        Chama o endpoint generateContent e retorna o JSON da resposta.
+
+        Args:
+            modelo: Nome do modelo (ex: 'gemini-2.5-flash').
+            payload: Corpo da requisição (contents, systemInstruction, tools...).
+            api_key: Chave da API.
+            ao_tentar_novamente: Função opcional chamada como f(tentativa, espera_s, motivo) antes de cada nova tentativa.
+            cancelamento: Evento opcional que interrompe as esperas entre tentativas.
+
+        Raises:
+            ErroGemini: Em erros definitivos ou quando as tentativas se esgotam.
+        """
+        with trecho("gemini", modelo=modelo, streaming=False):
+            return self._memorizada(modelo, payload, lambda: self._ler_json(modelo, payload, api_key, ao_tentar_novamente, cancelamento))
+
+    def _ler_json(self, modelo: str, payload: dict, api_key: str, ao_tentar_novamente,
+                  cancelamento: threading.Event | None) -> dict:
+        resposta = self._post("generateContent", modelo, payload, api_key, ao_tentar_novamente, cancelamento)
+        anotar(bytes_recebidos=len(resposta.content))
+        return resposta.json()
+
+    def _memorizada(self, modelo: str, payload: dict, chamar, ao_receber_texto=None) -> dict:
+        """Resolve a requisição pela gravação/cache quando configurados; senão (ou em caso de falta) chama a API."""
+        if self.cache is None and self.gravacao is None:
+            return chamar()
+        chave = chave_requisicao(modelo, payload)
+        if self.gravacao is not None and self.gravacao.modo == "reproduzir":
+            resposta = self.gravacao.obter(chave)
+            if resposta is None:
+                raise ErroGemini("Requisição não encontrada na gravação (modo 'reproduzir'): a conversa divergiu da gravada.")
+            anotar(cache="gravacao")
+            _entregar_texto(resposta, ao_receber_texto)
+            return resposta
+
+        resposta = self.cache.obter(chave) if self.cache is not None else None
+        if self.cache is not None:
+            anotar(cache="acerto" if resposta is not None else "falha")
+        if resposta is not None:
+            _entregar_texto(resposta, ao_receber_texto)
+        else:
+            resposta = chamar()
+            if self.cache is not None and _resposta_reutilizavel(resposta):
+                self.cache.guardar(chave, resposta)
+        if self.gravacao is not None and _resposta_reutilizavel(resposta):
+            self.gravacao.gravar(chave, payload, resposta)
+        return resposta
+
+    def gerar_conteudo_stream(self, modelo: str, payload: dict, api_key: str, ao_receber_texto=None,
+                              ao_tentar_novamente=None, cancelamento: threading.Event | None = None) -> dict:
+        """
+        Chama o endpoint streamGenerateContent (SSE) e entrega o texto à medida que é gerado.
+
+        Args:
+            modelo, payload, api_key, ao_tentar_novamente, cancelamento: Como em gerar_conteudo.
+            ao_receber_texto: Função opcional chamada com cada novo trecho de texto da resposta.
+
+        Returns:
+            A resposta completa, no mesmo formato de gerar_conteudo (fragmentos de texto concatenados,
+            chamadas de função preservadas), para que o histórico não dependa do modo de chamada.
+
+        Raises:
+            ErroGemini: Em erros definitivos, quando as tentativas se esgotam ou se o fluxo for interrompido.
+        """
+        with trecho("gemini", modelo=modelo, streaming=True):
+            return self._memorizada(
+                modelo, payload,
+                lambda: self._ler_stream(modelo, payload, api_key, ao_receber_texto, ao_tentar_novamente, cancelamento),
+                ao_receber_texto,
+            )
+
+    def _ler_stream(self, modelo: str, payload: dict, api_key: str, ao_receber_texto, ao_tentar_novamente,
+                    cancelamento: threading.Event | None) -> dict:
+        """Faz a chamada SSE e monta a resposta completa a partir dos fragmentos."""
+        resposta = self._post("streamGenerateContent", modelo, payload, api_key, ao_tentar_novamente, cancelamento,
+                              stream=True, parametros={"alt": "sse"})
+        partes = []
+        final = {}
+        fragmentos = 0
+        try:
+            for evento in _eventos_sse(resposta):
+                fragmentos += 1
+                if cancelamento is not None and cancelamento.is_set():
+                    raise ErroGemini("Chamada à API cancelada.")
+                if "error" in evento:
+                    erro = evento["error"]
+                    raise ErroGemini(f"Erro da API durante o streaming: {erro.get('message', erro)}", erro.get("code"))
+                for chave in ("usageMetadata", "modelVersion", "promptFeedback"):
+                    if chave in evento:
+                        final[chave] = evento[chave]
+                for candidato in evento.get("candidates", [])[:1]:
+                    if "finishReason" in candidato:
+                        final["finishReason"] = candidato["finishReason"]
+                    for parte in candidato.get("content", {}).get("parts", []):
+                        _acumular_parte(partes, parte, ao_receber_texto)
+        except requests.exceptions.RequestException as e:
+            raise ErroGemini(f"A conexão foi interrompida durante o streaming: {e}")
+        finally:
+            resposta.close()
+            anotar(fragmentos=fragmentos)
+
+        candidato = {"content": {"role": "model", "parts": partes}, "index": 0}
+        if "finishReason" in final:
+            candidato["finishReason"] = final.pop("finishReason")
+        return {"candidates": [candidato], **final}
+
+
+def _eventos_sse(resposta: requests.Response):
+    """Itera sobre os eventos 'data:' de uma resposta Server-Sent Events, já decodificados como JSON."""
+    dados = []
+    for linha in resposta.iter_lines():
+        if not linha:
+            if dados:
+                yield json.loads(b"\n".join(dados))
+                dados = []
+        elif linha.startswith(b"data:"):
+            dados.append(linha[5:].strip())
+    if dados:
+        yield json.loads(b"\n".join(dados))
+
+
+def _acumular_parte(partes: list, parte: dict, ao_receber_texto=None):
+    """Incorpora a parte de um fragmento à resposta: texto é concatenado, chamadas de função são mantidas inteiras."""
+    if "text" in parte and not parte.get("thought"):
+        if ao_receber_texto and parte["text"]:
+            ao_receber_texto(parte["text"])
+        if partes and set(partes[-1]) == {"text"}:
+            partes[-1]["text"] += parte["text"]
+            return
+        if set(parte) == {"text"}:
+            partes.append({"text": parte["text"]})
+            return
+    partes.append(dict(parte))
+
+
+_clientes = {}
+_clientes_lock = threading.Lock()
+
+
+def obter_cliente(base_url: str | None = None) -> ClienteGemini:
+    """Retorna o cliente compartilhado (um por URL base) do processo, com cache/gravação conforme o ambiente."""
+    base_url = base_url or GEMINI_BASE_URL
+    with _clientes_lock:
+        cliente = _clientes.get(base_url)
+        if cliente is None:
+            cliente = ClienteGemini(
+                base_url,
+                cache=CacheRespostas() if GEMINI_CACHE_RESPOSTAS else None,
+                gravacao=Gravacao() if GEMINI_MODO else None,
+            )
+            _clientes[base_url] = cliente
+        return cliente
@@ -0,0 +1,218 @@
+"""
+Índices do dataset carregado para consultas focadas em fraude.
+
+As fraudes são cerca de 0,17% das linhas, mas 'df[df["Class"] == 1]' ou um recorte por Time percorrem
+o DataFrame inteiro a cada consulta. O índice guarda as posições das linhas de cada classe e a ordem
+das linhas por Time (busca binária para recortes de janela), e mantém em cache os subconjuntos das
+classes pequenas. Ele é construído uma vez por conteúdo de DataFrame (impressão digital), em segundo
+plano na carga, e compartilhado entre as sessões; cada processo do pool de consultas constrói o seu.
+Quando um lote novo é anexado ao dataset, o índice do resultado é derivado do índice anterior
+(IndiceDados.anexar), tratando apenas as linhas novas.
+
+Na consulta_tool ficam disponíveis:
+    fraudes          -> linhas com Class == 1
+    normais          -> linhas com Class == 0
+    janela(t0, t1)   -> linhas com t0 <= Time <= t1, em ordem de Time (limites None = aberto)
+"""
+import copy
+import threading
+from collections import OrderedDict
+from concurrent.futures import Future, ThreadPoolExecutor
+
+import numpy as np
+import pandas as pd
+
+from tools import impressao_digital
+
+# Número de índices mantidos em memória (um por dataset distinto).
+MAX_INDICES = 8
+# Subconjuntos de classe com até esta fração das linhas ficam em cache; os maiores são montados a cada uso.
+MAX_FRACAO_SUBCONJUNTO = 0.1
+
+NOMES_CONSULTA = ("fraudes", "normais", "janela")
+
+_executor_indices = ThreadPoolExecutor(max_workers=1, thread_name_prefix="indice")
+# impressão digital -> Future com o índice, em ordem LRU
+_indices = OrderedDict()
+_indices_lock = threading.Lock()
+
+
+class IndiceDados:
+    """Posições das linhas por classe e ordem das linhas por Time de um DataFrame."""
+
+    def __init__(self, df: pd.DataFrame):
+        self.linhas = len(df)
+        # classe -> posições (inteiras, crescentes) das linhas daquela classe; None sem a coluna 'Class'
+        self.posicoes_classe = None
+        if "Class" in df.columns:
+            classes = df["Class"].to_numpy()
+            self.posicoes_classe = {
+                classe: np.flatnonzero(classes == classe)
+                for classe in df["Class"].dropna().unique().tolist()
+            }
+        # Valores de Time em ordem crescente e, se o DataFrame não estiver ordenado, a permutação que os ordena
+        self.tempos = None
+        self.ordem_tempo = None
+        if "Time" in df.columns:
+            tempos = df["Time"].to_numpy(dtype=np.float64, na_value=np.nan)
+            if len(tempos) and not (np.all(tempos[1:] >= tempos[:-1]) and not np.isnan(tempos[-1])):
+                # NaN vai para o fim da ordem e nunca entra em uma janela com limites finitos
+                self.ordem_tempo = np.argsort(tempos, kind="stable")
+                tempos = tempos[self.ordem_tempo]
+            self.tempos = tempos
+        self._subconjuntos = {}
+        self._lock = threading.Lock()
+
+    def subconjunto(self, df: pd.DataFrame, classe) -> pd.DataFrame:
+        """Linhas de 'df' com Class == classe, sem varrer a coluna (vazio se a classe não existir)."""
+        if self.posicoes_classe is None:
+            raise KeyError("Class")
+        if self.linhas != len(df):
+            # Índice de outro conteúdo (o DataFrame foi alterado): filtra pela coluna
+            print("[AVISO] Índice desatualizado para o DataFrame; filtrando 'Class' sem o índice.")
+            return df[df["Class"].to_numpy() == classe]
+        posicoes = self.posicoes_classe.get(classe)
+        if posicoes is None:
+            return df.iloc[:0]
+        if len(posicoes) > MAX_FRACAO_SUBCONJUNTO * self.linhas:
+            return df.take(posicoes)
+        with self._lock:
+            subconjunto = self._subconjuntos.get(classe)
+            if subconjunto is None:
+                subconjunto = self._subconjuntos[classe] = df.take(posicoes)
+        # Cópia rasa: novas colunas criadas por uma consulta não alteram o subconjunto em cache
+        return subconjunto.copy(deep=False)
+
+    def anexar(self, novas: pd.DataFrame) -> "IndiceDados":
+        """
+        Índice do DataFrame formado por estas linhas seguidas de 'novas' (que recebem as posições seguintes),
+        sem alterar este índice. Só as linhas novas são percorridas; a ordem por Time é obtida com uma
+        ordenação estável das duas sequências já ordenadas (o timsort as funde em tempo linear).
+        """
+        indice = copy.copy(self)
+        indice.linhas = self.linhas + len(novas)
+        indice._lock = threading.Lock()
+        indice._subconjuntos = {}
+
+        if self.posicoes_classe is not None:
+            classes = novas["Class"].to_numpy()
+            indice.posicoes_classe = dict(self.posicoes_classe)
+            for classe in novas["Class"].dropna().unique().tolist():
+                posicoes = np.flatnonzero(classes == classe) + self.linhas
+                anteriores = self.posicoes_classe.get(classe)
+                indice.posicoes_classe[classe] = posicoes if anteriores is None else np.concatenate([anteriores, posicoes])
+            with self._lock:
+                subconjuntos = dict(self._subconjuntos)
+            for classe, subconjunto in subconjuntos.items():
+                # O subconjunto em cache ganha só as linhas novas da classe (se ela continuar pequena)
+                posicoes = indice.posicoes_classe[classe]
+                if len(posicoes) <= MAX_FRACAO_SUBCONJUNTO * indice.linhas:
+                    novas_classe = novas.take(posicoes[len(self.posicoes_classe[classe]):] - self.linhas)
+                    indice._subconjuntos[classe] = pd.concat([subconjunto, novas_classe])
+
+        if self.tempos is not None:
+            tempos_novos = novas["Time"].to_numpy(dtype=np.float64, na_value=np.nan)
+            ordem_nova = np.argsort(tempos_novos, kind="stable")
+            tempos_novos = tempos_novos[ordem_nova]
+            tempos = np.concatenate([self.tempos, tempos_novos])
+            ordem = np.concatenate([
+                np.arange(self.linhas) if self.ordem_tempo is None else self.ordem_tempo,
+                ordem_nova + self.linhas,
+            ])
+            # Lote posterior a todas as linhas anteriores (o caso comum): a concatenação já está ordenada
+            posterior = not len(self.tempos) or not len(tempos_novos) or tempos_novos[0] >= self.tempos[-1]
+            if not posterior:
+                fusao = np.argsort(tempos, kind="stable")
+                tempos = tempos[fusao]
+                ordem = ordem[fusao]
+            indice.tempos = tempos
+            ordenado = posterior and self.ordem_tempo is None and np.array_equal(ordem_nova, np.arange(len(novas)))
+            indice.ordem_tempo = None if ordenado else ordem
+        return indice
+
+    def janela(self, df: pd.DataFrame, t0: float | None = None, t1: float | None = None) -> pd.DataFrame:
+        """
+        Linhas de 'df' com t0 <= Time <= t1 (limites None = aberto), localizadas por busca binária. Se o recorte
+        não corresponder ao índice (DataFrame alterado depois da construção), as linhas são filtradas pela coluna.
+        """
+        if self.tempos is None:
+            raise KeyError("Time")
+        if self.linhas == len(df):
+            inicio = 0 if t0 is None else int(np.searchsorted(self.tempos, t0, side="left"))
+            fim = int(np.searchsorted(self.tempos, np.inf, side="right")) if t1 is None else int(np.searchsorted(self.tempos, t1, side="right"))
+            fim = max(inicio, fim)
+            # Já ordenado por Time: o recorte é uma fatia, sem cópia dos dados
+            recorte = df.iloc[inicio:fim] if self.ordem_tempo is None else df.take(self.ordem_tempo[inicio:fim])
+            # Conferência O(linhas do recorte): os Time das linhas devem ser exatamente os do índice
+            if np.array_equal(recorte["Time"].to_numpy(dtype=np.float64, na_value=np.nan), self.tempos[inicio:fim]):
+                return recorte
+        print("[AVISO] Índice desatualizado para o DataFrame; filtrando 'Time' sem o índice.")
+        return _janela_por_mascara(df, t0, t1)
+
+
+def _janela_por_mascara(df: pd.DataFrame, t0: float | None, t1: float | None) -> pd.DataFrame:
+    """Mesmo resultado de IndiceDados.janela, percorrendo a coluna Time (usado quando o índice não confere)."""
+    tempos = df["Time"].to_numpy(dtype=np.float64, na_value=np.nan)
+    mascara = ~np.isnan(tempos)
+    if t0 is not None:
+        mascara &= tempos >= t0
+    if t1 is not None:
+        mascara &= tempos <= t1
+    posicoes = np.flatnonzero(mascara)
+    return df.take(posicoes[np.argsort(tempos[posicoes], kind="stable")])
+
+
+def agendar_indice(df: pd.DataFrame) -> Future | None:
+    """Agenda a construção do índice em segundo plano (uma vez por conteúdo de DataFrame) e retorna o Future."""
+    if not isinstance(df, pd.DataFrame) or df.empty:
+        return None
+    impressao = impressao_digital(df)
+    with _indices_lock:
+        futuro = _indices.get(impressao)
+        if futuro is None:
+            futuro = _executor_indices.submit(IndiceDados, df)
+            _indices[impressao] = futuro
+            while len(_indices) > MAX_INDICES:
+                _indices.popitem(last=False)
+        _indices.move_to_end(impressao)
+        return futuro
+
+
+def registrar_indice(df: pd.DataFrame, indice: IndiceDados):
+    """Registra um índice já construído (ex.: derivado de uma anexação) para o conteúdo do DataFrame."""
+    futuro = Future()
+    futuro.set_result(indice)
+    impressao = impressao_digital(df)
+    with _indices_lock:
+        _indices[impressao] = futuro
+        _indices.move_to_end(impressao)
+        while len(_indices) > MAX_INDICES:
+            _indices.popitem(last=False)
+
+
+def obter_indice(df: pd.DataFrame) -> IndiceDados:
+    """Retorna o índice do DataFrame, aguardando a construção em segundo plano se ainda não terminou."""
+    futuro = agendar_indice(df)
+    if futuro is None:
+        return IndiceDados(df)
+    return futuro.result()
+
+
+def variaveis_consulta(df: pd.DataFrame, nomes: set) -> dict:
+    """
+    Variáveis do índice para o namespace da consulta_tool. Só os nomes que o código usa são montados,
+    então consultas que não os referenciam não esperam pelo índice.
+    """
+    usados = nomes.intersection(NOMES_CONSULTA)
+    if not usados or not isinstance(df, pd.DataFrame):
+        return {}
+    indice = obter_indice(df)
+    variaveis = {}
+    if indice.posicoes_classe is not None:
+        if "fraudes" in usados:
+            variaveis["fraudes"] = indice.subconjunto(df, 1)
+        if "normais" in usados:
+            variaveis["normais"] = indice.subconjunto(df, 0)
+    if "janela" in usados and indice.tempos is not None:
+        variaveis["janela"] = lambda t0=None, t1=None: indice.janela(df, t0, t1)
+    return variaveis
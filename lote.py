@@ -0,0 +1,185 @@
+"""
+Execução em lote do Agente de Análise de Fraudes, fora do Streamlit (ex.: jobs agendados).
+
+Uso:
+    GEMINI_API_KEY=... python lote.py perguntas.txt data/creditcard.csv --saida resultados/ [--conversas 8] [--max-chamadas 4]
+
+Arquivo de perguntas:
+    .txt    uma pergunta por linha, cada uma em uma conversa independente (linhas vazias e iniciadas por '#' são ignoradas)
+    .jsonl  {"id": "...", "perguntas": ["...", "..."]} por linha: as perguntas de uma linha formam uma só conversa
+
+O dataset é carregado uma única vez (com perfil e índices) e compartilhado por todas as conversas, que rodam
+em paralelo em um pool de threads; o número de chamadas simultâneas à API fica limitado por --max-chamadas.
+Na saída ficam resultados.jsonl (uma linha por conversa, gravada assim que ela termina), respostas.md e os
+gráficos em graficos/<n.º da conversa>_<id>_<pergunta>_<n>.png.
+"""
+import argparse
+import json
+import os
+import re
+import sys
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor, as_completed
+
+import pandas as pd
+
+from agente import Conversa, EstadoConversa, Interface
+from cargas import carga_url
+
+# Conversas executadas ao mesmo tempo e chamadas simultâneas à API do Gemini (somando todas as conversas).
+LOTE_CONVERSAS = int(os.environ.get("LOTE_CONVERSAS", "8"))
+LOTE_MAX_CHAMADAS = int(os.environ.get("LOTE_MAX_CHAMADAS", "4"))
+
+
+class InterfaceLote(Interface):
+    """Interface sem tela: avisos vão para o log e os erros ficam registrados no resultado da conversa."""
+
+    def __init__(self, identificador: str):
+        self.identificador = identificador
+        self.erros = []
+
+    def erro(self, mensagem: str):
+        print(f"[AVISO] Conversa '{self.identificador}': {mensagem}")
+        self.erros.append(mensagem)
+
+
+def ler_perguntas(caminho: str) -> list:
+    """Lê o arquivo de perguntas e retorna as conversas como [{"id", "perguntas"}]. Encerra indicando a linha inválida."""
+    conversas = []
+    with open(caminho, encoding="utf-8") as arquivo:
+        if caminho.lower().endswith(".jsonl"):
+            for numero, linha in enumerate(arquivo, start=1):
+                if not linha.strip():
+                    continue
+                try:
+                    registro = json.loads(linha)
+                except json.JSONDecodeError as e:
+                    sys.exit(f"Erro em '{caminho}', linha {numero}: JSON inválido ({e}).")
+                if not isinstance(registro, dict):
+                    sys.exit(f"Erro em '{caminho}', linha {numero}: esperado um objeto JSON.")
+                perguntas = registro.get("perguntas") or ([registro["pergunta"]] if registro.get("pergunta") else [])
+                if not perguntas or not isinstance(perguntas, list) or not all(isinstance(p, str) for p in perguntas):
+                    sys.exit(f"Erro em '{caminho}', linha {numero}: informe \"perguntas\" (lista de textos) ou \"pergunta\".")
+                conversas.append({"id": str(registro.get("id", numero)), "perguntas": perguntas})
+        else:
+            for linha in arquivo:
+                pergunta = linha.strip()
+                if pergunta and not pergunta.startswith("#"):
+                    conversas.append({"id": str(len(conversas) + 1), "perguntas": [pergunta]})
+    return conversas
+
+
+def carregar_dataset(caminho: str) -> tuple:
+    """Carrega o dataset uma vez para todas as conversas. Retorna (df, estatisticas) ou encerra com a mensagem de erro."""
+    df, estatisticas, mensagem = carga_url(caminho)
+    if not isinstance(df, pd.DataFrame):
+        sys.exit(mensagem)
+    print(f"[INFO] {mensagem}")
+    return df, estatisticas
+
+
+def _nome_arquivo(identificador: str) -> str:
+    return re.sub(r"[^\w.-]+", "_", identificador)[:80] or "conversa"
+
+
+def executar_conversa(conversa_lote: dict, df, estatisticas, limite_chamadas, diretorio: str, indice: int = 0) -> dict:
+    """
+    Executa as perguntas de uma conversa em sequência e grava os gráficos gerados. Retorna o registro da conversa.
+    'indice' é a posição da conversa no arquivo e prefixa os gráficos, pois ids distintos podem gerar o mesmo nome.
+    """
+    identificador = conversa_lote["id"]
+    interface = InterfaceLote(identificador)
+    estado = EstadoConversa(df, estatisticas)
+    conversa = Conversa(estado, interface, limite_chamadas)
+    inicio = time.perf_counter()
+    turnos = []
+    prefixo = f"{indice + 1}_{_nome_arquivo(identificador)}"
+    for numero, pergunta in enumerate(conversa_lote["perguntas"], start=1):
+        estado.tool_images = []
+        erros_anteriores = len(interface.erros)
+        resultado = conversa.responder(pergunta, conversa=identificador, pergunta=numero)
+        graficos = []
+        for imagem in estado.tool_images:
+            nome = os.path.join("graficos", f"{prefixo}_{numero}_{len(graficos) + 1}.png")
+            with open(os.path.join(diretorio, nome), "wb") as arquivo:
+                arquivo.write(imagem.getvalue())
+            graficos.append(nome)
+        # Só os erros registrados neste turno: um erro de pergunta anterior não explica esta falha
+        erros = interface.erros[erros_anteriores:]
+        turnos.append({
+            "pergunta": pergunta,
+            "resposta": resultado["texto"] if resultado else None,
+            "erro": erros[-1] if resultado is None and erros else None,
+            "duracao_s": round(resultado["total_s"], 3) if resultado else None,
+            "etapas": resultado["etapas"] if resultado else [],
+            "graficos": graficos,
+        })
+    return {"id": identificador, "duracao_s": round(time.perf_counter() - inicio, 3), "turnos": turnos}
+
+
+def _gravar_respostas(registros: list, caminho: str):
+    """Relatório em markdown com as perguntas, respostas e gráficos de todas as conversas, na ordem do arquivo."""
+    partes = []
+    for registro in registros:
+        partes.append(f"## Conversa {registro['id']}")
+        for turno in registro["turnos"]:
+            partes.append(f"**Pergunta:** {turno['pergunta']}\n\n{turno['resposta'] or 'Erro: ' + str(turno['erro'])}")
+            partes.extend(f"![gráfico]({grafico})" for grafico in turno["graficos"])
+    with open(caminho, "w", encoding="utf-8") as arquivo:
+        arquivo.write("\n\n".join(partes) + "\n")
+
+
+def executar_lote(arquivo_perguntas: str, dataset: str, saida: str, conversas: int = LOTE_CONVERSAS,
+                  max_chamadas: int = LOTE_MAX_CHAMADAS) -> list:
+    """Executa todas as conversas do arquivo sobre o dataset e grava os resultados em 'saida'. Retorna os registros."""
+    lista = ler_perguntas(arquivo_perguntas)
+    if not lista:
+        sys.exit(f"Nenhuma pergunta em '{arquivo_perguntas}'.")
+    if not Interface().chave_api():
+        sys.exit("Defina a variável de ambiente GEMINI_API_KEY.")
+    os.makedirs(os.path.join(saida, "graficos"), exist_ok=True)
+    df, estatisticas = carregar_dataset(dataset)
+
+    limite_chamadas = threading.BoundedSemaphore(max_chamadas)
+    registros = [None] * len(lista)
+    inicio = time.perf_counter()
+    with open(os.path.join(saida, "resultados.jsonl"), "w", encoding="utf-8") as arquivo_resultados, \
+            ThreadPoolExecutor(max_workers=conversas, thread_name_prefix="conversa") as executor:
+        futuros = {
+            executor.submit(executar_conversa, conversa_lote, df, estatisticas, limite_chamadas, saida, i): i
+            for i, conversa_lote in enumerate(lista)
+        }
+        for futuro in as_completed(futuros):
+            i = futuros[futuro]
+            try:
+                registros[i] = futuro.result()
+            except Exception as e:
+                registros[i] = {"id": lista[i]["id"], "erro": f"{type(e).__name__}: {e}", "turnos": []}
+            arquivo_resultados.write(json.dumps(registros[i], ensure_ascii=False, default=str) + "\n")
+            arquivo_resultados.flush()
+    _gravar_respostas(registros, os.path.join(saida, "respostas.md"))
+
+    turnos = [turno for registro in registros for turno in registro["turnos"]]
+    falhas = sum(1 for turno in turnos if turno["resposta"] is None) + sum(1 for r in registros if "erro" in r)
+    print(f"[INFO] Lote concluído em {time.perf_counter() - inicio:.2f}s: {len(registros)} conversa(s), "
+          f"{len(turnos)} pergunta(s), {falhas} falha(s). Resultados em '{saida}'.")
+    return registros
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Executa conjuntos de perguntas no Agente de Análise de Fraudes, sem o Streamlit.")
+    parser.add_argument("perguntas", help="Arquivo .txt (uma pergunta por linha) ou .jsonl ({\"id\", \"perguntas\"} por linha).")
+    parser.add_argument("dataset", help="Caminho ou URL do CSV (compactado ou não) usado por todas as conversas.")
+    parser.add_argument("--saida", default="resultados_lote", help="Diretório de saída (padrão: resultados_lote).")
+    parser.add_argument("--conversas", type=int, default=LOTE_CONVERSAS, help="Conversas executadas ao mesmo tempo.")
+    parser.add_argument("--max-chamadas", type=int, default=LOTE_MAX_CHAMADAS, help="Chamadas simultâneas à API do Gemini.")
+    args = parser.parse_args()
+
+    registros = executar_lote(args.perguntas, args.dataset, args.saida, args.conversas, args.max_chamadas)
+    falhou = any("erro" in r or any(t["resposta"] is None for t in r["turnos"]) for r in registros)
+    sys.exit(1 if falhou else 0)
+
+
+if __name__ == "__main__":
+    main()
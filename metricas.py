@@ -0,0 +1,241 @@
+"""
+Rastreamento por trechos (spans) e métricas do pipeline do agente.
+
+Cada etapa (chamada ao Gemini, esperas entre tentativas, consulta_tool, grafico_tool, carga de dados,
+perfil) abre um trecho com 'with trecho(nome, **atributos)'. Os trechos de um turno do chat são
+reunidos por 'with turno()' (também nas threads, desde que o contexto seja copiado com
+contextvars.copy_context()), e todos alimentam métricas agregadas do processo: histogramas de
+duração e contadores de bytes, novas tentativas, acertos de cache e erros.
+
+Exportação:
+    METRICAS_JSONL=.cache/metricas/turnos.jsonl  -> um JSON por turno concluído, com todos os trechos
+    METRICAS_PORTA=9464                          -> formato texto do Prometheus em http://host:9464/metrics
+"""
+import contextvars
+import json
+import os
+import threading
+import time
+from contextlib import contextmanager
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+# Arquivo JSON Lines com um registro por turno ("" desativa) e porta do endpoint do Prometheus (0 desativa).
+METRICAS_JSONL = os.environ.get("METRICAS_JSONL", "")
+METRICAS_PORTA = int(os.environ.get("METRICAS_PORTA", "0"))
+# Limites (s) dos baldes dos histogramas de duração.
+LIMITES_HISTOGRAMA_S = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0)
+# Atributos numéricos somados em contadores (agente_<atributo>_total).
+ATRIBUTOS_CONTADOS = ("bytes_enviados", "bytes_recebidos", "bytes_imagem", "novas_tentativas")
+# Atributos que viram rótulos das métricas, além do nome do trecho.
+ATRIBUTOS_ROTULOS = ("ferramenta",)
+
+_trecho_atual = contextvars.ContextVar("trecho_atual", default=None)
+_turno_atual = contextvars.ContextVar("turno_atual", default=None)
+
+
+class Trecho:
+    """Uma etapa medida: nome, atributos (tamanhos, cache, ferramenta...), início e duração."""
+
+    __slots__ = ("nome", "atributos", "pai", "inicio", "duracao_s")
+
+    def __init__(self, nome: str, atributos: dict, pai: str | None):
+        self.nome = nome
+        self.atributos = atributos
+        self.pai = pai
+        self.inicio = time.perf_counter()
+        self.duracao_s = None
+
+    def definir(self, **atributos):
+        self.atributos.update(atributos)
+
+    def contar(self, atributo: str, valor: int = 1):
+        self.atributos[atributo] = self.atributos.get(atributo, 0) + valor
+
+    def como_dict(self, origem: float = 0.0) -> dict:
+        return {
+            "nome": self.nome,
+            "pai": self.pai,
+            "inicio_s": round(self.inicio - origem, 6),
+            "duracao_s": round(self.duracao_s, 6) if self.duracao_s is not None else None,
+            **self.atributos,
+        }
+
+
+class Turno:
+    """Os trechos de um turno do chat, na ordem em que terminaram."""
+
+    def __init__(self, atributos: dict):
+        self.atributos = atributos
+        self.trechos = []
+        self.inicio = time.perf_counter()
+        self.duracao_s = None
+
+    def como_dict(self) -> dict:
+        return {
+            "data": time.strftime("%Y-%m-%dT%H:%M:%S%z"),
+            "duracao_s": round(self.duracao_s, 6) if self.duracao_s is not None else None,
+            **self.atributos,
+            "trechos": [t.como_dict(self.inicio) for t in sorted(self.trechos, key=lambda t: t.inicio)],
+        }
+
+
+class _Registro:
+    """Métricas agregadas do processo (contadores e histogramas por rótulos), seguras para várias threads."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.contadores = {}
+        self.histogramas = {}
+
+    def somar(self, nome: str, rotulos: tuple, valor: float = 1):
+        with self._lock:
+            chave = (nome, rotulos)
+            self.contadores[chave] = self.contadores.get(chave, 0) + valor
+
+    def observar(self, nome: str, rotulos: tuple, valor: float):
+        with self._lock:
+            chave = (nome, rotulos)
+            histograma = self.histogramas.get(chave)
+            if histograma is None:
+                histograma = self.histogramas[chave] = {"baldes": [0] * len(LIMITES_HISTOGRAMA_S), "soma": 0.0, "contagem": 0}
+            for i, limite in enumerate(LIMITES_HISTOGRAMA_S):
+                if valor <= limite:
+                    histograma["baldes"][i] += 1
+            histograma["soma"] += valor
+            histograma["contagem"] += 1
+
+    def copia(self) -> tuple:
+        with self._lock:
+            return dict(self.contadores), {chave: {**h, "baldes": list(h["baldes"])} for chave, h in self.histogramas.items()}
+
+
+_registro = _Registro()
+_arquivo_lock = threading.Lock()
+
+
+def _registrar(trecho_concluido: Trecho):
+    """Alimenta as métricas agregadas e o turno em andamento com um trecho concluído."""
+    atributos = trecho_concluido.atributos
+    rotulos = (("trecho", trecho_concluido.nome),) + tuple((nome, atributos[nome]) for nome in ATRIBUTOS_ROTULOS if nome in atributos)
+    _registro.observar("agente_trecho_duracao_segundos", rotulos, trecho_concluido.duracao_s)
+    for atributo in ATRIBUTOS_CONTADOS:
+        if isinstance(atributos.get(atributo), (int, float)):
+            _registro.somar(f"agente_{atributo}_total", rotulos, atributos[atributo])
+    if "cache" in atributos:
+        _registro.somar("agente_cache_total", rotulos + (("resultado", str(atributos["cache"])),))
+    if "erro" in atributos:
+        _registro.somar("agente_erros_total", rotulos)
+    turno_em_andamento = _turno_atual.get()
+    if turno_em_andamento is not None:
+        turno_em_andamento.trechos.append(trecho_concluido)
+
+
+@contextmanager
+def trecho(nome: str, **atributos):
+    """Mede o bloco como um trecho; exceções são anotadas no atributo 'erro' e propagadas."""
+    pai = _trecho_atual.get()
+    atual = Trecho(nome, atributos, pai.nome if pai is not None else None)
+    token = _trecho_atual.set(atual)
+    try:
+        yield atual
+    except BaseException as e:
+        atual.atributos["erro"] = type(e).__name__
+        raise
+    finally:
+        atual.duracao_s = time.perf_counter() - atual.inicio
+        _trecho_atual.reset(token)
+        _registrar(atual)
+
+
+def anotar(**atributos):
+    """Define atributos no trecho em andamento (sem efeito fora de um trecho)."""
+    atual = _trecho_atual.get()
+    if atual is not None:
+        atual.definir(**atributos)
+
+
+def contar(atributo: str, valor: int = 1):
+    """Incrementa um atributo numérico do trecho em andamento (ex.: novas_tentativas)."""
+    atual = _trecho_atual.get()
+    if atual is not None:
+        atual.contar(atributo, valor)
+
+
+@contextmanager
+def turno(**atributos):
+    """Reúne os trechos de um turno do chat; ao final, grava o turno em METRICAS_JSONL (se configurado)."""
+    atual = Turno(atributos)
+    token = _turno_atual.set(atual)
+    try:
+        with trecho("turno"):
+            yield atual
+    finally:
+        atual.duracao_s = time.perf_counter() - atual.inicio
+        _turno_atual.reset(token)
+        _registro.somar("agente_turnos_total", ())
+        if METRICAS_JSONL:
+            _gravar_jsonl(atual.como_dict())
+
+
+def _gravar_jsonl(registro: dict):
+    try:
+        with _arquivo_lock:
+            os.makedirs(os.path.dirname(METRICAS_JSONL) or ".", exist_ok=True)
+            with open(METRICAS_JSONL, "a", encoding="utf-8") as arquivo:
+                arquivo.write(json.dumps(registro, ensure_ascii=False, default=str) + "\n")
+    except OSError as e:
+        print(f"[AVISO] Não foi possível gravar as métricas em '{METRICAS_JSONL}': {e}")
+
+
+def _formatar_rotulos(rotulos: tuple) -> str:
+    if not rotulos:
+        return ""
+    pares = ",".join(f'{nome}="{str(valor).replace(chr(92), chr(92) * 2).replace(chr(34), chr(92) + chr(34))}"' for nome, valor in rotulos)
+    return "{" + pares + "}"
+
+
+def exportar_prometheus() -> str:
+    """Métricas agregadas do processo no formato texto de exposição do Prometheus."""
+    contadores, histogramas = _registro.copia()
+    linhas = []
+    for nome in sorted({nome for nome, _ in contadores}):
+        linhas.append(f"# TYPE {nome} counter")
+        for (nome_contador, rotulos), valor in sorted(contadores.items()):
+            if nome_contador == nome:
+                linhas.append(f"{nome}{_formatar_rotulos(rotulos)} {valor}")
+    for nome in sorted({nome for nome, _ in histogramas}):
+        linhas.append(f"# TYPE {nome} histogram")
+        for (nome_histograma, rotulos), histograma in sorted(histogramas.items()):
+            if nome_histograma != nome:
+                continue
+            for limite, quantidade in zip(LIMITES_HISTOGRAMA_S, histograma["baldes"]):
+                linhas.append(f"{nome}_bucket{_formatar_rotulos(rotulos + (('le', limite),))} {quantidade}")
+            linhas.append(f"{nome}_bucket{_formatar_rotulos(rotulos + (('le', '+Inf'),))} {histograma['contagem']}")
+            linhas.append(f"{nome}_sum{_formatar_rotulos(rotulos)} {histograma['soma']}")
+            linhas.append(f"{nome}_count{_formatar_rotulos(rotulos)} {histograma['contagem']}")
+    return "\n".join(linhas) + "\n"
+
+
+class _ManipuladorMetricas(BaseHTTPRequestHandler):
+    def log_message(self, formato, *args):
+        pass
+
+    def do_GET(self):
+        if self.path.split("?")[0] != "/metrics":
+            self.send_error(404)
+            return
+        corpo = exportar_prometheus().encode("utf-8")
+        self.send_response(200)
+        self.send_header("Content-Type", "text/plain; version=0.0.4; charset=utf-8")
+        self.send_header("Content-Length", str(len(corpo)))
+        self.end_headers()
+        self.wfile.write(corpo)
+
+
+def iniciar_servidor_metricas(porta: int = METRICAS_PORTA, host: str = "0.0.0.0") -> ThreadingHTTPServer:
+    """Inicia, em uma thread de segundo plano, o endpoint /metrics do Prometheus."""
+    servidor = ThreadingHTTPServer((host, porta), _ManipuladorMetricas)
+    servidor.daemon_threads = True
+    threading.Thread(target=servidor.serve_forever, daemon=True, name="metricas").start()
+    print(f"[INFO] Métricas do Prometheus em http://{host}:{servidor.server_address[1]}/metrics")
+    return servidor
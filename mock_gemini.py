@@ -0,0 +1,201 @@
+"""
+Servidor local que imita a API generateContent do Gemini, para testes e benchmarks offline.
+
+Atende generateContent e streamGenerateContent (?alt=sse, um evento por palavra). As respostas são
+determinísticas: perguntas sobre gráficos geram uma chamada à 'grafico_tool', sobre
+perfil/desbalanceamento à 'perfil_dados', sobre médias/estatísticas à 'consulta_tool', sobre maiores
+valores/top/"por classe" à 'consulta_estruturada', sobre pontuação/risco à 'pontuar_transacoes',
+pedidos para anexar um arquivo .csv à 'carregar_dados' com anexar=true (uma pergunta com vários
+assuntos gera várias chamadas na mesma resposta); depois de functionResponses (ou para qualquer outra
+pergunta) o servidor responde com texto.
+
+Uso:
+    python mock_gemini.py [--porta 8765] [--latencia 0.2] [--latencia-fragmento 0.02] [--falhas 0]
+    GEMINI_BASE_URL=http://127.0.0.1:8765/v1beta streamlit run app.py
+"""
+import argparse
+import gzip
+import json
+import re
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+CAMINHO_GERAR = re.compile(r"^/v1beta/models/(?P<modelo>[^/:]+):(?P<metodo>generateContent|streamGenerateContent)$")
+
+
+def resposta_simulada(payload: dict) -> dict:
+    """
+    Resposta determinística no formato do generateContent para o histórico recebido. Uma pergunta que
+    combina vários assuntos (ex.: média e gráfico) gera várias chamadas de função na mesma resposta.
+    """
+    contents = payload.get("contents") or [{}]
+    partes = contents[-1].get("parts") or [{}]
+    respostas = [parte["functionResponse"] for parte in partes if "functionResponse" in parte]
+    modo_ferramentas = payload.get("toolConfig", {}).get("functionCallingConfig", {}).get("mode", "AUTO")
+
+    if respostas:
+        texto = " ".join(
+            f"Resultado da ferramenta {resposta.get('name', '')}: {str(resposta.get('response', {}).get('output', ''))[:500]}"
+            for resposta in respostas
+        )
+        conteudo = {"role": "model", "parts": [{"text": texto}]}
+    else:
+        texto = partes[-1].get("text", "").lower()
+        chamadas = []
+        if any(p in texto for p in ("gráfico", "grafico", "histograma", "plot")):
+            chamadas.append({"name": "grafico_tool", "args": {"tipo_grafico": "hist", "colunas": ["Amount"], "titulo": "Distribuição de Amount"}})
+        if any(p in texto for p in ("perfil", "desbalanceamento", "correla")):
+            chamadas.append({"name": "perfil_dados", "args": {"secao": "classes"}})
+        if any(p in texto for p in ("média", "media", "estatística", "estatistica", "quantas", "contagem")):
+            chamadas.append({"name": "consulta_tool", "args": {"codigo_python": "df['Amount'].mean()"}})
+        if any(p in texto for p in ("maiores", "top ", "por classe")):
+            chamadas.append({"name": "consulta_estruturada", "args": {
+                "agrupar_por": ["Class"], "agregacoes": [{"funcao": "media", "coluna": "Amount"}, {"funcao": "quantil", "coluna": "Amount", "q": 0.99}],
+            } if "por classe" in texto else {
+                "filtros": [{"coluna": "Class", "operador": "==", "valor": 1}], "ordenar_por": "Amount", "limite": 5, "colunas": ["Time", "Amount"],
+            }})
+        if any(p in texto for p in ("pontu", "suspeit", "risco")):
+            chamadas.append({"name": "pontuar_transacoes", "args": {"limiares": [0.5, 0.9], "top_n": 5}})
+        arquivo = re.search(r"\S+\.csv(?:\.gz|\.zip)?", partes[-1].get("text", ""))
+        if arquivo and "anex" in texto:
+            chamadas.append({"name": "carregar_dados", "args": {"url": arquivo.group(0), "anexar": True}})
+        if chamadas and modo_ferramentas != "NONE":
+            conteudo = {"role": "model", "parts": [{"functionCall": chamada} for chamada in chamadas]}
+        else:
+            conteudo = {"role": "model", "parts": [{"text": "Olá! Posso analisar os dados de fraude para você."}]}
+    return {
+        "candidates": [{"content": conteudo, "finishReason": "STOP", "index": 0}],
+        "usageMetadata": {"promptTokenCount": len(json.dumps(payload)) // 4, "candidatesTokenCount": 20},
+    }
+
+
+def fragmentos_simulados(resposta: dict) -> list:
+    """Divide uma resposta completa em fragmentos de streaming: uma palavra de texto por fragmento."""
+    candidato = resposta["candidates"][0]
+    fragmentos = []
+    for parte in candidato["content"]["parts"]:
+        if "text" in parte:
+            palavras = re.findall(r"\S+\s*|\s+", parte["text"])
+            fragmentos.extend({"text": palavra} for palavra in palavras)
+        else:
+            fragmentos.append(parte)
+    eventos = [{"candidates": [{"content": {"role": "model", "parts": [parte]}, "index": 0}]} for parte in fragmentos]
+    eventos[-1]["candidates"][0]["finishReason"] = candidato["finishReason"]
+    eventos[-1]["usageMetadata"] = resposta["usageMetadata"]
+    return eventos
+
+
+class _ManipuladorGemini(BaseHTTPRequestHandler):
+    # HTTP/1.1 para permitir conexões persistentes (keep-alive)
+    protocol_version = "HTTP/1.1"
+    # Cabeçalhos e corpo saem em escritas separadas: sem TCP_NODELAY, Nagle + ACK atrasado somam ~40 ms por resposta
+    disable_nagle_algorithm = True
+
+    def log_message(self, formato, *args):
+        pass
+
+    def _enviar_json(self, status: int, corpo: dict, cabecalhos: dict | None = None):
+        dados = json.dumps(corpo, ensure_ascii=False).encode("utf-8")
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json; charset=UTF-8")
+        self.send_header("Content-Length", str(len(dados)))
+        for nome, valor in (cabecalhos or {}).items():
+            self.send_header(nome, valor)
+        self.end_headers()
+        self.wfile.write(dados)
+
+    def _enviar_sse(self, eventos: list, latencia_fragmento: float):
+        """Envia os eventos como Server-Sent Events, em codificação chunked (mantém a conexão reutilizável)."""
+        self.send_response(200)
+        self.send_header("Content-Type", "text/event-stream")
+        self.send_header("Transfer-Encoding", "chunked")
+        self.end_headers()
+        for evento in eventos:
+            if latencia_fragmento:
+                time.sleep(latencia_fragmento)
+            dados = f"data: {json.dumps(evento, ensure_ascii=False)}\r\n\r\n".encode("utf-8")
+            self.wfile.write(f"{len(dados):X}\r\n".encode("ascii") + dados + b"\r\n")
+        self.wfile.write(b"0\r\n\r\n")
+
+    def _ler_payload(self) -> dict:
+        corpo = self.rfile.read(int(self.headers.get("Content-Length", 0)))
+        if self.headers.get("Content-Encoding") == "gzip":
+            corpo = gzip.decompress(corpo)
+        return json.loads(corpo or b"{}")
+
+    def do_POST(self):
+        servidor = self.server
+        payload = self._ler_payload()
+        with servidor.lock:
+            servidor.requisicoes += 1
+            falhar = servidor.falhas_restantes > 0
+            if falhar:
+                servidor.falhas_restantes -= 1
+
+        caminho = CAMINHO_GERAR.match(self.path.split("?")[0])
+        if not caminho:
+            self._enviar_json(404, {"error": {"code": 404, "message": f"Caminho desconhecido: {self.path}"}})
+            return
+        if falhar:
+            self._enviar_json(429, {"error": {"code": 429, "message": "Quota excedida (simulado).", "status": "RESOURCE_EXHAUSTED"}},
+                              {"Retry-After": str(servidor.retry_after)})
+            return
+        if servidor.latencia:
+            time.sleep(servidor.latencia)
+        resposta = resposta_simulada(payload)
+        fragmentos = fragmentos_simulados(resposta)
+        if caminho.group("metodo") == "streamGenerateContent":
+            self._enviar_sse(fragmentos, servidor.latencia_fragmento)
+        else:
+            # Sem streaming, a resposta só sai depois de "gerados" todos os fragmentos
+            time.sleep(servidor.latencia_fragmento * len(fragmentos))
+            self._enviar_json(200, resposta)
+
+
+def iniciar_servidor_mock(porta: int = 0, latencia: float = 0.0, falhas: int = 0, retry_after: float = 0.1,
+                          latencia_fragmento: float = 0.0):
+    """
+    Inicia o servidor simulado em uma thread de segundo plano.
+
+    Args:
+        porta: Porta TCP (0 escolhe uma porta livre).
+        latencia: Atraso (s) adicionado a cada resposta bem-sucedida (antes do primeiro fragmento, no streaming).
+        falhas: Número de requisições iniciais respondidas com HTTP 429 e Retry-After.
+        retry_after: Valor (s) do cabeçalho Retry-After nas falhas simuladas.
+        latencia_fragmento: Tempo (s) de "geração" de cada fragmento; sem streaming, a resposta espera todos eles.
+
+    Returns:
+        Uma tupla (servidor, base_url); use servidor.shutdown() para encerrá-lo.
+    """
+    servidor = ThreadingHTTPServer(("127.0.0.1", porta), _ManipuladorGemini)
+    servidor.daemon_threads = True
+    servidor.lock = threading.Lock()
+    servidor.latencia = latencia
+    servidor.falhas_restantes = falhas
+    servidor.retry_after = retry_after
+    servidor.latencia_fragmento = latencia_fragmento
+    servidor.requisicoes = 0
+    threading.Thread(target=servidor.serve_forever, daemon=True).start()
+    return servidor, f"http://127.0.0.1:{servidor.server_address[1]}/v1beta"
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Servidor local que imita a API do Gemini.")
+    parser.add_argument("--porta", type=int, default=8765)
+    parser.add_argument("--latencia", type=float, default=0.0)
+    parser.add_argument("--latencia-fragmento", type=float, default=0.0)
+    parser.add_argument("--falhas", type=int, default=0)
+    args = parser.parse_args()
+
+    servidor, base_url = iniciar_servidor_mock(args.porta, args.latencia, args.falhas, latencia_fragmento=args.latencia_fragmento)
+    print(f"[INFO] Servidor Gemini simulado em {base_url} (Ctrl+C para encerrar).")
+    try:
+        while True:
+            time.sleep(3600)
+    except KeyboardInterrupt:
+        servidor.shutdown()
+
+
+if __name__ == "__main__":
+    main()
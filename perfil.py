@@ -0,0 +1,286 @@
+"""
+Perfil pré-calculado do dataset carregado (desbalanceamento de classes, estatísticas de Amount por
+classe, correlações com Class, quantis e valores ausentes), usado pela ferramenta 'perfil_dados'.
+
+O perfil é calculado uma vez por conteúdo de DataFrame (impressão digital), em segundo plano, com
+passadas vetorizadas de NumPy, e compartilhado entre todas as sessões do processo. Ele guarda também os
+agregados incrementais (EstatisticasIncrementais) de que é derivado: quando um lote novo é anexado ao
+dataset, o perfil do resultado é obtido atualizando esses agregados só com as linhas novas.
+"""
+import threading
+from collections import OrderedDict
+from concurrent.futures import Future, ThreadPoolExecutor
+
+import numpy as np
+import pandas as pd
+
+from estatisticas import EstatisticasIncrementais
+from metricas import anotar, trecho
+from tools import impressao_digital
+
+# Quantis reportados para cada coluna numérica.
+QUANTIS_PERFIL = (0.01, 0.05, 0.25, 0.5, 0.75, 0.95, 0.99)
+# Número de perfis mantidos em memória (um por dataset distinto).
+MAX_PERFIS = 8
+
+SECOES_PERFIL = ("geral", "classes", "amount", "correlacoes", "quantis", "ausentes")
+
+_executor_perfis = ThreadPoolExecutor(max_workers=2, thread_name_prefix="perfil")
+# impressão digital -> Future com o perfil, em ordem LRU
+_perfis = OrderedDict()
+_perfis_lock = threading.Lock()
+
+
+def _estatisticas_por_classe(valores: np.ndarray, classes: np.ndarray) -> pd.DataFrame:
+    """Contagem, média, desvio, mínimo, quantis e máximo de uma coluna para cada classe."""
+    linhas = {}
+    for classe in np.unique(classes):
+        grupo = valores[classes == classe]
+        grupo = grupo[~np.isnan(grupo)]
+        if not len(grupo):
+            continue
+        q25, q50, q75 = np.quantile(grupo, [0.25, 0.5, 0.75])
+        linhas[classe.item()] = {
+            "count": len(grupo),
+            "mean": grupo.mean(),
+            "std": grupo.std(ddof=1) if len(grupo) > 1 else np.nan,
+            "min": grupo.min(),
+            "25%": q25,
+            "50%": q50,
+            "75%": q75,
+            "max": grupo.max(),
+        }
+    return pd.DataFrame(linhas).T.rename_axis("Class")
+
+
+def _correlacoes_com_classe(matriz: np.ndarray, classes: np.ndarray, colunas: list) -> pd.Series:
+    """Correlação de Pearson de cada coluna com Class, calculada de uma vez sobre a matriz centralizada."""
+    y = classes.astype(np.float64)
+    y = y - y.mean()
+    media = np.nanmean(matriz, axis=0)
+    centralizada = np.where(np.isnan(matriz), 0.0, matriz - media)
+    with np.errstate(invalid="ignore", divide="ignore"):
+        covariancia = centralizada.T @ y
+        correlacao = covariancia / (np.sqrt((centralizada * centralizada).sum(axis=0)) * np.sqrt((y * y).sum()))
+    serie = pd.Series(correlacao, index=colunas, name="correlacao_com_Class")
+    return serie.reindex(serie.abs().sort_values(ascending=False).index)
+
+
+def calcular_perfil(df: pd.DataFrame) -> dict:
+    """
+    Calcula o perfil completo do DataFrame.
+
+    Returns:
+        Dicionário com as seções 'geral', 'classes', 'amount', 'correlacoes', 'quantis' e 'ausentes'
+        (DataFrames/Series prontos para formatação, ou None quando a seção não se aplica), e os agregados
+        incrementais em 'estatisticas'.
+    """
+    colunas_numericas = [c for c in df.columns if pd.api.types.is_numeric_dtype(df[c])]
+    matriz = df[colunas_numericas].to_numpy(dtype=np.float64, na_value=np.nan)
+    tem_classe = 'Class' in df.columns and 'Class' in colunas_numericas
+    classes = df['Class'].to_numpy() if tem_classe else None
+
+    perfil = {
+        "geral": pd.Series({
+            "linhas": df.shape[0],
+            "colunas": df.shape[1],
+            "colunas_numericas": len(colunas_numericas),
+            "memoria_mb": round(df.memory_usage(deep=True).sum() / (1024 * 1024), 2),
+        }),
+        "ausentes": df.isna().sum().rename("ausentes"),
+        "quantis": pd.DataFrame(
+            np.nanquantile(matriz, QUANTIS_PERFIL, axis=0) if len(matriz) else np.nan,
+            index=[f"{q:.0%}" for q in QUANTIS_PERFIL],
+            columns=colunas_numericas,
+        ),
+        "classes": None,
+        "amount": None,
+        "correlacoes": None,
+        # Agregados reaproveitados pela matriz já convertida: base das atualizações incrementais
+        "estatisticas": EstatisticasIncrementais.de_matriz(colunas_numericas, matriz, classes),
+        "notas": {},
+    }
+
+    if tem_classe and len(classes):
+        valores, contagens = np.unique(classes[~pd.isna(classes)], return_counts=True)
+        perfil["classes"] = pd.DataFrame(
+            {"contagem": contagens, "proporcao": contagens / contagens.sum()},
+            index=pd.Index([v.item() for v in valores], name="Class"),
+        )
+        outras = [c for c in colunas_numericas if c != 'Class']
+        perfil["correlacoes"] = _correlacoes_com_classe(
+            matriz[:, [colunas_numericas.index(c) for c in outras]], classes, outras
+        )
+        if 'Amount' in colunas_numericas:
+            perfil["amount"] = _estatisticas_por_classe(matriz[:, colunas_numericas.index('Amount')], classes)
+
+    return perfil
+
+
+def _correlacoes_por_momentos(estatisticas: EstatisticasIncrementais, colunas: list) -> pd.Series:
+    """
+    Correlação de Pearson de cada coluna com Class a partir dos momentos por classe: com a média e a
+    variância de cada grupo, a covariância com Class e as variâncias saem sem nova passada pelos dados.
+    Como em _correlacoes_com_classe, a variância de Class é a de todas as linhas, mesmo com valores
+    ausentes na coluna (a covariância não muda: os ausentes contribuem com zero nos dois cálculos).
+    """
+    posicoes = [estatisticas.colunas.index(c) for c in colunas]
+    classes = sorted(estatisticas.momentos_por_classe)
+    y = np.array(classes, dtype=np.float64)[:, None]
+    n = np.array([estatisticas.momentos_por_classe[c][0][posicoes] for c in classes], dtype=np.float64)
+    media = np.array([estatisticas.momentos_por_classe[c][1][posicoes] for c in classes])
+    m2 = np.array([estatisticas.momentos_por_classe[c][2][posicoes] for c in classes])
+    with np.errstate(invalid="ignore", divide="ignore"):
+        total = n.sum(axis=0)
+        media_x = (n * media).sum(axis=0) / total
+        media_y = (n * y).sum(axis=0) / total
+        covariancia = (n * (y - media_y) * (media - media_x)).sum(axis=0)
+        variancia_x = (m2 + n * (media - media_x) ** 2).sum(axis=0)
+        n_classe = np.array([estatisticas.contagem_classes[c] for c in classes], dtype=np.float64)[:, None]
+        media_classe = (n_classe * y).sum() / n_classe.sum()
+        variancia_y = (n_classe * (y - media_classe) ** 2).sum()
+        correlacao = covariancia / np.sqrt(variancia_x * variancia_y)
+    serie = pd.Series(correlacao, index=colunas, name="correlacao_com_Class")
+    return serie.reindex(serie.abs().sort_values(ascending=False).index)
+
+
+def perfil_incremental(df: pd.DataFrame, estatisticas: EstatisticasIncrementais, ausentes: pd.Series) -> dict:
+    """
+    Monta o perfil a partir dos agregados incrementais (já atualizados com as linhas anexadas), sem
+    percorrer o DataFrame: contagens, momentos e correlações são exatos; os quantis vêm das amostras.
+    """
+    colunas = estatisticas.colunas
+    perfil = {
+        "geral": pd.Series({
+            "linhas": df.shape[0],
+            "colunas": df.shape[1],
+            "colunas_numericas": len(colunas),
+            "memoria_mb": round(df.memory_usage(deep=True).sum() / (1024 * 1024), 2),
+        }),
+        "ausentes": ausentes.rename("ausentes"),
+        "quantis": estatisticas.quantis(QUANTIS_PERFIL),
+        "classes": None,
+        "amount": None,
+        "correlacoes": None,
+        "estatisticas": estatisticas,
+        "notas": {
+            "quantis": f"Quantis aproximados (amostra de até {estatisticas.tamanho_amostra:,} linhas), "
+                       "atualizados incrementalmente após a anexação de novos dados.",
+        },
+    }
+    perfil["quantis"].index = [f"{q:.0%}" for q in QUANTIS_PERFIL]
+
+    if 'Class' in colunas and estatisticas.contagem_classes:
+        classes = sorted(estatisticas.contagem_classes)
+        contagens = np.array([estatisticas.contagem_classes[c] for c in classes])
+        perfil["classes"] = pd.DataFrame(
+            {"contagem": contagens, "proporcao": contagens / contagens.sum()},
+            index=pd.Index(classes, name="Class"),
+        )
+        perfil["correlacoes"] = _correlacoes_por_momentos(estatisticas, [c for c in colunas if c != 'Class'])
+        if 'Amount' in colunas:
+            linhas = {}
+            for classe in classes:
+                tabela = estatisticas.tabela(classe)['Amount']
+                if not tabela["count"]:
+                    continue
+                quantis = estatisticas.quantis((0.25, 0.5, 0.75), classe=classe)['Amount']
+                linhas[classe] = {
+                    "count": int(tabela["count"]),
+                    "mean": tabela["mean"],
+                    "std": tabela["std"],
+                    "min": tabela["min"],
+                    "25%": quantis.iloc[0],
+                    "50%": quantis.iloc[1],
+                    "75%": quantis.iloc[2],
+                    "max": tabela["max"],
+                }
+            perfil["amount"] = pd.DataFrame(linhas).T.rename_axis("Class")
+            perfil["notas"]["amount"] = "Quartis por classe aproximados (exatos quando a classe cabe na amostra)."
+
+    return perfil
+
+
+def registrar_perfil(df: pd.DataFrame, perfil: dict):
+    """Registra um perfil já calculado (ex.: atualizado após uma anexação) para o conteúdo do DataFrame."""
+    futuro = Future()
+    futuro.set_result(perfil)
+    impressao = impressao_digital(df)
+    with _perfis_lock:
+        _perfis[impressao] = futuro
+        _perfis.move_to_end(impressao)
+        while len(_perfis) > MAX_PERFIS:
+            _perfis.popitem(last=False)
+
+
+def agendar_perfil(df: pd.DataFrame) -> Future | None:
+    """Agenda o cálculo do perfil em segundo plano (uma vez por conteúdo de DataFrame) e retorna o Future."""
+    if not isinstance(df, pd.DataFrame) or df.empty:
+        return None
+    impressao = impressao_digital(df)
+    with _perfis_lock:
+        futuro = _perfis.get(impressao)
+        if futuro is None:
+            futuro = _executor_perfis.submit(calcular_perfil, df)
+            _perfis[impressao] = futuro
+            while len(_perfis) > MAX_PERFIS:
+                _perfis.popitem(last=False)
+        _perfis.move_to_end(impressao)
+        return futuro
+
+
+def obter_perfil(df: pd.DataFrame, tempo_limite: float | None = 60) -> dict | None:
+    """Retorna o perfil do DataFrame, aguardando o cálculo em segundo plano se ainda não terminou."""
+    futuro = agendar_perfil(df)
+    if futuro is None:
+        return None
+    if futuro.done():
+        anotar(cache="acerto")
+        return futuro.result()
+    # O cálculo em segundo plano ainda não terminou: o tempo de espera aparece como um trecho próprio
+    anotar(cache="falha")
+    with trecho("perfil.espera"):
+        return futuro.result(timeout=tempo_limite)
+
+
+def _formatar(valor) -> str:
+    """Formata uma seção do perfil como markdown."""
+    if isinstance(valor, (pd.Series, pd.DataFrame)):
+        return valor.to_markdown()
+    return str(valor)
+
+
+def perfil_dados(df: pd.DataFrame, secao: str = "tudo") -> str:
+    """
+    Retorna uma seção do perfil pré-calculado do DataFrame, formatada como markdown.
+
+    Args:
+        df: O DataFrame de dados.
+        secao: 'geral', 'classes', 'amount', 'correlacoes', 'quantis', 'ausentes' ou 'tudo'.
+
+    Returns:
+        O conteúdo da seção como string, ou uma mensagem de erro.
+    """
+    if not isinstance(df, pd.DataFrame):
+        return "Erro: O DataFrame não foi carregado corretamente."
+    secao = (secao or "tudo").lower()
+    if secao != "tudo" and secao not in SECOES_PERFIL:
+        return f"Erro: Seção '{secao}' inválida. Seções disponíveis: {', '.join(SECOES_PERFIL)} ou 'tudo'."
+
+    try:
+        with trecho("perfil_dados", secao=secao):
+            perfil = obter_perfil(df)
+    except Exception as e:
+        return f"Erro ao calcular o perfil dos dados: {e}"
+    if perfil is None:
+        return "Erro: O DataFrame está vazio."
+
+    secoes = SECOES_PERFIL if secao == "tudo" else (secao,)
+    partes = []
+    for nome in secoes:
+        conteudo = perfil[nome]
+        if conteudo is None:
+            conteudo = "Não disponível: o dataset não possui as colunas 'Class'/'Amount' necessárias."
+        nota = perfil.get("notas", {}).get(nome)
+        partes.append(f"### {nome}\n{_formatar(conteudo)}" + (f"\n\n_{nota}_" if nota else ""))
+    return "\n\n".join(partes)
@@ -0,0 +1,338 @@
+"""
+Pontuação de risco de fraude das transações, usada pela ferramenta 'pontuar_transacoes'.
+
+Um modelo de regressão logística (V1–V28 e log(1 + Amount), padronizados, com pesos de classe
+balanceados e regularização L2) é ajustado pelo método de Newton sobre o DataFrame carregado, uma
+vez por conteúdo (impressão digital). O gradiente, a Hessiana e as pontuações são calculados em blocos
+de linhas distribuídos em um pool de threads: as operações do NumPy (produto de matrizes, tanh)
+liberam o GIL, então os blocos usam todos os núcleos sem copiar os dados para outros processos.
+
+Quando o próprio dataset de ajuste é pontuado, precisão e revocação não são medidas nas linhas usadas
+no ajuste (seriam otimistas): uma fração estratificada (VALIDACAO_FRACAO de cada classe) é separada,
+um segundo modelo é ajustado no restante e as métricas vêm das linhas separadas. Essa avaliação também
+fica em cache por conteúdo.
+"""
+import os
+import threading
+import time
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+import pandas as pd
+
+from metricas import anotar, trecho
+from tools import carregar_dados_dinamicamente, impressao_digital
+
+COLUNAS_MODELO = [f'V{i}' for i in range(1, 29)] + ['Amount']
+# Linhas por bloco e threads usadas no ajuste e na pontuação.
+PONTUACAO_BLOCO_LINHAS = 65_536
+PONTUACAO_TRABALHADORES = int(os.environ.get("PONTUACAO_TRABALHADORES", str(os.cpu_count() or 1)))
+# Acima deste número de linhas o ajuste usa todas as fraudes e uma amostra das transações normais.
+PONTUACAO_MAX_LINHAS_TREINO = int(os.environ.get("PONTUACAO_MAX_LINHAS_TREINO", "1000000"))
+# Regularização L2, iterações máximas e tolerância do método de Newton.
+REGULARIZACAO_L2 = 1.0
+MAX_ITERACOES = 25
+TOLERANCIA = 1e-6
+LIMIARES_PADRAO = (0.5, 0.9, 0.99)
+# Fração de cada classe separada para medir precisão/revocação fora da amostra de ajuste.
+VALIDACAO_FRACAO = 0.2
+MAX_TOP_N = 50
+# Número de modelos mantidos em memória (um por dataset distinto).
+MAX_MODELOS = 4
+
+_executor_pontuacao = ThreadPoolExecutor(max_workers=PONTUACAO_TRABALHADORES, thread_name_prefix="pontuacao")
+# impressão digital -> ModeloFraude, em ordem LRU
+_modelos = OrderedDict()
+# impressão digital -> avaliação fora da amostra (ver avaliar_fora_da_amostra), em ordem LRU
+_avaliacoes = OrderedDict()
+_modelos_lock = threading.Lock()
+
+
+def _sigmoide(z: np.ndarray) -> np.ndarray:
+    """Função logística sem overflow para |z| grande."""
+    return 0.5 * (1.0 + np.tanh(0.5 * z))
+
+
+def _blocos(linhas: int) -> list:
+    return [slice(inicio, min(inicio + PONTUACAO_BLOCO_LINHAS, linhas)) for inicio in range(0, linhas, PONTUACAO_BLOCO_LINHAS)]
+
+
+class ModeloFraude:
+    """Regressão logística sobre as colunas padronizadas; 'coeficientes[0]' é o intercepto."""
+
+    def __init__(self, colunas: list, media: np.ndarray, desvio: np.ndarray, coeficientes: np.ndarray,
+                 iteracoes: int, linhas_treino: int, duracao_s: float):
+        self.colunas = colunas
+        self.media = media
+        self.desvio = desvio
+        self.coeficientes = coeficientes
+        self.iteracoes = iteracoes
+        self.linhas_treino = linhas_treino
+        self.duracao_s = duracao_s
+
+    def matriz(self, df: pd.DataFrame) -> np.ndarray:
+        """Colunas do modelo padronizadas (NaN vira a média) com a coluna do intercepto à esquerda."""
+        return _matriz_padronizada(df, self.colunas, self.media, self.desvio)
+
+    def pontuar(self, df: pd.DataFrame) -> np.ndarray:
+        """Probabilidade estimada de fraude de cada linha, calculada em blocos no pool de threads."""
+        faltando = [c for c in self.colunas if c not in df.columns]
+        if faltando:
+            raise KeyError(f"Colunas ausentes para a pontuação: {faltando}")
+        pontuacoes = np.empty(len(df), dtype=np.float64)
+
+        def pontuar_bloco(bloco: slice):
+            pontuacoes[bloco] = _sigmoide(self.matriz(df.iloc[bloco]) @ self.coeficientes)
+
+        list(_executor_pontuacao.map(pontuar_bloco, _blocos(len(df))))
+        return pontuacoes
+
+
+def _valores_modelo(df: pd.DataFrame, colunas: list) -> np.ndarray:
+    valores = df[colunas].to_numpy(dtype=np.float64, na_value=np.nan, copy=True)
+    if 'Amount' in colunas:
+        # Valores muito assimétricos: a escala logarítmica evita que poucas transações grandes dominem o ajuste
+        i = colunas.index('Amount')
+        valores[:, i] = np.log1p(np.maximum(valores[:, i], 0.0))
+    return valores
+
+
+def _matriz_padronizada(df: pd.DataFrame, colunas: list, media: np.ndarray, desvio: np.ndarray) -> np.ndarray:
+    valores = (_valores_modelo(df, colunas) - media) / desvio
+    np.nan_to_num(valores, copy=False, nan=0.0, posinf=0.0, neginf=0.0)
+    return np.hstack([np.ones((len(valores), 1)), valores])
+
+
+def _amostra_treino(df: pd.DataFrame, classes: np.ndarray) -> tuple:
+    """Todas as fraudes e, se o dataset passar de PONTUACAO_MAX_LINHAS_TREINO, uma amostra uniforme das normais."""
+    if len(df) <= PONTUACAO_MAX_LINHAS_TREINO:
+        return df, classes
+    fraudes = np.flatnonzero(classes == 1)
+    normais = np.flatnonzero(classes != 1)
+    vagas = max(PONTUACAO_MAX_LINHAS_TREINO - len(fraudes), 1)
+    normais = np.random.default_rng(0).choice(normais, size=min(vagas, len(normais)), replace=False)
+    posicoes = np.sort(np.concatenate([fraudes, normais]))
+    return df.take(posicoes), classes[posicoes]
+
+
+def ajustar_modelo(df: pd.DataFrame) -> ModeloFraude:
+    """
+    Ajusta a regressão logística de Class (1 = fraude) sobre COLUNAS_MODELO presentes em 'df'.
+
+    Raises:
+        ValueError: Sem a coluna Class, sem colunas do modelo ou com uma única classe.
+    """
+    inicio = time.perf_counter()
+    colunas = [c for c in COLUNAS_MODELO if c in df.columns]
+    if 'Class' not in df.columns or not colunas:
+        raise ValueError("o DataFrame precisa da coluna 'Class' e de colunas V1–V28/Amount.")
+    classes = (df['Class'].to_numpy(dtype=np.float64, na_value=0.0) == 1).astype(np.float64)
+    positivos = classes.sum()
+    if positivos == 0 or positivos == len(classes):
+        raise ValueError("o DataFrame precisa ter transações das duas classes para o ajuste.")
+
+    treino, y = _amostra_treino(df, classes)
+    valores = _valores_modelo(treino, colunas)
+    media = np.nanmean(valores, axis=0)
+    desvio = np.nanstd(valores, axis=0)
+    desvio[~(desvio > 0)] = 1.0
+    media = np.nan_to_num(media)
+
+    # Pesos balanceados: as duas classes contribuem igualmente para a verossimilhança
+    n, n_pos = len(y), y.sum()
+    pesos_classe = (n / (2 * (n - n_pos)), n / (2 * n_pos))
+    matrizes = [_matriz_padronizada(treino.iloc[bloco], colunas, media, desvio) for bloco in _blocos(len(treino))]
+    alvos = [y[bloco] for bloco in _blocos(len(treino))]
+    regularizacao = np.full(len(colunas) + 1, REGULARIZACAO_L2)
+    regularizacao[0] = 0.0  # o intercepto não é regularizado
+
+    def gradiente_hessiana(bloco: int, beta: np.ndarray) -> tuple:
+        x, alvo = matrizes[bloco], alvos[bloco]
+        p = _sigmoide(x @ beta)
+        pesos = np.where(alvo == 1, pesos_classe[1], pesos_classe[0])
+        return x.T @ (pesos * (p - alvo)), (x * (pesos * p * (1 - p))[:, None]).T @ x
+
+    beta = np.zeros(len(colunas) + 1)
+    iteracoes = 0
+    for iteracoes in range(1, MAX_ITERACOES + 1):
+        parciais = list(_executor_pontuacao.map(lambda bloco: gradiente_hessiana(bloco, beta), range(len(matrizes))))
+        gradiente = sum(g for g, _ in parciais) + regularizacao * beta
+        hessiana = sum(h for _, h in parciais) + np.diag(regularizacao)
+        passo = np.linalg.solve(hessiana, gradiente)
+        beta = beta - passo
+        if np.max(np.abs(passo)) < TOLERANCIA:
+            break
+    return ModeloFraude(colunas, media, desvio, beta, iteracoes, len(treino), time.perf_counter() - inicio)
+
+
+def obter_modelo(df: pd.DataFrame) -> tuple:
+    """Retorna (modelo, reutilizado): o modelo ajustado para o conteúdo de 'df', do cache quando já existe."""
+    impressao = impressao_digital(df)
+    with _modelos_lock:
+        modelo = _modelos.get(impressao)
+        if modelo is not None:
+            _modelos.move_to_end(impressao)
+            return modelo, True
+    modelo = ajustar_modelo(df)
+    with _modelos_lock:
+        _modelos[impressao] = modelo
+        while len(_modelos) > MAX_MODELOS:
+            _modelos.popitem(last=False)
+    return modelo, False
+
+
+def _divisao_estratificada(classes: np.ndarray, fracao: float = VALIDACAO_FRACAO) -> tuple:
+    """Posições (ajuste, validação), com a fração 'fracao' de cada classe na validação (sorteio reprodutível)."""
+    rng = np.random.default_rng(0)
+    validacao = []
+    for classe in (0, 1):
+        posicoes = np.flatnonzero(classes == classe)
+        validacao.append(rng.choice(posicoes, size=int(round(len(posicoes) * fracao)), replace=False))
+    validacao = np.sort(np.concatenate(validacao))
+    ajuste = np.setdiff1d(np.arange(len(classes)), validacao, assume_unique=True)
+    return ajuste, validacao
+
+
+def avaliar_fora_da_amostra(df: pd.DataFrame) -> dict:
+    """
+    Pontuações de uma validação estratificada: um modelo ajustado sem as linhas de validação as pontua.
+    Retorna {"pontuacoes", "classes", "linhas_ajuste"}, do cache quando já calculada.
+
+    Raises:
+        ValueError: Como ajustar_modelo, ou se alguma classe não tiver linhas suficientes para a divisão.
+    """
+    impressao = impressao_digital(df)
+    with _modelos_lock:
+        avaliacao = _avaliacoes.get(impressao)
+        if avaliacao is not None:
+            _avaliacoes.move_to_end(impressao)
+            return avaliacao
+    if 'Class' not in df.columns:
+        raise ValueError("o DataFrame precisa da coluna 'Class'.")
+    classes = (df['Class'].to_numpy(dtype=np.float64, na_value=0.0) == 1).astype(np.int8)
+    ajuste, validacao = _divisao_estratificada(classes)
+    if not classes[validacao].any() or classes[ajuste].sum() in (0, len(ajuste)):
+        raise ValueError("há poucas fraudes para separar uma validação com as duas classes.")
+    modelo = ajustar_modelo(df.take(ajuste))
+    avaliacao = {
+        "pontuacoes": modelo.pontuar(df.take(validacao)),
+        "classes": classes[validacao],
+        "linhas_ajuste": len(ajuste),
+    }
+    with _modelos_lock:
+        _avaliacoes[impressao] = avaliacao
+        while len(_avaliacoes) > MAX_MODELOS:
+            _avaliacoes.popitem(last=False)
+    return avaliacao
+
+
+def _precisao_revocacao(pontuacoes: np.ndarray, classes: np.ndarray, limiares) -> pd.DataFrame:
+    """Precisão, revocação e número de alertas de cada limiar, e a precisão média (AP) no atributo 'ap'."""
+    positivos = classes.sum()
+    linhas = []
+    for limiar in limiares:
+        alertas = pontuacoes >= limiar
+        verdadeiros = np.count_nonzero(alertas & (classes == 1))
+        linhas.append({
+            "limiar": limiar,
+            "alertas": int(alertas.sum()),
+            "fraudes_detectadas": int(verdadeiros),
+            "precisao": verdadeiros / alertas.sum() if alertas.any() else np.nan,
+            "revocacao": verdadeiros / positivos if positivos else np.nan,
+            "taxa_alertas": alertas.mean() if len(alertas) else np.nan,
+        })
+    tabela = pd.DataFrame(linhas).set_index("limiar")
+    # Precisão média: média da precisão nas posições das fraudes, com as linhas ordenadas por pontuação
+    ordem = np.argsort(-pontuacoes, kind="stable")
+    acertos = np.cumsum(classes[ordem])
+    posicoes = np.flatnonzero(classes[ordem] == 1)
+    tabela.attrs["ap"] = float(np.mean(acertos[posicoes] / (posicoes + 1))) if len(posicoes) else np.nan
+    return tabela
+
+
+def pontuar_transacoes(df: pd.DataFrame, url: str | None = None, limiares=None, top_n: int = 10) -> str:
+    """
+    Ajusta (ou reutiliza) o modelo de fraude em 'df' e pontua 'df' ou, se 'url' for informada, o CSV dessa URL.
+
+    Args:
+        df: O DataFrame de dados, usado no ajuste do modelo.
+        url: URL ou caminho opcional de um CSV com o mesmo esquema a ser pontuado.
+        limiares: Limiares de pontuação para precisão/revocação (padrão LIMIARES_PADRAO).
+        top_n: Quantas transações mais suspeitas listar (no máximo MAX_TOP_N).
+
+    Returns:
+        Um relatório em markdown (modelo, vazão, precisão/revocação e transações mais suspeitas) ou uma string de erro.
+    """
+    if not isinstance(df, pd.DataFrame):
+        return "Erro: O DataFrame não foi carregado corretamente."
+    try:
+        limiares = sorted({float(l) for l in (limiares or LIMIARES_PADRAO)})
+    except (TypeError, ValueError):
+        return f"Erro: Limiares inválidos: {limiares}. Use números entre 0 e 1."
+    if any(not 0 <= l <= 1 for l in limiares):
+        return f"Erro: Limiares inválidos: {limiares}. Use números entre 0 e 1."
+    try:
+        top_n = max(0, min(int(top_n or 0), MAX_TOP_N))
+    except (TypeError, ValueError):
+        return f"Erro: top_n inválido: {top_n}. Use um número inteiro de 0 a {MAX_TOP_N}."
+
+    with trecho("pontuar_transacoes", linhas=len(df)):
+        try:
+            modelo, reutilizado = obter_modelo(df)
+        except ValueError as e:
+            return f"Erro ao ajustar o modelo de pontuação: {e}"
+        anotar(cache="acerto" if reutilizado else "falha")
+
+        alvo = df
+        if url:
+            alvo = carregar_dados_dinamicamente(url)
+            if isinstance(alvo, str):
+                return alvo
+
+        inicio = time.perf_counter()
+        try:
+            pontuacoes = modelo.pontuar(alvo)
+        except KeyError as e:
+            return f"Erro ao pontuar as transações: {e}"
+        duracao = time.perf_counter() - inicio
+        vazao = len(alvo) / duracao if duracao > 0 else float("inf")
+        anotar(linhas_pontuadas=len(alvo), linhas_por_s=round(vazao))
+
+        avaliacao = None
+        if alvo is df and 'Class' in df.columns:
+            # As métricas do próprio dataset de ajuste vêm de linhas que o modelo avaliado não viu
+            with trecho("pontuacao.validacao"):
+                try:
+                    avaliacao = avaliar_fora_da_amostra(df)
+                except ValueError as e:
+                    print(f"[AVISO] Validação fora da amostra indisponível ({e}); métricas calculadas na própria amostra de ajuste.")
+
+    partes = [
+        f"Modelo: regressão logística sobre {len(modelo.colunas)} colunas, ajustada em {modelo.linhas_treino:,} linhas "
+        f"({modelo.iteracoes} iterações, {modelo.duracao_s:.2f}s{', reutilizado do cache' if reutilizado else ''}).",
+        f"Pontuação: {len(alvo):,} linhas em {duracao:.3f}s ({vazao:,.0f} linhas/s, {PONTUACAO_TRABALHADORES} thread(s)).",
+    ]
+    if avaliacao is not None:
+        tabela = _precisao_revocacao(avaliacao["pontuacoes"], avaliacao["classes"], limiares)
+        partes.append(
+            f"Precisão/revocação por limiar, fora da amostra: validação estratificada com {len(avaliacao['classes']):,} linhas "
+            f"({int(avaliacao['classes'].sum()):,} fraudes), pontuadas por um modelo ajustado nas outras {avaliacao['linhas_ajuste']:,} "
+            f"(precisão média: {tabela.attrs['ap']:.3f}; 'taxa_alertas' é a fração das linhas acima do limiar):\n{tabela.round(4).to_markdown()}"
+        )
+    elif 'Class' in alvo.columns:
+        classes = (alvo['Class'].to_numpy(dtype=np.float64, na_value=0.0) == 1).astype(np.int8)
+        tabela = _precisao_revocacao(pontuacoes, classes, limiares)
+        rotulo = "na própria amostra de ajuste (otimista)" if alvo is df else "nos dados pontuados"
+        partes.append(f"Precisão/revocação por limiar, {rotulo} (precisão média: {tabela.attrs['ap']:.3f}):\n{tabela.round(4).to_markdown()}")
+    else:
+        contagens = {limiar: int((pontuacoes >= limiar).sum()) for limiar in limiares}
+        partes.append("Sem a coluna 'Class' nos dados pontuados: alertas por limiar: "
+                      + ", ".join(f"{limiar}: {n}" for limiar, n in contagens.items()) + ".")
+    if top_n and len(pontuacoes):
+        mais_suspeitas = np.argpartition(-pontuacoes, min(top_n, len(pontuacoes)) - 1)[:top_n]
+        mais_suspeitas = mais_suspeitas[np.argsort(-pontuacoes[mais_suspeitas], kind="stable")]
+        colunas = [c for c in ('Time', 'Amount', 'Class') if c in alvo.columns]
+        tabela_top = alvo.iloc[mais_suspeitas][colunas].assign(pontuacao=pontuacoes[mais_suspeitas].round(4))
+        partes.append(f"As {len(tabela_top)} transações mais suspeitas:\n{tabela_top.to_markdown()}")
+    return "\n\n".join(partes)
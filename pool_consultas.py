@@ -0,0 +1,277 @@
+"""
+Pool de processos que executa a consulta_tool fora do processo do Streamlit.
+
+Cada consulta roda em um processo trabalhador com limite de tempo (o processo é encerrado e
+substituído quando o prazo estoura ou a consulta é cancelada) e limite de memória (RLIMIT_DATA).
+O DataFrame é publicado uma única vez em memória compartilhada: os trabalhadores montam o
+DataFrame sobre esses buffers sem cópia e sem receber um pickle por chamada.
+"""
+import atexit
+import multiprocessing as mp
+import os
+import pickle
+import queue
+import threading
+import time
+from collections import OrderedDict
+from multiprocessing import shared_memory
+
+import numpy as np
+import pandas as pd
+
+try:
+    import resource
+except ImportError:  # Windows: sem limite de memória por processo
+    resource = None
+
+# Número de processos, tempo máximo (s) e memória máxima (MB) por consulta.
+CONSULTA_PROCESSOS = int(os.environ.get("CONSULTA_PROCESSOS", str(min(4, os.cpu_count() or 1))))
+CONSULTA_TEMPO_LIMITE_S = float(os.environ.get("CONSULTA_TEMPO_LIMITE_S", "30"))
+CONSULTA_MAX_MEMORIA_MB = int(os.environ.get("CONSULTA_MAX_MEMORIA_MB", "2048"))
+# Quantos DataFrames ficam publicados em memória compartilhada ao mesmo tempo.
+MAX_DATASETS_COMPARTILHADOS = 4
+
+
+def _exportar_dataframe(df: pd.DataFrame) -> tuple:
+    """
+    Copia o DataFrame para segmentos de memória compartilhada (um por sequência de colunas com o mesmo dtype).
+    Retorna (manifesto, segmentos), onde o manifesto é o que os trabalhadores precisam para remontá-lo.
+    """
+    from tools import _segmentos_por_dtype
+
+    segmentos = []
+    partes = []
+    for colunas, dtype in _segmentos_por_dtype(df):
+        if isinstance(dtype, np.dtype) and dtype.kind in "biuf":
+            valores = np.ascontiguousarray(df[colunas].to_numpy().T)
+            dados = None
+        else:
+            # Colunas de texto/categoria/extensão são serializadas uma única vez no próprio segmento
+            dados = pickle.dumps(df[colunas], protocol=pickle.HIGHEST_PROTOCOL)
+            valores = None
+        tamanho = valores.nbytes if valores is not None else len(dados)
+        segmento = shared_memory.SharedMemory(create=True, size=max(tamanho, 1))
+        if valores is not None:
+            np.ndarray(valores.shape, dtype=valores.dtype, buffer=segmento.buf)[:] = valores
+            partes.append({"nome": segmento.name, "tipo": "npy", "colunas": list(colunas),
+                           "dtype": valores.dtype.str, "shape": valores.shape})
+        else:
+            segmento.buf[:tamanho] = dados
+            partes.append({"nome": segmento.name, "tipo": "pickle", "tamanho": tamanho})
+        segmentos.append(segmento)
+
+    indice = None if isinstance(df.index, pd.RangeIndex) and df.index.start == 0 and df.index.step == 1 else df.index
+    return {"linhas": len(df), "partes": partes, "indice": indice, "attrs": dict(df.attrs)}, segmentos
+
+
+def _anexar_segmento(nome: str) -> shared_memory.SharedMemory:
+    """Abre um segmento existente sem assumir sua posse (quem o criou é responsável por apagá-lo)."""
+    try:
+        return shared_memory.SharedMemory(name=nome, track=False)
+    except TypeError:
+        # Python < 3.13: o trabalhador usa o mesmo resource tracker do processo pai, onde o nome já está registrado
+        return shared_memory.SharedMemory(name=nome)
+
+
+def _montar_dataframe(manifesto: dict) -> tuple:
+    """Remonta, no trabalhador, o DataFrame publicado em memória compartilhada. Retorna (df, segmentos)."""
+    segmentos = []
+    partes = []
+    for parte in manifesto["partes"]:
+        segmento = _anexar_segmento(parte["nome"])
+        segmentos.append(segmento)
+        if parte["tipo"] == "npy":
+            valores = np.ndarray(parte["shape"], dtype=np.dtype(parte["dtype"]), buffer=segmento.buf)
+            # Somente leitura: com Copy-on-Write qualquer alteração gera uma cópia privada
+            valores.flags.writeable = False
+            partes.append(pd.DataFrame(valores.T, columns=parte["colunas"], copy=False))
+        else:
+            partes.append(pickle.loads(bytes(segmento.buf[:parte["tamanho"]])))
+    df = pd.concat(partes, axis=1)
+    if manifesto["indice"] is not None:
+        df.index = manifesto["indice"]
+    df.attrs.update(manifesto["attrs"])
+    return df, segmentos
+
+
+def _laco_trabalhador(conexao, limite_memoria_mb: int):
+    """Laço principal de um processo trabalhador: recebe dados e consultas pela conexão e devolve o resultado."""
+    import indices
+    import tools
+
+    if resource is not None and limite_memoria_mb:
+        limite = limite_memoria_mb * 1024 * 1024
+        try:
+            resource.setrlimit(resource.RLIMIT_DATA, (limite, limite))
+        except (ValueError, OSError):
+            pass
+
+    # chave_dados -> (df, contexto, segmentos, assinatura do conteúdo), em ordem LRU
+    datasets = OrderedDict()
+    while True:
+        try:
+            mensagem = conexao.recv()
+        except EOFError:
+            break
+        tipo = mensagem[0]
+
+        if tipo == "sair":
+            break
+
+        if tipo == "dados":
+            _, chave_dados, manifesto, contexto = mensagem
+            df, segmentos = _montar_dataframe(manifesto)
+            tools.registrar_impressao_digital(df, chave_dados[0])
+            # O índice (posições por classe, ordem por Time) é construído neste processo, em segundo plano
+            indices.agendar_indice(df)
+            datasets[chave_dados] = (df, contexto, segmentos, tools._assinatura_conteudo(df))
+            while len(datasets) > MAX_DATASETS_COMPARTILHADOS:
+                datasets.popitem(last=False)
+
+        elif tipo == "consulta":
+            _, chave_dados, codigo_python = mensagem
+            df, contexto, _, assinatura = datasets[chave_dados]
+            datasets.move_to_end(chave_dados)
+            # Cópia rasa por consulta: alterações feitas pelo código não vazam para a próxima consulta; as que ele
+            # fez no lugar voltam ao processo pai junto com o resultado. A cópia tem o mesmo conteúdo, então herda
+            # a impressão digital (e o índice) sem recalcular o hash.
+            copia = df.copy(deep=False)
+            tools.registrar_impressao_digital(copia, chave_dados[0])
+            resultado = tools._executar_consulta(copia, codigo_python, contexto)
+            conexao.send((resultado, tools._alteracoes_no_lugar(assinatura, copia)))
+
+
+class _Trabalhador:
+    """Um processo trabalhador, sua conexão e as chaves de dados que ele já recebeu."""
+
+    def __init__(self, contexto_mp, limite_memoria_mb: int):
+        self.conexao, conexao_filho = contexto_mp.Pipe()
+        self.processo = contexto_mp.Process(target=_laco_trabalhador, args=(conexao_filho, limite_memoria_mb), daemon=True)
+        self.processo.start()
+        conexao_filho.close()
+        # Espelha o LRU de datasets mantido pelo processo filho
+        self.dados = OrderedDict()
+
+    def encerrar(self, forcar: bool = False):
+        """Encerra o processo (imediatamente se 'forcar')."""
+        if forcar:
+            self.processo.kill()
+        else:
+            try:
+                self.conexao.send(("sair",))
+            except (OSError, BrokenPipeError):
+                self.processo.kill()
+        self.processo.join(timeout=5)
+        self.conexao.close()
+
+
+class PoolConsultas:
+    """Pool de processos para a consulta_tool, compartilhado por todas as sessões do processo do Streamlit."""
+
+    def __init__(self, processos: int = CONSULTA_PROCESSOS, tempo_limite: float = CONSULTA_TEMPO_LIMITE_S,
+                 limite_memoria_mb: int = CONSULTA_MAX_MEMORIA_MB):
+        self.tempo_limite = tempo_limite
+        self.limite_memoria_mb = limite_memoria_mb
+        self._contexto_mp = mp.get_context("spawn")
+        self._ociosos = queue.Queue()
+        for _ in range(max(1, processos)):
+            self._ociosos.put(_Trabalhador(self._contexto_mp, limite_memoria_mb))
+        # impressão digital -> (manifesto, segmentos) dos DataFrames publicados, em ordem LRU
+        self._publicados = OrderedDict()
+        self._lock = threading.Lock()
+
+    def _publicar(self, impressao: str, df: pd.DataFrame) -> dict:
+        """Publica o DataFrame em memória compartilhada (uma vez por impressão digital) e retorna o manifesto."""
+        with self._lock:
+            if impressao in self._publicados:
+                self._publicados.move_to_end(impressao)
+                return self._publicados[impressao][0]
+            manifesto, segmentos = _exportar_dataframe(df)
+            self._publicados[impressao] = (manifesto, segmentos)
+            while len(self._publicados) > MAX_DATASETS_COMPARTILHADOS:
+                # Trabalhadores que já mapearam o segmento continuam podendo usá-lo após o unlink
+                _, (_, antigos) = self._publicados.popitem(last=False)
+                for segmento in antigos:
+                    segmento.close()
+                    segmento.unlink()
+            return manifesto
+
+    def executar(self, df: pd.DataFrame, codigo_python: str, contexto: dict | None = None,
+                 tempo_limite: float | None = None, cancelamento: threading.Event | None = None) -> tuple:
+        """
+        Executa o código em um processo trabalhador. Retorna (resultado formatado, alterações), onde alterações
+        descreve o que o código mudou no lugar em 'df' (ver tools._alteracoes_no_lugar) ou é None.
+
+        Args:
+            df: O DataFrame de dados.
+            codigo_python: Código a executar (mesma semântica da consulta_tool).
+            contexto: Variáveis adicionais do namespace (enviadas uma vez por trabalhador).
+            tempo_limite: Prazo em segundos (padrão: o do pool).
+            cancelamento: Evento opcional; quando sinalizado, a consulta é interrompida.
+        """
+        from tools import impressao_digital
+
+        impressao = impressao_digital(df)
+        contexto = contexto or {}
+        chave_dados = (impressao, tuple(sorted((nome, id(valor)) for nome, valor in contexto.items())))
+        manifesto = self._publicar(impressao, df)
+        tempo_limite = self.tempo_limite if tempo_limite is None else tempo_limite
+
+        trabalhador = self._ociosos.get()
+        substituir = True
+        try:
+            if chave_dados not in trabalhador.dados:
+                trabalhador.conexao.send(("dados", chave_dados, manifesto, contexto))
+                trabalhador.dados[chave_dados] = True
+                while len(trabalhador.dados) > MAX_DATASETS_COMPARTILHADOS:
+                    trabalhador.dados.popitem(last=False)
+            trabalhador.dados.move_to_end(chave_dados)
+            trabalhador.conexao.send(("consulta", chave_dados, codigo_python))
+
+            prazo = time.monotonic() + tempo_limite
+            while not trabalhador.conexao.poll(0.05):
+                if cancelamento is not None and cancelamento.is_set():
+                    return "Erro: a consulta foi cancelada.", None
+                if time.monotonic() > prazo:
+                    return f"Erro: a consulta excedeu o tempo limite de {tempo_limite:.0f}s e foi interrompida.", None
+                if not trabalhador.processo.is_alive():
+                    return "Erro: o processo da consulta terminou inesperadamente (possivelmente excedeu o limite de memória).", None
+            resultado = trabalhador.conexao.recv()
+            substituir = False
+            return resultado
+        except (EOFError, OSError) as e:
+            return f"Erro: falha na comunicação com o processo da consulta ({e}).", None
+        finally:
+            if substituir:
+                # Encerrar o processo é a única forma segura de interromper código Python em execução
+                trabalhador.encerrar(forcar=True)
+                trabalhador = _Trabalhador(self._contexto_mp, self.limite_memoria_mb)
+            self._ociosos.put(trabalhador)
+
+    def encerrar(self):
+        """Encerra todos os trabalhadores e libera a memória compartilhada."""
+        while True:
+            try:
+                self._ociosos.get_nowait().encerrar()
+            except queue.Empty:
+                break
+        with self._lock:
+            for _, segmentos in self._publicados.values():
+                for segmento in segmentos:
+                    segmento.close()
+                    segmento.unlink()
+            self._publicados.clear()
+
+
+_pool = None
+_pool_lock = threading.Lock()
+
+
+def obter_pool() -> PoolConsultas:
+    """Retorna o pool do processo, criando-o na primeira chamada."""
+    global _pool
+    with _pool_lock:
+        if _pool is None:
+            _pool = PoolConsultas()
+            atexit.register(_pool.encerrar)
+        return _pool
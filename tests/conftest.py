@@ -0,0 +1,7 @@
+import os
+import sys
+import tempfile
+
+# Os módulos do app ficam na raiz do repositório; o cache colunar dos testes não suja o diretório de trabalho
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+os.environ.setdefault("CACHE_COLUNAR_DIR", os.path.join(tempfile.gettempdir(), "cache_colunar_testes"))
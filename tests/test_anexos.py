@@ -0,0 +1,131 @@
+"""Anexação incremental: o resultado, o perfil e o índice derivados devem bater com um recálculo do zero."""
+import numpy as np
+import pandas as pd
+import pytest
+
+from anexos import anexar_dados
+from indices import IndiceDados, obter_indice
+from perfil import calcular_perfil, obter_perfil
+from tools import COLUNAS_CREDITCARD, DTYPES_CREDITCARD, _executar_consulta_local
+
+
+def _transacoes(linhas: int, inicio_tempo: int, semente: int) -> pd.DataFrame:
+    """Transações sintéticas no esquema do creditcard.csv, com ~2% de fraudes e Time crescente."""
+    rng = np.random.default_rng(semente)
+    dados = {"Time": np.sort(rng.integers(inicio_tempo, inicio_tempo + 50_000, linhas))}
+    classes = (rng.random(linhas) < 0.02).astype(np.int8)
+    for i in range(1, 29):
+        dados[f"V{i}"] = rng.normal(classes * (i % 3), 1.0, linhas)
+    dados["Amount"] = np.round(rng.lognormal(3.0, 1.2, linhas) * (1 + classes), 2)
+    dados["Class"] = classes
+    return pd.DataFrame(dados)[COLUNAS_CREDITCARD].astype({**DTYPES_CREDITCARD, "Time": "int32"})
+
+
+@pytest.fixture
+def base():
+    return _transacoes(20_000, 0, semente=1)
+
+
+def _anexar(df, novas, caminho):
+    novas.to_csv(caminho, index=False)
+    resultado = anexar_dados(df, str(caminho), tamanho_bloco=3_000)
+    assert isinstance(resultado, tuple), resultado
+    return resultado[0]
+
+
+def test_resultado_igual_a_concatenacao(base, tmp_path):
+    novas = _transacoes(8_000, 50_000, semente=2)
+    resultado = _anexar(base, novas, tmp_path / "lote.csv")
+    esperado = pd.concat([base, novas], ignore_index=True)
+    pd.testing.assert_frame_equal(resultado, esperado)
+
+
+def test_perfil_anexado_igual_ao_recalculado(base, tmp_path):
+    novas = _transacoes(8_000, 50_000, semente=3)
+    novas.loc[::500, "V5"] = np.nan
+    resultado = _anexar(base, novas, tmp_path / "lote.csv")
+
+    incremental = obter_perfil(resultado)
+    do_zero = calcular_perfil(resultado.copy())
+    pd.testing.assert_frame_equal(incremental["classes"], do_zero["classes"])
+    pd.testing.assert_series_equal(incremental["ausentes"], do_zero["ausentes"], check_names=False)
+    assert incremental["geral"]["linhas"] == len(base) + len(novas)
+    pd.testing.assert_series_equal(
+        incremental["correlacoes"].sort_index(), do_zero["correlacoes"].sort_index(), check_names=False, atol=1e-9, rtol=0
+    )
+    # Contagem, média, desvio, mínimo e máximo são exatos; os quartis vêm da amostra e são aproximados
+    exatas = ["count", "mean", "std", "min", "max"]
+    pd.testing.assert_frame_equal(
+        incremental["amount"][exatas].astype(float), do_zero["amount"][exatas].astype(float), check_names=False, rtol=1e-9
+    )
+    desvio_amount = resultado["Amount"].astype(float).std()
+    assert np.allclose(incremental["amount"]["50%"], do_zero["amount"]["50%"], atol=0.1 * desvio_amount)
+
+
+def test_indice_anexado_igual_ao_recalculado(base, tmp_path):
+    # Lote fora de ordem e sobreposto no tempo: a ordem por Time precisa da fusão, não só da concatenação
+    novas = _transacoes(6_000, 10_000, semente=4).sample(frac=1.0, random_state=0).reset_index(drop=True)
+    resultado = _anexar(base, novas, tmp_path / "lote.csv")
+
+    anexado = obter_indice(resultado)
+    do_zero = IndiceDados(resultado.copy())
+    assert anexado.posicoes_classe.keys() == do_zero.posicoes_classe.keys()
+    for classe, posicoes in do_zero.posicoes_classe.items():
+        np.testing.assert_array_equal(anexado.posicoes_classe[classe], posicoes)
+    np.testing.assert_array_equal(anexado.tempos, do_zero.tempos)
+
+    pd.testing.assert_frame_equal(anexado.subconjunto(resultado, 1), resultado[resultado["Class"] == 1])
+    for t0, t1 in ((0, 3_600), (12_000, 20_000), (None, 5_000), (55_000, None)):
+        pd.testing.assert_frame_equal(anexado.janela(resultado, t0, t1), do_zero.janela(resultado, t0, t1))
+
+
+def test_anexacoes_seguidas_reaproveitam_o_buffer(base, tmp_path):
+    primeiro = _anexar(base, _transacoes(2_000, 50_000, semente=5), tmp_path / "lote1.csv")
+    segundo = _anexar(primeiro, _transacoes(2_000, 100_000, semente=6), tmp_path / "lote2.csv")
+    assert np.shares_memory(primeiro["Amount"].to_numpy(), segundo["Amount"].to_numpy())
+    # A versão anterior continua vendo só as suas linhas
+    assert len(primeiro) == len(base) + 2_000
+
+
+def test_dataset_anexado_aceita_alteracoes_no_lugar(base, tmp_path):
+    primeiro = _anexar(base, _transacoes(2_000, 50_000, semente=7), tmp_path / "lote1.csv")
+    valor_original = primeiro.loc[0, "Amount"]
+    alterado = primeiro.copy(deep=False)
+    alterado.loc[0, "Amount"] = 1.0
+    assert alterado.loc[0, "Amount"] == 1.0
+    assert primeiro.loc[0, "Amount"] == valor_original
+
+    resultado, alterou = _executar_consulta_local(alterado, "df.fillna(0, inplace=True)")
+    assert not resultado.startswith("Erro"), resultado
+
+    # Alterado no lugar, o DataFrame não é mais uma visão do buffer: a próxima anexação preserva a alteração
+    segundo = _anexar(alterado, _transacoes(1_000, 100_000, semente=8), tmp_path / "lote2.csv")
+    assert segundo.loc[0, "Amount"] == 1.0
+    assert primeiro.loc[0, "Amount"] == valor_original
+
+
+def test_esquema_diferente_nao_altera_o_dataset(base, tmp_path):
+    caminho = tmp_path / "ruim.csv"
+    _transacoes(500, 50_000, semente=9).drop(columns=["V3"]).to_csv(caminho, index=False)
+    resultado = anexar_dados(base, str(caminho))
+    assert isinstance(resultado, str) and "faltam as colunas ['V3']" in resultado
+    assert len(base) == 20_000
+
+
+def test_perfil_ainda_em_calculo_retorna_erro_claro(base, tmp_path, monkeypatch):
+    def perfil_demorado(df):
+        raise TimeoutError()
+
+    monkeypatch.setattr("anexos.obter_perfil", perfil_demorado)
+    caminho = tmp_path / "lote.csv"
+    _transacoes(500, 50_000, semente=10).to_csv(caminho, index=False)
+    resultado = anexar_dados(base, str(caminho))
+    assert isinstance(resultado, str) and "perfil do dataset atual ainda está sendo calculado" in resultado
+    assert len(base) == 20_000
+
+
+def test_anexar_a_dataset_sem_linhas(base, tmp_path):
+    novas = _transacoes(3_000, 50_000, semente=11)
+    resultado = _anexar(base.iloc[:0], novas, tmp_path / "lote.csv")
+    pd.testing.assert_frame_equal(resultado, novas)
+    assert obter_perfil(resultado)["geral"]["linhas"] == 3_000
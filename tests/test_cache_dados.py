@@ -0,0 +1,73 @@
+"""Cache de dados compartilhado: a versão de uma URL é reaproveitada por um tempo e versão desconhecida não entra no cache."""
+import pandas as pd
+import pytest
+import requests
+
+import tools
+
+
+class HeadFalso:
+    """Substitui requests.head: responde com os cabeçalhos atuais e conta as chamadas."""
+
+    def __init__(self, cabecalhos: dict | None):
+        self.cabecalhos = cabecalhos
+        self.chamadas = 0
+
+    def __call__(self, url, **kwargs):
+        self.chamadas += 1
+        if self.cabecalhos is None:
+            raise requests.exceptions.ConnectionError("sem rede")
+        resposta = requests.Response()
+        resposta.status_code = 200
+        resposta.headers.update(self.cabecalhos)
+        return resposta
+
+
+class LeitorFalso:
+    def __init__(self):
+        self.versoes = []
+
+    def __call__(self, fonte, versao, progresso=None):
+        self.versoes.append(versao)
+        return pd.DataFrame({"a": [len(self.versoes)]})
+
+
+@pytest.fixture
+def head(monkeypatch):
+    falso = HeadFalso({"ETag": '"v1"'})
+    monkeypatch.setattr(tools.requests, "head", falso)
+    return falso
+
+
+def test_versao_reaproveitada_dentro_do_ttl(head, monkeypatch):
+    leitor = LeitorFalso()
+    url = "https://exemplo.test/ttl.csv"
+    for _ in range(3):
+        assert tools._carregar_compartilhado(url, leitor)["a"].iloc[0] == 1
+    assert head.chamadas == 1 and leitor.versoes == ['"v1"']
+
+    # Vencido o prazo, um novo HEAD detecta a nova versão e a fonte é lida de novo
+    monkeypatch.setitem(tools._versoes_url, url, ('"v1"', 0.0))
+    head.cabecalhos = {"ETag": '"v2"'}
+    assert tools._carregar_compartilhado(url, leitor)["a"].iloc[0] == 2
+    assert leitor.versoes == ['"v1"', '"v2"']
+
+
+@pytest.mark.parametrize("cabecalhos", [None, {}, {"Content-Length": "123"}], ids=["sem_rede", "sem_validador", "so_tamanho"])
+def test_versao_desconhecida_nao_entra_no_cache(head, cabecalhos):
+    head.cabecalhos = cabecalhos
+    leitor = LeitorFalso()
+    url = f"https://exemplo.test/desconhecida-{len(cabecalhos or {})}-{cabecalhos is None}.csv"
+    tools._carregar_compartilhado(url, leitor)
+    tools._carregar_compartilhado(url, leitor)
+    assert leitor.versoes == ["", ""]
+    assert url not in tools.estatisticas_cache_dados()["entradas"]
+
+
+def test_arquivo_local_usa_mtime_e_tamanho(tmp_path, head):
+    caminho = tmp_path / "local.csv"
+    caminho.write_text("a\n1\n")
+    leitor = LeitorFalso()
+    tools._carregar_compartilhado(str(caminho), leitor)
+    tools._carregar_compartilhado(str(caminho), leitor)
+    assert len(leitor.versoes) == 1 and head.chamadas == 0
@@ -0,0 +1,79 @@
+"""Carga compacta: a amostra inicial decide os tipos do esquema e o CSV é lido uma única vez."""
+import numpy as np
+import pandas as pd
+import pytest
+
+import tools
+from tools import COLUNAS_CREDITCARD, DTYPES_CREDITCARD
+
+
+def _transacoes(linhas: int, semente: int = 0) -> pd.DataFrame:
+    rng = np.random.default_rng(semente)
+    dados = {"Time": np.sort(rng.integers(0, 50_000, linhas)).astype(float)}
+    for i in range(1, 29):
+        dados[f"V{i}"] = rng.normal(0.0, 1.0, linhas)
+    dados["Amount"] = np.round(rng.lognormal(3.0, 1.2, linhas), 2)
+    dados["Class"] = (rng.random(linhas) < 0.02).astype(int)
+    return pd.DataFrame(dados)[COLUNAS_CREDITCARD]
+
+
+@pytest.fixture(autouse=True)
+def blocos_pequenos(monkeypatch):
+    monkeypatch.setattr(tools, "AMOSTRA_ESQUEMA_LINHAS", 50)
+    monkeypatch.setattr(tools, "STREAMING_BLOCO_LINHAS", 300)
+
+
+@pytest.fixture
+def leituras(monkeypatch):
+    """Conta quantas vezes o CSV é aberto pelo pandas."""
+    contagem = []
+    original = pd.read_csv
+    monkeypatch.setattr(tools.pd, "read_csv", lambda *a, **k: contagem.append(a[0]) or original(*a, **k))
+    return contagem
+
+
+@pytest.mark.parametrize("com_progresso", [False, True], ids=["direto", "com_progresso"])
+def test_esquema_de_fraudes_com_tipos_compactos(tmp_path, leituras, com_progresso):
+    original = _transacoes(1_000)
+    caminho = tmp_path / "cc.csv"
+    original.to_csv(caminho, index=False)
+    progresso = []
+    df = tools._ler_csv_compacto(str(caminho), (lambda linhas, _: progresso.append(linhas)) if com_progresso else None)
+    assert len(leituras) == 1
+    assert df.attrs["memoria"]["modo"] == "esquema"
+    assert df.dtypes.drop("Time").to_dict() == {c: np.dtype(t) for c, t in DTYPES_CREDITCARD.items()}
+    assert pd.api.types.is_integer_dtype(df["Time"])
+    pd.testing.assert_frame_equal(df, original.astype({**DTYPES_CREDITCARD, "Time": df["Time"].dtype}))
+    if com_progresso:
+        assert progresso == [50, 350, 650, 950, 1_000]
+
+
+def test_csv_fora_do_esquema_usa_reducao_automatica(tmp_path, leituras):
+    original = pd.DataFrame({"cidade": ["a", "b"] * 400, "valor": np.arange(800, dtype=float) / 4})
+    caminho = tmp_path / "outro.csv"
+    original.to_csv(caminho, index=False)
+    df = tools._ler_csv_compacto(str(caminho))
+    assert len(leituras) == 1
+    assert df.attrs["memoria"]["modo"] == "automatico"
+    assert df["cidade"].dtype == "category"
+    np.testing.assert_array_equal(df["valor"].to_numpy(), original["valor"].to_numpy())
+
+
+def test_valor_incompativel_depois_da_amostra(tmp_path, leituras):
+    # A amostra passa, mas uma linha adiante tem texto em V3: não há segunda leitura nem erro
+    original = _transacoes(1_000).astype({"V3": object})
+    original.loc[700, "V3"] = "n/d"
+    caminho = tmp_path / "sujo.csv"
+    original.to_csv(caminho, index=False)
+    df = tools._ler_csv_compacto(str(caminho))
+    assert len(leituras) == 1
+    assert len(df) == 1_000
+    assert df.attrs["memoria"]["modo"] == "automatico"
+    assert df.loc[700, "V3"] == "n/d"
+
+
+def test_csv_so_com_cabecalho(tmp_path):
+    caminho = tmp_path / "vazio.csv"
+    caminho.write_text(",".join(COLUNAS_CREDITCARD) + "\n")
+    df = tools._ler_csv_compacto(str(caminho))
+    assert df.empty and list(df.columns) == COLUNAS_CREDITCARD
@@ -0,0 +1,141 @@
+"""Consulta estruturada: filtros, uso do índice, agrupamentos e top-k devem bater com o mesmo cálculo feito no pandas."""
+import numpy as np
+import pandas as pd
+import pytest
+
+from consulta_estruturada import consulta_estruturada, obter_plano
+
+
+def _dados(linhas: int, ordenado: bool, semente: int = 0) -> pd.DataFrame:
+    """Transações sintéticas com ~3% de fraudes, Amount com ausentes e uma coluna de texto com ausentes."""
+    rng = np.random.default_rng(semente)
+    tempos = rng.integers(0, 20_000, linhas)
+    amount = np.round(rng.lognormal(3.0, 1.0, linhas), 2).astype(np.float32)
+    amount[rng.random(linhas) < 0.05] = np.nan
+    tipo = rng.choice(np.array(["loja", "web", "app", None], dtype=object), linhas)
+    return pd.DataFrame({
+        "Time": np.sort(tempos) if ordenado else tempos,
+        "V1": rng.normal(0, 1, linhas),
+        "Amount": amount,
+        "Tipo": tipo,
+        "Class": (rng.random(linhas) < 0.03).astype(np.int8),
+    })
+
+
+@pytest.fixture(params=[True, False], ids=["time_ordenado", "time_fora_de_ordem"])
+def df(request):
+    return _dados(5_000, ordenado=request.param)
+
+
+def _selecionadas(df: pd.DataFrame, filtros: list) -> tuple:
+    posicoes, uso_indice = obter_plano({"filtros": filtros}, df).selecionar(df)
+    return (np.arange(len(df)) if posicoes is None else np.asarray(posicoes)), uso_indice
+
+
+@pytest.mark.parametrize("operador, valor, esperado", [
+    ("==", 20.09, lambda s: s == np.float32(20.09)),
+    ("!=", 20.09, lambda s: s != np.float32(20.09)),
+    ("<", 15, lambda s: s < 15),
+    ("<=", 15, lambda s: s <= 15),
+    (">", 60.5, lambda s: s > 60.5),
+    (">=", 60.5, lambda s: s >= 60.5),
+])
+def test_operadores_de_comparacao(df, operador, valor, esperado):
+    posicoes, _ = _selecionadas(df, [{"coluna": "Amount", "operador": operador, "valor": valor}])
+    np.testing.assert_array_equal(posicoes, np.flatnonzero(esperado(df["Amount"]).to_numpy()))
+
+
+def test_operadores_entre_e_em(df):
+    posicoes, _ = _selecionadas(df, [{"coluna": "Amount", "operador": "entre", "valores": [10, 30]}])
+    np.testing.assert_array_equal(posicoes, np.flatnonzero(df["Amount"].between(10, 30).to_numpy()))
+    posicoes, _ = _selecionadas(df, [{"coluna": "Tipo", "operador": "em", "valores": ["web", "app"]}])
+    np.testing.assert_array_equal(posicoes, np.flatnonzero(df["Tipo"].isin(["web", "app"]).to_numpy()))
+
+
+@pytest.mark.parametrize("filtros, mascara, uso", [
+    ([{"coluna": "Class", "operador": "==", "valor": 1}], lambda d: d["Class"] == 1, "Class"),
+    ([{"coluna": "Class", "operador": "em", "valores": [1]}, {"coluna": "Amount", "operador": ">", "valor": 20}],
+     lambda d: (d["Class"] == 1) & (d["Amount"] > 20), "Class"),
+    ([{"coluna": "Time", "operador": "entre", "valores": [3_600, 7_200]}], lambda d: d["Time"].between(3_600, 7_200), "Time"),
+    ([{"coluna": "Time", "operador": ">=", "valor": 1_000}, {"coluna": "Time", "operador": "<", "valor": 1_500}],
+     lambda d: (d["Time"] >= 1_000) & (d["Time"] < 1_500), "Time"),
+    ([{"coluna": "Time", "operador": "<=", "valor": 2_000}, {"coluna": "Class", "operador": "==", "valor": 0}],
+     lambda d: (d["Time"] <= 2_000) & (d["Class"] == 0), "Time"),
+])
+def test_filtros_atendidos_pelo_indice(df, filtros, mascara, uso):
+    posicoes, uso_indice = _selecionadas(df, filtros)
+    assert uso_indice == uso
+    np.testing.assert_array_equal(posicoes, np.flatnonzero(mascara(df).to_numpy()))
+
+
+def _agregacoes_pandas(grupos) -> pd.DataFrame:
+    return pd.DataFrame({
+        "contagem": grupos.size(),
+        "soma(Amount)": grupos["Amount"].sum(),
+        "media(Amount)": grupos["Amount"].mean(),
+        "desvio(Amount)": grupos["Amount"].std(),
+        "min(Amount)": grupos["Amount"].min(),
+        "max(Amount)": grupos["Amount"].max(),
+        "mediana(Amount)": grupos["Amount"].median(),
+        "quantil(Amount, 0.9)": grupos["Amount"].quantile(0.9),
+    })
+
+
+AGREGACOES = [{"funcao": "contagem"}] + [
+    {"funcao": funcao, "coluna": "Amount"} for funcao in ("soma", "media", "desvio", "min", "max", "mediana")
+] + [{"funcao": "quantil", "coluna": "Amount", "q": 0.9}]
+
+
+def test_agrupamento_com_chaves_ausentes(df):
+    # As linhas com Tipo ausente ficam fora dos grupos, como no groupby do pandas
+    especificacao = {"agrupar_por": ["Tipo", "Class"], "agregacoes": AGREGACOES, "limite": 100}
+    tabela, selecionadas, total_grupos, _ = obter_plano(especificacao, df).executar(df)
+    esperado = _agregacoes_pandas(df.astype({"Amount": np.float64}).groupby(["Tipo", "Class"]))
+    assert selecionadas == len(df) and total_grupos == len(esperado)
+    pd.testing.assert_frame_equal(tabela, esperado, check_dtype=False, rtol=1e-9)
+
+
+def test_agrupamento_filtrado_e_ordenado(df):
+    especificacao = {
+        "filtros": [{"coluna": "Time", "operador": "entre", "valores": [2_000, 12_000]}],
+        "agrupar_por": ["Tipo"], "agregacoes": [{"funcao": "media", "coluna": "Amount"}],
+        "ordenar_por": "Amount", "decrescente": False, "limite": 2,
+    }
+    tabela, _, total_grupos, _ = obter_plano(especificacao, df).executar(df)
+    filtrado = df[df["Time"].between(2_000, 12_000)].astype({"Amount": np.float64})
+    esperado = filtrado.groupby("Tipo")["Amount"].mean().sort_values().head(2)
+    assert total_grupos == 3
+    pd.testing.assert_series_equal(tabela["media(Amount)"], esperado, check_names=False, rtol=1e-9)
+
+
+def test_agregacoes_sem_agrupamento(df):
+    especificacao = {"filtros": [{"coluna": "Class", "operador": "==", "valor": 1}], "agregacoes": AGREGACOES}
+    tabela, selecionadas, _, _ = obter_plano(especificacao, df).executar(df)
+    fraudes = df[df["Class"] == 1].astype({"Amount": np.float64})
+    esperado = _agregacoes_pandas(fraudes.groupby(np.zeros(len(fraudes)))).iloc[0]
+    assert selecionadas == len(fraudes)
+    np.testing.assert_allclose(tabela[esperado.index].astype(float), esperado.to_numpy(dtype=float), rtol=1e-9)
+
+
+@pytest.mark.parametrize("decrescente", [True, False])
+def test_top_k_de_linhas(df, decrescente):
+    especificacao = {"colunas": ["Time", "V1"], "ordenar_por": "V1", "decrescente": decrescente, "limite": 7}
+    tabela, _, _, _ = obter_plano(especificacao, df).executar(df)
+    esperado = (df.nlargest if decrescente else df.nsmallest)(7, "V1")[["Time", "V1"]]
+    pd.testing.assert_frame_equal(tabela, esperado)
+
+
+def test_top_k_deixa_ausentes_por_ultimo(df):
+    especificacao = {"filtros": [{"coluna": "Class", "operador": "==", "valor": 1}], "colunas": ["Amount"],
+                     "ordenar_por": "Amount", "decrescente": False, "limite": 100}
+    tabela, _, _, _ = obter_plano(especificacao, df).executar(df)
+    esperado = df[df["Class"] == 1].sort_values("Amount", kind="stable", na_position="last")[["Amount"]].head(100)
+    pd.testing.assert_frame_equal(tabela, esperado)
+
+
+def test_especificacao_invalida_retorna_erro(df):
+    assert consulta_estruturada(df, {"filtros": [{"coluna": "Nada", "operador": "==", "valor": 1}]}).startswith(
+        "Erro na consulta estruturada: coluna 'Nada'")
+    assert "operador '~'" in consulta_estruturada(df, {"filtros": [{"coluna": "Amount", "operador": "~", "valor": 1}]})
+    assert "exige valores numéricos" in consulta_estruturada(df, {"filtros": [{"coluna": "Amount", "operador": "==", "valor": "x"}]})
+    assert "exige 'q'" in consulta_estruturada(df, {"agregacoes": [{"funcao": "quantil", "coluna": "Amount"}]})
@@ -0,0 +1,52 @@
+"""consulta_tool: alterações feitas no lugar pelo código valem igualmente na execução local e na isolada (pool de processos)."""
+import numpy as np
+import pandas as pd
+import pytest
+
+import tools
+from tools import consulta_tool, impressao_digital
+
+
+@pytest.fixture(params=[False, True], ids=["local", "isolada"])
+def modo(request, monkeypatch):
+    monkeypatch.setattr(tools, "CONSULTA_ISOLADA", request.param)
+    return request.param
+
+
+@pytest.fixture
+def df():
+    return pd.DataFrame({"a": [1.0, np.nan, 3.0], "b": [3, 1, 2]})
+
+
+def test_alteracao_no_lugar_e_mantida(modo, df):
+    impressao = impressao_digital(df)
+    resultado = consulta_tool(df, "df.fillna(0, inplace=True)")
+    assert not resultado.startswith("Erro"), resultado
+    assert consulta_tool(df, "df['a'].isna().sum()") == "0"
+    assert df["a"].tolist() == [1.0, 0.0, 3.0]
+    assert impressao_digital(df) != impressao
+
+
+def test_colunas_criadas_e_removidas_no_lugar(modo, df):
+    consulta_tool(df, "df.insert(2, 'c', df['b'] * 2)")
+    assert df["c"].tolist() == [6, 2, 4]
+    consulta_tool(df, "df.drop(columns=['a'], inplace=True)")
+    assert "a" not in df.columns
+    assert consulta_tool(df, "list(df.columns)") == "['b', 'c']"
+
+
+def test_consulta_sem_alteracao_vem_do_cache(modo, df):
+    primeira = consulta_tool(df, "df['b'].sum()")
+    assert primeira == "6"
+    assert consulta_tool(df, "df['b'].sum()") == primeira
+    assert df["b"].tolist() == [3, 1, 2]
+
+
+def test_alteracao_das_linhas_no_lugar(modo, df):
+    resultado = consulta_tool(df, "df.sort_values('b', inplace=True)")
+    if modo:
+        # Na execução isolada, reordenar ou remover linhas no lugar não é mantido e o modelo é avisado
+        assert resultado.startswith("Erro") and "inplace=True" in resultado
+        assert df["b"].tolist() == [3, 1, 2]
+    else:
+        assert df["b"].tolist() == [1, 2, 3]
@@ -0,0 +1,90 @@
+"""Compactação do histórico: o resumo dos turnos antigos é incremental, estável entre chamadas e cortado em linhas inteiras."""
+import contexto
+from contexto import ResumoHistorico, compactar_historico, resumir_turno
+
+
+def _turno(i: int) -> list:
+    return [
+        {"role": "user", "parts": [{"text": f"Pergunta {i}: qual a média do Amount no dia {i}?"}]},
+        {"role": "model", "parts": [{"functionCall": {"name": "consulta_tool", "args": {"codigo_python": f"df['Amount'].mean() # {i}"}}}]},
+        {"role": "user", "parts": [{"functionResponse": {"name": "consulta_tool", "response": {"output": "x" * 2_000}}}]},
+        {"role": "model", "parts": [{"text": f"A média do dia {i} é {i}.5."}]},
+    ]
+
+
+def _resumo_enviado(compactado: list) -> str:
+    texto = compactado[0]["parts"][0]["text"]
+    assert texto.startswith("Resumo das interações anteriores")
+    return texto.split("\n", 1)[1]
+
+
+def test_cada_turno_e_resumido_uma_unica_vez(monkeypatch):
+    chamadas = []
+    monkeypatch.setattr(contexto, "resumir_turno", lambda turno: chamadas.append(turno) or resumir_turno(turno))
+    resumo = ResumoHistorico()
+    mensagens = []
+    for i in range(30):
+        mensagens += _turno(i)
+        compactar_historico(mensagens, orcamento_tokens=5_000, turnos_recentes=4, resumo=resumo)
+    assert len(chamadas) == resumo.turnos
+    assert [turno[0]["parts"][0]["text"] for turno in chamadas] == [f"Pergunta {i}: qual a média do Amount no dia {i}?" for i in range(resumo.turnos)]
+
+
+def test_resumo_incremental_igual_ao_do_zero_e_com_prefixo_estavel():
+    resumo = ResumoHistorico(max_caracteres=100_000)
+    mensagens = []
+    anterior = ""
+    for i in range(20):
+        mensagens += _turno(i)
+        compactado = compactar_historico(mensagens, orcamento_tokens=5_000, turnos_recentes=4, resumo=resumo)
+        if compactado is mensagens:
+            continue
+        enviado = _resumo_enviado(compactado)
+        assert enviado.startswith(anterior)
+        anterior = enviado
+        do_zero = compactar_historico(mensagens, orcamento_tokens=5_000, turnos_recentes=4,
+                                      resumo=ResumoHistorico(max_caracteres=100_000))
+        assert compactado == do_zero
+
+
+def test_limite_de_tamanho_remove_turnos_inteiros():
+    resumo = ResumoHistorico(max_caracteres=800)
+    mensagens = []
+    linhas_validas = set()
+    for i in range(40):
+        mensagens += _turno(i)
+        linhas_validas.update(resumir_turno(_turno(i)).split("\n"))
+        compactado = compactar_historico(mensagens, orcamento_tokens=5_000, turnos_recentes=4, resumo=resumo)
+    enviado = _resumo_enviado(compactado)
+    cabecalho, *linhas = enviado.split("\n")
+    assert cabecalho == f"- ({resumo.omitidos} interação(ões) mais antiga(s) omitida(s))"
+    assert resumo.omitidos > 0 and len("\n".join(linhas)) <= 800
+    assert set(linhas) <= linhas_validas
+    # O resumo começa sempre no início de um turno
+    assert linhas[0].startswith("- Usuário: Pergunta")
+
+
+def test_turno_maior_que_o_limite_e_cortado_em_linhas_inteiras():
+    resumo = ResumoHistorico(max_caracteres=120)
+    resumo.incorporar([_turno(1)])
+    texto = resumo.texto()
+    assert len(texto) <= 120
+    assert set(texto.split("\n")) <= set(resumir_turno(_turno(1)).split("\n"))
+
+
+def test_historico_reiniciado_limpa_o_resumo():
+    resumo = ResumoHistorico()
+    mensagens = [m for i in range(20) for m in _turno(i)]
+    compactar_historico(mensagens, orcamento_tokens=5_000, turnos_recentes=4, resumo=resumo)
+    assert resumo.turnos > 0
+    novas = [m for i in range(100, 104) for m in _turno(i)]
+    compactado = compactar_historico(novas, orcamento_tokens=1_000, turnos_recentes=2, resumo=resumo)
+    assert "Pergunta 1:" not in _resumo_enviado(compactado)
+    assert resumo.turnos < 4
+
+
+def test_historico_dentro_do_orcamento_nao_muda():
+    mensagens = _turno(1)
+    resumo = ResumoHistorico()
+    assert compactar_historico(mensagens, resumo=resumo) is mensagens
+    assert resumo.turnos == 0
@@ -0,0 +1,125 @@
+"""Disjuntor e novas tentativas do cliente do Gemini, com a sessão HTTP substituída por respostas prontas."""
+import json
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import pytest
+import requests
+
+import gemini_client
+from gemini_client import ClienteGemini, Disjuntor, DisjuntorAberto, ErroGemini, _espera_sugerida
+
+
+def _resposta(status: int, corpo: dict | None = None, cabecalhos: dict | None = None) -> requests.Response:
+    resposta = requests.Response()
+    resposta.status_code = status
+    resposta._content = json.dumps(corpo or {}).encode("utf-8")
+    resposta.headers.update(cabecalhos or {})
+    return resposta
+
+
+class SessaoFalsa:
+    """Responde às chamadas de post com os status da lista, repetindo o último."""
+
+    def __init__(self, status: list, cabecalhos: dict | None = None):
+        self.status = list(status)
+        self.cabecalhos = cabecalhos
+        self.chamadas = 0
+
+    def post(self, *args, **kwargs):
+        self.chamadas += 1
+        status = self.status[min(self.chamadas, len(self.status)) - 1]
+        return _resposta(status, {"candidates": []} if status == 200 else {"error": {}}, self.cabecalhos)
+
+
+@pytest.fixture
+def cliente(monkeypatch):
+    monkeypatch.setattr(gemini_client, "BACKOFF_BASE_S", 0.0)
+    cliente = ClienteGemini(base_url="http://localhost:1", max_tentativas=3)
+    cliente.disjuntor = Disjuntor(falhas_para_abrir=2, espera_s=0.05)
+    return cliente
+
+
+def _chamar(cliente: ClienteGemini, status: list) -> SessaoFalsa:
+    cliente._sessao = SessaoFalsa(status)
+    try:
+        cliente.gerar_conteudo("modelo", {"contents": []}, "chave")
+    except ErroGemini:
+        pass
+    return cliente._sessao
+
+
+def test_disjuntor_fechado_aberto_meio_aberto_fechado(cliente):
+    # Cada chamada com as tentativas esgotadas conta uma falha, não uma por tentativa
+    assert _chamar(cliente, [503]).chamadas == 3
+    assert cliente.disjuntor.estado == "fechado"
+    assert _chamar(cliente, [503]).chamadas == 3
+    assert cliente.disjuntor.estado == "aberto"
+
+    with pytest.raises(DisjuntorAberto):
+        cliente.gerar_conteudo("modelo", {"contents": []}, "chave")
+
+    time.sleep(0.06)
+    assert cliente.disjuntor.estado == "meio-aberto"
+    # A chamada de teste usa as suas próprias tentativas e, ao ter sucesso, fecha o disjuntor
+    assert _chamar(cliente, [503, 503, 200]).chamadas == 3
+    assert cliente.disjuntor.estado == "fechado"
+
+
+def test_chamada_de_teste_com_falha_reabre_o_disjuntor(cliente):
+    _chamar(cliente, [503])
+    _chamar(cliente, [503])
+    time.sleep(0.06)
+
+    sessao = SessaoFalsa([503])
+    cliente._sessao = sessao
+    with pytest.raises(ErroGemini) as erro:
+        cliente.gerar_conteudo("modelo", {"contents": []}, "chave")
+    assert not isinstance(erro.value, DisjuntorAberto)
+    assert sessao.chamadas == 3
+    assert cliente.disjuntor.estado == "aberto"
+
+
+def test_so_uma_chamada_de_teste_por_vez():
+    disjuntor = Disjuntor(falhas_para_abrir=1, espera_s=0.0)
+    disjuntor.registrar_falha()
+    assert disjuntor.permitir()
+    # Outra thread não passa enquanto a chamada de teste está em andamento
+    with ThreadPoolExecutor(1) as executor:
+        assert executor.submit(disjuntor.permitir).result() is False
+    # Erro do cliente ou cancelamento: a chamada de teste é devolvida sem fechar nem reabrir
+    disjuntor.liberar()
+    assert disjuntor.estado == "meio-aberto"
+    assert disjuntor.permitir()
+
+
+def test_erro_do_cliente_na_chamada_de_teste_a_devolve(cliente):
+    _chamar(cliente, [503])
+    _chamar(cliente, [503])
+    time.sleep(0.06)
+    sessao = _chamar(cliente, [400])
+    assert sessao.chamadas == 1
+    assert cliente.disjuntor.estado == "meio-aberto"
+    assert _chamar(cliente, [200]).chamadas == 1
+    assert cliente.disjuntor.estado == "fechado"
+
+
+@pytest.mark.parametrize("valor", ["em breve", "Wed, 99 Foo 2024 25:61:00 GMT", "-"])
+def test_retry_after_malformado_usa_o_backoff(valor):
+    assert _espera_sugerida(_resposta(503, cabecalhos={"Retry-After": valor})) is None
+
+
+def test_retry_after_valido():
+    assert _espera_sugerida(_resposta(429, cabecalhos={"Retry-After": "7"})) == 7.0
+    data = time.strftime("%a, %d %b %Y %H:%M:%S GMT", time.gmtime(time.time() + 60))
+    assert 50 < _espera_sugerida(_resposta(503, cabecalhos={"Retry-After": data})) <= 60
+    corpo = {"error": {"details": [{"@type": "type.googleapis.com/google.rpc.RetryInfo", "retryDelay": "3s"}]}}
+    assert _espera_sugerida(_resposta(429, corpo)) == 3.0
+
+
+def test_retry_after_malformado_nao_interrompe_as_tentativas(cliente):
+    sessao = SessaoFalsa([503], cabecalhos={"Retry-After": "em breve"})
+    cliente._sessao = sessao
+    with pytest.raises(ErroGemini, match="após 3 tentativas"):
+        cliente.gerar_conteudo("modelo", {"contents": []}, "chave")
+    assert sessao.chamadas == 3
@@ -0,0 +1,59 @@
+"""Índice do dataset: janelas de Time e subconjuntos por classe devem bater com o filtro por máscara, mesmo com o DataFrame alterado."""
+import numpy as np
+import pandas as pd
+import pytest
+
+from indices import IndiceDados
+
+
+def _dados(linhas: int, ordenado: bool, semente: int = 0) -> pd.DataFrame:
+    rng = np.random.default_rng(semente)
+    tempos = rng.integers(0, 10_000, linhas)
+    return pd.DataFrame({
+        "Time": np.sort(tempos) if ordenado else tempos,
+        "Amount": rng.lognormal(3.0, 1.0, linhas),
+        "Class": (rng.random(linhas) < 0.05).astype(np.int8),
+    })
+
+
+def _janela_esperada(df: pd.DataFrame, t0, t1) -> pd.DataFrame:
+    mascara = np.ones(len(df), dtype=bool)
+    if t0 is not None:
+        mascara &= (df["Time"] >= t0).to_numpy()
+    if t1 is not None:
+        mascara &= (df["Time"] <= t1).to_numpy()
+    return df[mascara].sort_values("Time", kind="stable")
+
+
+JANELAS = [(0, 3_600), (2_500.5, 2_600), (None, 500), (9_000, None), (None, None), (5_000, 4_000), (20_000, 30_000)]
+
+
+@pytest.mark.parametrize("ordenado", [True, False], ids=["time_ordenado", "time_fora_de_ordem"])
+@pytest.mark.parametrize("t0, t1", JANELAS)
+def test_janela_igual_ao_filtro(ordenado, t0, t1):
+    df = _dados(3_000, ordenado)
+    pd.testing.assert_frame_equal(IndiceDados(df).janela(df, t0, t1), _janela_esperada(df, t0, t1))
+
+
+@pytest.mark.parametrize("t0, t1", JANELAS)
+def test_janela_apos_alteracao_no_lugar(t0, t1):
+    # Mesmo número de linhas, conteúdo diferente do indexado: a janela recorre à máscara
+    df = _dados(3_000, ordenado=True)
+    indice = IndiceDados(df)
+    df.sort_values("Amount", inplace=True, ignore_index=True)
+    pd.testing.assert_frame_equal(indice.janela(df, t0, t1), _janela_esperada(df, t0, t1))
+
+
+def test_janela_e_subconjunto_com_outro_numero_de_linhas():
+    df = _dados(3_000, ordenado=False)
+    indice = IndiceDados(df)
+    menor = df.iloc[:2_000]
+    pd.testing.assert_frame_equal(indice.janela(menor, 1_000, 2_000), _janela_esperada(menor, 1_000, 2_000))
+    pd.testing.assert_frame_equal(indice.subconjunto(menor, 1), menor[menor["Class"] == 1])
+
+
+def test_subconjunto_por_classe():
+    df = _dados(3_000, ordenado=False)
+    indice = IndiceDados(df)
+    for classe in (0, 1):
+        pd.testing.assert_frame_equal(indice.subconjunto(df, classe), df[df["Class"] == classe])
@@ -0,0 +1,67 @@
+"""Execução em lote: arquivo de perguntas inválido, erros por turno e nomes de gráficos sem colisão."""
+import io
+import json
+import threading
+
+import pytest
+
+import lote
+
+
+class ConversaFalsa:
+    """Substitui agente.Conversa: cada pergunta gera um gráfico; 'falha...' registra um erro e não responde."""
+
+    def __init__(self, estado, interface, limite_chamadas):
+        self.estado = estado
+        self.interface = interface
+
+    def responder(self, prompt, **atributos_turno):
+        self.estado.tool_images.append(io.BytesIO(prompt.encode()))
+        if prompt.startswith("falha"):
+            self.interface.erro(f"erro em {prompt}")
+            return None
+        if prompt.startswith("vazia"):
+            return None
+        return {"texto": f"resposta a {prompt}", "total_s": 0.1, "etapas": []}
+
+
+@pytest.fixture(autouse=True)
+def conversa_falsa(monkeypatch):
+    monkeypatch.setattr(lote, "Conversa", ConversaFalsa)
+
+
+def _executar(conversa, diretorio, indice=0):
+    (diretorio / "graficos").mkdir(exist_ok=True)
+    return lote.executar_conversa(conversa, None, None, threading.BoundedSemaphore(1), str(diretorio), indice)
+
+
+def test_erro_registrado_apenas_no_turno_em_que_ocorreu(tmp_path):
+    registro = _executar({"id": "c", "perguntas": ["falha 1", "ok", "vazia"]}, tmp_path)
+    assert [t["erro"] for t in registro["turnos"]] == ["erro em falha 1", None, None]
+    assert [t["resposta"] for t in registro["turnos"]] == [None, "resposta a ok", None]
+
+
+def test_ids_que_geram_o_mesmo_nome_nao_sobrescrevem_graficos(tmp_path):
+    primeiro = _executar({"id": "a/b", "perguntas": ["x"]}, tmp_path, indice=0)
+    segundo = _executar({"id": "a_b", "perguntas": ["y"]}, tmp_path, indice=1)
+    nome_1, nome_2 = primeiro["turnos"][0]["graficos"][0], segundo["turnos"][0]["graficos"][0]
+    assert nome_1 != nome_2
+    assert (tmp_path / nome_1).read_bytes() == b"x" and (tmp_path / nome_2).read_bytes() == b"y"
+
+
+def test_ler_perguntas_jsonl(tmp_path):
+    caminho = tmp_path / "perguntas.jsonl"
+    caminho.write_text(
+        json.dumps({"id": "a", "perguntas": ["p1", "p2"]}) + "\n\n" + json.dumps({"pergunta": "p3"}) + "\n",
+        encoding="utf-8")
+    assert lote.ler_perguntas(str(caminho)) == [{"id": "a", "perguntas": ["p1", "p2"]}, {"id": "3", "perguntas": ["p3"]}]
+
+
+@pytest.mark.parametrize("linha", ['{"id": "x", "perguntas": ', '["p1"]', '{"id": "x"}', '{"perguntas": "p1"}'],
+                         ids=["json_invalido", "nao_objeto", "sem_perguntas", "perguntas_nao_lista"])
+def test_ler_perguntas_linha_invalida_encerra_com_o_numero(tmp_path, linha):
+    caminho = tmp_path / "perguntas.jsonl"
+    caminho.write_text(json.dumps({"pergunta": "ok"}) + "\n" + linha + "\n", encoding="utf-8")
+    with pytest.raises(SystemExit) as erro:
+        lote.ler_perguntas(str(caminho))
+    assert "linha 2" in str(erro.value.code)
@@ -1,30 +1,758 @@
 import pandas as pd
-import matplotlib.pyplot as plt
+from matplotlib.backends.backend_agg import FigureCanvasAgg
+from matplotlib.colors import LogNorm
+from matplotlib.figure import Figure
+import numpy as np
 import os
 import io
 import sys
+import json
+import time
+import shutil
+import ast
+import bz2
+import gzip
+import lzma
+import zipfile
+import zlib
+import hashlib
+import tempfile
+import threading
+import contextlib
+import weakref
+from concurrent.futures import ThreadPoolExecutor
+from collections import OrderedDict
 from io import BytesIO
+from urllib.parse import urlparse
 import requests
+from estatisticas import EstatisticasIncrementais
+from metricas import anotar, trecho
 
 # Variável global para a URL do arquivo grande (150MB)
 # LINK FINAL: Aponta para o arquivo creditcard.zip na branch 'main' do GitHub.
 PUBLIC_CSV_URL = "https://raw.githubusercontent.com/marcaopamaral/gemini-analise-fraude/main/data/creditcard.zip"
 
-def carregar_dados_dinamicamente(url: str):
-    """Carrega um DataFrame a partir de uma URL fornecida, suportando compressão (ZIP, GZ, etc.)."""
+# Orçamento de memória (em MB) do cache de DataFrames compartilhado entre todas as sessões do processo.
+CACHE_DADOS_MAX_MB = int(os.environ.get("CACHE_DADOS_MAX_MB", "1024"))
+# Por quanto tempo (s) a versão (ETag/Last-Modified) de uma URL é reaproveitada antes de um novo HEAD.
+VERSAO_FONTE_TTL_S = float(os.environ.get("VERSAO_FONTE_TTL_S", "60"))
+
+# Diretório e tamanho máximo (em MB) do cache colunar em disco dos CSVs já convertidos.
+CACHE_COLUNAR_DIR = os.environ.get("CACHE_COLUNAR_DIR", os.path.join(".cache", "colunar"))
+CACHE_COLUNAR_MAX_MB = int(os.environ.get("CACHE_COLUNAR_MAX_MB", "2048"))
+# Incrementar quando o layout em disco mudar: entradas de formatos antigos são descartadas.
+_FORMATO_CACHE_COLUNAR = 3
+
+# Esquema fixo do dataset de fraudes de cartão de crédito e os tipos compactos usados na carga.
+COLUNAS_CREDITCARD = ['Time'] + [f'V{i}' for i in range(1, 29)] + ['Amount', 'Class']
+DTYPES_CREDITCARD = {**{f'V{i}': 'float32' for i in range(1, 29)}, 'Amount': 'float32', 'Class': 'int8'}
+# Carga compacta: esquema tipado para o layout de fraudes e redução automática de tipos para os demais CSVs.
+CARGA_COMPACTA = os.environ.get("CARGA_COMPACTA", "1") != "0"
+
+# Ingestão em streaming: arquivos maiores que STREAMING_LIMIAR_MB são lidos em blocos de STREAMING_BLOCO_LINHAS.
+# No máximo STREAMING_MAX_LINHAS linhas ficam em memória e a leitura para após STREAMING_MAX_MB lidos da fonte.
+STREAMING_LIMIAR_MB = int(os.environ.get("STREAMING_LIMIAR_MB", "500"))
+STREAMING_MAX_LINHAS = int(os.environ.get("STREAMING_MAX_LINHAS", "1000000"))
+STREAMING_MAX_MB = int(os.environ.get("STREAMING_MAX_MB", "4096"))
+STREAMING_BLOCO_LINHAS = 100_000
+# Linhas do primeiro bloco da carga compacta, usadas como amostra para decidir os tipos do esquema de fraudes.
+AMOSTRA_ESQUEMA_LINHAS = int(os.environ.get("AMOSTRA_ESQUEMA_LINHAS", "1000"))
+
+# Número máximo de resultados formatados da consulta_tool mantidos no cache compartilhado entre sessões.
+CACHE_CONSULTAS_MAX_ENTRADAS = int(os.environ.get("CACHE_CONSULTAS_MAX_ENTRADAS", "512"))
+# Resultados maiores que isto (em caracteres) não são guardados no cache.
+CACHE_CONSULTAS_MAX_CARACTERES = 1_000_000
+
+# Séries/DataFrames com mais linhas que isto são resumidos pela consulta_tool (forma + primeiras e últimas linhas).
+CONSULTA_MAX_LINHAS_SAIDA = int(os.environ.get("CONSULTA_MAX_LINHAS_SAIDA", "20"))
+
+# Executa a consulta_tool em processos separados (ver pool_consultas.py); 0 executa no próprio processo.
+CONSULTA_ISOLADA = os.environ.get("CONSULTA_ISOLADA", "1") != "0"
+
+# Acima deste número de linhas o grafico_tool pré-agrega os dados com NumPy antes de desenhar.
+LIMIAR_AGREGACAO_GRAFICO = int(os.environ.get("LIMIAR_AGREGACAO_GRAFICO", "50000"))
+# Resolução da agregação: células por eixo no scatter, baldes na decimação e máximo de outliers por caixa.
+CELULAS_DENSIDADE = 200
+BALDES_DECIMACAO = 2000
+MAX_OUTLIERS_BOXPLOT = 500
+
+# Gráficos renderizados em paralelo por GRAFICOS_TRABALHADORES threads e mantidos em cache (PNG) até CACHE_GRAFICOS_MAX_MB.
+GRAFICOS_TRABALHADORES = int(os.environ.get("GRAFICOS_TRABALHADORES", "2"))
+CACHE_GRAFICOS_MAX_MB = int(os.environ.get("CACHE_GRAFICOS_MAX_MB", "64"))
+
+# Com Copy-on-Write, as visões rasas entregues a cada sessão nunca alteram o DataFrame compartilhado
+# (no pandas >= 3.0 o comportamento já é o padrão e a opção está obsoleta).
+if int(pd.__version__.split(".")[0]) < 3:
+    try:
+        pd.set_option("mode.copy_on_write", True)
+    except (KeyError, AttributeError):
+        pass
+
+# --- Cache de Dados Compartilhado (processo inteiro) ---
+# Chave: (fonte, versão) -> (DataFrame somente leitura, bytes em memória). A ordem do OrderedDict é a ordem LRU.
+_cache_dados = OrderedDict()
+_cache_dados_lock = threading.Lock()
+# Um lock por chave evita que várias sessões baixem a mesma fonte ao mesmo tempo.
+_locks_carga = {}
+# URL -> (versão, instante monotônico até o qual ela vale), para não repetir o HEAD a cada carga.
+_versoes_url = {}
+
+
+def _versao_url(url: str) -> str:
+    """ETag ou Last-Modified da URL (HEAD), ou "" se o servidor não informar nenhum dos dois ou não responder."""
+    try:
+        resposta = requests.head(url, allow_redirects=True, timeout=10)
+    except requests.exceptions.RequestException:
+        return ""
+    if not resposta.ok:
+        return ""
+    # O tamanho não identifica uma versão: conteúdos diferentes podem ter o mesmo Content-Length
+    return resposta.headers.get("ETag") or resposta.headers.get("Last-Modified") or ""
+
+
+# --- Impressão Digital dos DataFrames ---
+# id(df) -> hash do conteúdo. Cada entrada é removida quando o DataFrame é coletado pelo GC.
+_impressoes_digitais = {}
+_impressoes_digitais_lock = threading.Lock()
+
+
+def registrar_impressao_digital(df: pd.DataFrame, valor: str):
+    """Associa ao objeto DataFrame uma impressão digital já conhecida (ex: da fonte em cache ou do manifesto)."""
+    with _impressoes_digitais_lock:
+        if id(df) in _impressoes_digitais:
+            _impressoes_digitais[id(df)] = valor
+            return
+        _impressoes_digitais[id(df)] = valor
+    weakref.finalize(df, _impressoes_digitais.pop, id(df), None)
+
+
+def impressao_digital(df: pd.DataFrame) -> str:
+    """
+    Hash do conteúdo do DataFrame (colunas, tipos, índice e todos os valores).
+    É calculado uma única vez por objeto: os DataFrames carregados são tratados como somente leitura, e quem
+    os altera no lugar (ex.: a consulta_tool executada no próprio processo) descarta o valor com
+    invalidar_impressao_digital.
+    """
+    with _impressoes_digitais_lock:
+        valor = _impressoes_digitais.get(id(df))
+    if valor is not None:
+        return valor
+    hash_conteudo = hashlib.sha256(repr((df.shape, [str(c) for c in df.columns], [str(t) for t in df.dtypes])).encode("utf-8"))
+    hash_conteudo.update(pd.util.hash_pandas_object(df, index=True).to_numpy().tobytes())
+    valor = hash_conteudo.hexdigest()[:32]
+    registrar_impressao_digital(df, valor)
+    return valor
+
+
+def invalidar_impressao_digital(df: pd.DataFrame):
+    """Descarta a impressão digital do objeto: o DataFrame foi alterado e ela será recalculada no próximo uso."""
+    with _impressoes_digitais_lock:
+        _impressoes_digitais.pop(id(df), None)
+
+
+def _assinatura_conteudo(df: pd.DataFrame) -> tuple:
+    """
+    Assinatura barata do conteúdo atual (CRC32 de cada coluna e do índice), usada para detectar alterações
+    feitas no lugar. Bem mais rápida que a impressão digital, mas não serve de chave entre objetos diferentes.
+    """
+    def crc(valores) -> int:
+        valores = np.ascontiguousarray(valores)
+        if valores.dtype.kind not in "biufcmM":
+            valores = pd.util.hash_pandas_object(pd.Series(valores), index=False).to_numpy()
+        return zlib.crc32(memoryview(valores).cast("B"))
+
+    indice = df.index
+    assinatura_indice = (indice.start, indice.stop, indice.step) if isinstance(indice, pd.RangeIndex) else crc(indice.to_numpy())
+    return (
+        df.shape, [str(c) for c in df.columns], [str(t) for t in df.dtypes], assinatura_indice,
+        [crc(df.iloc[:, i].to_numpy()) for i in range(df.shape[1])],
+    )
+
+
+def _versao_fonte(fonte: str) -> str:
+    """
+    Retorna um identificador de versão da fonte: ETag/Last-Modified para URLs (reaproveitado por VERSAO_FONTE_TTL_S,
+    para que cada início de sessão não faça um HEAD), mtime/tamanho para arquivos locais. "" = versão desconhecida.
+    """
+    if fonte.startswith(("http://", "https://")):
+        agora = time.monotonic()
+        with _cache_dados_lock:
+            versao, validade = _versoes_url.get(fonte, ("", 0.0))
+        if agora < validade:
+            return versao
+        versao = _versao_url(fonte)
+        with _cache_dados_lock:
+            _versoes_url[fonte] = (versao, agora + VERSAO_FONTE_TTL_S)
+        return versao
+    if os.path.exists(fonte):
+        info = os.stat(fonte)
+        return f"{info.st_mtime_ns}-{info.st_size}"
+    return ""
+
+
+def _armazenar_no_cache(chave: tuple, df: pd.DataFrame):
+    """Insere um DataFrame no cache e remove as entradas menos usadas até caber no orçamento."""
+    limite = CACHE_DADOS_MAX_MB * 1024 * 1024
+    tamanho = int(df.memory_usage(deep=True).sum())
+    # Calculada uma vez para a cópia compartilhada; as visões entregues às sessões herdam o valor
+    impressao_digital(df)
+    with _cache_dados_lock:
+        # Versões antigas da mesma fonte nunca mais serão pedidas
+        for chave_antiga in [c for c in _cache_dados if c[0] == chave[0] and c != chave]:
+            del _cache_dados[chave_antiga]
+        _cache_dados[chave] = (df, tamanho)
+        _cache_dados.move_to_end(chave)
+        while len(_cache_dados) > 1 and sum(t for _, t in _cache_dados.values()) > limite:
+            chave_removida, _ = _cache_dados.popitem(last=False)
+            print(f"[INFO] Cache de dados: removendo '{chave_removida[0]}' (orçamento de {CACHE_DADOS_MAX_MB} MB excedido).")
+
+
+def _buscar_no_cache(chave: tuple):
+    """Retorna o DataFrame em cache para a chave (marcando-o como usado recentemente) ou None."""
+    with _cache_dados_lock:
+        entrada = _cache_dados.get(chave)
+        if entrada is None:
+            return None
+        _cache_dados.move_to_end(chave)
+        return entrada[0]
+
+
+def _copia_da_sessao(df: pd.DataFrame) -> pd.DataFrame:
+    """Cópia rasa (Copy-on-Write) do DataFrame compartilhado, com a mesma impressão digital."""
+    copia = df.copy(deep=False)
+    registrar_impressao_digital(copia, impressao_digital(df))
+    return copia
+
+
+def _carregar_compartilhado(fonte: str, leitor, progresso=None) -> pd.DataFrame:
+    """
+    Retorna o DataFrame da fonte a partir do cache compartilhado, carregando-o com 'leitor(fonte, versao, progresso)' apenas uma vez por versão.
+
+    Cada chamada recebe uma cópia rasa: as sessões compartilham os mesmos dados em memória,
+    mas alterações feitas por uma sessão (novas colunas, etc.) não afetam as demais.
+    """
+    with trecho("carga_dados", fonte=fonte) as atual:
+        chave = (fonte, _versao_fonte(fonte))
+        if not chave[1]:
+            # Versão desconhecida: não há como saber se uma cópia em cache ainda vale, então a fonte é lida de novo
+            print(f"[AVISO] Versão de '{fonte}' desconhecida; carregando sem o cache compartilhado.")
+            atual.definir(origem="sem_cache")
+            df = leitor(fonte, "", progresso)
+            atual.definir(linhas=len(df))
+            return df
+        df = _buscar_no_cache(chave)
+        if df is not None:
+            print(f"[INFO] Dados de '{fonte}' reutilizados do cache compartilhado.")
+            atual.definir(origem="cache_memoria", linhas=len(df))
+            return _copia_da_sessao(df)
+
+        with _cache_dados_lock:
+            lock_carga = _locks_carga.setdefault(chave, threading.Lock())
+        try:
+            with lock_carga:
+                # Outra sessão pode ter concluído a carga enquanto esperávamos o lock
+                df = _buscar_no_cache(chave)
+                if df is None:
+                    df = leitor(fonte, chave[1], progresso)
+                    _armazenar_no_cache(chave, df)
+                else:
+                    atual.definir(origem="cache_memoria")
+        finally:
+            with _cache_dados_lock:
+                _locks_carga.pop(chave, None)
+        atual.definir(linhas=len(df))
+        return _copia_da_sessao(df)
+
+
+def estatisticas_cache_dados() -> dict:
+    """Resumo do cache compartilhado de DataFrames (fontes em cache, memória usada e orçamento)."""
+    with _cache_dados_lock:
+        return {
+            "entradas": [fonte for fonte, _ in _cache_dados],
+            "memoria_mb": sum(t for _, t in _cache_dados.values()) / (1024 * 1024),
+            "limite_mb": CACHE_DADOS_MAX_MB,
+        }
+
+
+# --- Cache Colunar em Disco ---
+# Cada fonte (URL ou caminho + versão) vira um diretório com um manifesto JSON e um arquivo .npy por
+# sequência de colunas com o mesmo dtype numérico, gravado no layout de blocos do pandas (colunas x linhas).
+# Na leitura os arquivos são abertos com memory mapping e o DataFrame é montado sem copiar os dados.
+
+def _diretorio_cache_colunar(fonte: str, versao: str) -> str:
+    """Diretório do cache colunar correspondente a uma fonte e versão."""
+    chave = hashlib.sha256(f"{fonte}\n{versao}".encode("utf-8")).hexdigest()[:24]
+    return os.path.join(CACHE_COLUNAR_DIR, chave)
+
+
+def _segmentos_por_dtype(df: pd.DataFrame) -> list:
+    """Agrupa as colunas em sequências contíguas com o mesmo dtype, preservando a ordem original."""
+    segmentos = []
+    for coluna, dtype in df.dtypes.items():
+        if segmentos and segmentos[-1][1] == dtype:
+            segmentos[-1][0].append(coluna)
+        else:
+            segmentos.append(([coluna], dtype))
+    return segmentos
+
+
+def _versao_cache_colunar(versao: str) -> str:
+    """Versão usada no cache colunar: o modo de carga faz parte dela, para tipos compactos e originais não se misturarem."""
+    return f"{versao};compacta={int(CARGA_COMPACTA)}" if versao else ""
+
+
+def _remover_cache_colunar(fonte: str, versao: str):
+    """Apaga a entrada do cache colunar de uma fonte (se existir)."""
+    shutil.rmtree(_diretorio_cache_colunar(fonte, _versao_cache_colunar(versao)), ignore_errors=True)
+
+
+def _salvar_cache_colunar(df: pd.DataFrame, fonte: str, versao: str):
+    """Converte o DataFrame para o formato colunar em disco. Falhas apenas desativam o cache para esta fonte."""
+    if not versao or df.shape[1] == 0 or not isinstance(df.index, pd.RangeIndex) or df.index.start != 0:
+        return
+    destino = _diretorio_cache_colunar(fonte, versao)
+    temporario = f"{destino}.tmp-{os.getpid()}-{threading.get_ident()}"
+    try:
+        os.makedirs(temporario, exist_ok=True)
+        segmentos = []
+        for i, (colunas, dtype) in enumerate(_segmentos_por_dtype(df)):
+            if isinstance(dtype, np.dtype) and dtype.kind in "biuf":
+                arquivo = f"segmento_{i}.npy"
+                # Layout (colunas, linhas) contíguo: é exatamente o bloco interno que o pandas espera
+                np.save(os.path.join(temporario, arquivo), np.ascontiguousarray(df[colunas].to_numpy().T))
+                tipo = "npy"
+            else:
+                # Texto, categorias e dtypes de extensão não podem ser mapeados em memória
+                arquivo = f"segmento_{i}.pkl"
+                df[colunas].to_pickle(os.path.join(temporario, arquivo))
+                tipo = "pickle"
+            segmentos.append({
+                "arquivo": arquivo,
+                "tipo": tipo,
+                "colunas": [str(c) for c in colunas],
+                "bytes": os.path.getsize(os.path.join(temporario, arquivo)),
+            })
+
+        manifesto = {
+            "formato": _FORMATO_CACHE_COLUNAR,
+            "fonte": fonte,
+            "versao": versao,
+            "linhas": int(df.shape[0]),
+            "segmentos": segmentos,
+            "attrs": df.attrs,
+            "impressao_digital": impressao_digital(df),
+            "criado_em": time.time(),
+        }
+        with open(os.path.join(temporario, "manifesto.json"), "w", encoding="utf-8") as f:
+            json.dump(manifesto, f)
+
+        # Outra sessão/processo pode ter gravado a mesma entrada primeiro; nesse caso a dela é mantida
+        if os.path.exists(destino):
+            shutil.rmtree(temporario, ignore_errors=True)
+        else:
+            os.rename(temporario, destino)
+            print(f"[INFO] Cache colunar criado para '{fonte}' em '{destino}'.")
+    except OSError as e:
+        shutil.rmtree(temporario, ignore_errors=True)
+        print(f"[AVISO] Não foi possível gravar o cache colunar de '{fonte}': {e}")
+        return
+    _limpar_cache_colunar()
+
+
+def _abrir_cache_colunar(fonte: str, versao: str):
+    """Abre a entrada do cache colunar com memory mapping. Retorna None se não existir ou estiver inválida."""
+    if not versao:
+        return None
+    diretorio = _diretorio_cache_colunar(fonte, versao)
+    caminho_manifesto = os.path.join(diretorio, "manifesto.json")
+    if not os.path.exists(caminho_manifesto):
+        return None
+
+    try:
+        with open(caminho_manifesto, encoding="utf-8") as f:
+            manifesto = json.load(f)
+        if (manifesto["formato"] != _FORMATO_CACHE_COLUNAR or manifesto["fonte"] != fonte
+                or manifesto["versao"] != versao):
+            raise ValueError("manifesto não corresponde à fonte")
+
+        linhas = manifesto["linhas"]
+        partes = []
+        for segmento in manifesto["segmentos"]:
+            caminho = os.path.join(diretorio, segmento["arquivo"])
+            if os.path.getsize(caminho) != segmento["bytes"]:
+                raise ValueError(f"tamanho inesperado em {segmento['arquivo']}")
+            if segmento["tipo"] == "npy":
+                valores = np.load(caminho, mmap_mode="r")
+                if valores.shape != (len(segmento["colunas"]), linhas):
+                    raise ValueError(f"formato inesperado em {segmento['arquivo']}")
+                partes.append(pd.DataFrame(valores.T, columns=segmento["colunas"], copy=False))
+            else:
+                partes.append(pd.read_pickle(caminho))
+
+        df = pd.concat(partes, axis=1)
+        df.attrs.update(manifesto.get("attrs", {}))
+        registrar_impressao_digital(df, manifesto["impressao_digital"])
+        # A data de modificação do manifesto registra o último acesso (usada pela limpeza LRU)
+        os.utime(caminho_manifesto)
+        return df
+    except (OSError, ValueError, KeyError, TypeError) as e:
+        print(f"[AVISO] Cache colunar de '{fonte}' inválido ({e}). Ele será recriado.")
+        shutil.rmtree(diretorio, ignore_errors=True)
+        return None
+
+
+def _limpar_cache_colunar():
+    """Remove as entradas acessadas há mais tempo até o cache em disco caber em CACHE_COLUNAR_MAX_MB."""
+    if not os.path.isdir(CACHE_COLUNAR_DIR):
+        return
+    entradas = []
+    for nome in os.listdir(CACHE_COLUNAR_DIR):
+        diretorio = os.path.join(CACHE_COLUNAR_DIR, nome)
+        try:
+            if ".tmp-" in nome:
+                # Sobras de gravações interrompidas
+                if time.time() - os.path.getmtime(diretorio) > 3600:
+                    shutil.rmtree(diretorio, ignore_errors=True)
+                continue
+            tamanho = sum(os.path.getsize(os.path.join(diretorio, a)) for a in os.listdir(diretorio))
+            ultimo_acesso = os.path.getmtime(os.path.join(diretorio, "manifesto.json"))
+        except OSError:
+            continue
+        entradas.append((ultimo_acesso, tamanho, diretorio))
+
+    limite = CACHE_COLUNAR_MAX_MB * 1024 * 1024
+    total = sum(tamanho for _, tamanho, _ in entradas)
+    for _, tamanho, diretorio in sorted(entradas):
+        if total <= limite:
+            break
+        shutil.rmtree(diretorio, ignore_errors=True)
+        total -= tamanho
+        print(f"[INFO] Cache colunar: removendo '{diretorio}' (limite de {CACHE_COLUNAR_MAX_MB} MB excedido).")
+
+
+def _memoria_original(df: pd.DataFrame) -> int:
+    """Estimativa (bytes) da memória que o DataFrame ocuparia com os tipos padrão do read_csv (float64/int64)."""
+    total = int(df.index.memory_usage())
+    for coluna in df.columns:
+        serie = df[coluna]
+        if pd.api.types.is_numeric_dtype(serie) and not isinstance(serie.dtype, pd.CategoricalDtype):
+            total += 8 * len(serie)
+        else:
+            total += int(serie.memory_usage(index=False, deep=True))
+    return total
+
+
+def _reduzir_tipos(df: pd.DataFrame) -> pd.DataFrame:
+    """Reduz o tipo de cada coluna ao menor tipo que representa seus valores (usado para CSVs fora do esquema)."""
+    colunas = {}
+    for coluna in df.columns:
+        serie = df[coluna]
+        if pd.api.types.is_bool_dtype(serie):
+            colunas[coluna] = serie
+        elif pd.api.types.is_integer_dtype(serie):
+            colunas[coluna] = pd.to_numeric(serie, downcast='integer')
+        elif pd.api.types.is_float_dtype(serie):
+            valores = serie.to_numpy()
+            if len(valores) and not np.isnan(valores).any() and np.array_equal(valores, np.floor(valores)):
+                colunas[coluna] = pd.to_numeric(serie, downcast='integer')
+            else:
+                colunas[coluna] = pd.to_numeric(serie, downcast='float')
+        elif serie.dtype == object or pd.api.types.is_string_dtype(serie):
+            # Texto com poucos valores distintos ocupa bem menos como categoria
+            colunas[coluna] = serie.astype('category') if serie.nunique() < len(serie) / 2 else serie
+        else:
+            colunas[coluna] = serie
+    return pd.DataFrame(colunas, index=df.index)
+
+
+def _compactar_tipos(df: pd.DataFrame, fonte: str) -> pd.DataFrame:
+    """
+    Aplica os tipos compactos a um DataFrame já lido: Time inteiro no esquema de fraudes ou redução
+    automática de tipos por coluna nos demais CSVs. A memória antes/depois fica em df.attrs['memoria'].
+    """
+    memoria_antes = _memoria_original(df)
+    segue_esquema = list(df.columns) == COLUNAS_CREDITCARD and pd.api.types.is_numeric_dtype(df['Time'])
+    if segue_esquema:
+        try:
+            df = df.astype(DTYPES_CREDITCARD)
+        except (ValueError, TypeError):
+            segue_esquema = False
+
+    if segue_esquema:
+        tempo = df['Time'].to_numpy()
+        if len(tempo) and not np.isnan(tempo).any() and np.array_equal(tempo, np.floor(tempo)):
+            df['Time'] = pd.to_numeric(df['Time'], downcast='integer')
+        modo = "esquema"
+    else:
+        print(f"[AVISO] '{fonte}' não segue o esquema Time/V1–V28/Amount/Class. Aplicando redução automática de tipos.")
+        df = _reduzir_tipos(df)
+        modo = "automatico"
+
+    df.attrs["memoria"] = {
+        "modo": modo,
+        "antes_mb": memoria_antes / (1024 * 1024),
+        "depois_mb": int(df.memory_usage(deep=True).sum()) / (1024 * 1024),
+    }
+    return df
+
+
+def _blocos_csv(fonte: str, progresso=None, primeiro_bloco: int = STREAMING_BLOCO_LINHAS):
+    """
+    Lê o CSV (compactado ou não) em blocos: o primeiro com 'primeiro_bloco' linhas e os demais com
+    STREAMING_BLOCO_LINHAS. Com 'progresso', a fonte é aberta por _fluxo_csv e progresso(linhas_lidas, bytes_lidos)
+    é chamado após cada bloco; sem ele, a URL e a compressão ficam a cargo do próprio pandas.
+    """
+    with contextlib.ExitStack() as pilha:
+        if progresso is None:
+            leitor = pilha.enter_context(pd.read_csv(fonte, compression='infer', iterator=True))
+        else:
+            arquivo, contador = pilha.enter_context(_fluxo_csv(fonte, STREAMING_MAX_MB * 1024 * 1024))
+            leitor = pilha.enter_context(pd.read_csv(arquivo, iterator=True))
+        tamanho = primeiro_bloco
+        linhas = 0
+        while True:
+            try:
+                bloco = leitor.get_chunk(tamanho)
+            except StopIteration:
+                return
+            tamanho = STREAMING_BLOCO_LINHAS
+            linhas += len(bloco)
+            if progresso is not None:
+                progresso(linhas, contador.bytes_lidos)
+            yield bloco
+
+
+def _concatenar_blocos(blocos: list) -> pd.DataFrame:
+    return pd.concat(blocos, ignore_index=True) if len(blocos) > 1 else blocos[0]
+
+
+def _ler_csv_inteiro(fonte: str, progresso=None) -> pd.DataFrame:
+    """
+    Lê o CSV inteiro (compactado ou não). Com 'progresso', a leitura é feita em blocos de STREAMING_BLOCO_LINHAS
+    e progresso(linhas_lidas, bytes_lidos) é chamado após cada bloco; sem ele, é um único pd.read_csv.
+    """
+    if progresso is None:
+        return pd.read_csv(fonte, compression='infer')
+    return _concatenar_blocos(list(_blocos_csv(fonte, progresso)))
+
+
+def _ler_csv_compacto(fonte: str, progresso=None) -> pd.DataFrame:
+    """
+    Lê o CSV com tipos compactos: V1–V28/Amount em float32, Class em int8 e Time como inteiro.
+    CSVs que não seguem o esquema Time/V1–V28/Amount/Class recebem redução automática de tipos por coluna.
+
+    O primeiro bloco tem só AMOSTRA_ESQUEMA_LINHAS linhas e serve de amostra: cabeçalho e tipos dele decidem se
+    DTYPES_CREDITCARD se aplica. Cada bloco é convertido ao ser lido, então o CSV é lido uma única vez e as
+    colunas do esquema nunca ficam inteiras em float64.
+    """
+    blocos = []
+    segue_esquema = None
+    for bloco in _blocos_csv(fonte, progresso, AMOSTRA_ESQUEMA_LINHAS):
+        if segue_esquema is None:
+            segue_esquema = (list(bloco.columns) == COLUNAS_CREDITCARD
+                             and all(pd.api.types.is_numeric_dtype(tipo) for tipo in bloco.dtypes))
+        if segue_esquema:
+            try:
+                bloco = bloco.astype(DTYPES_CREDITCARD)
+            except (ValueError, TypeError):
+                # Valor incompatível depois da amostra: os blocos seguintes ficam com os tipos do parse
+                # e _compactar_tipos recorre à redução automática
+                segue_esquema = False
+        blocos.append(bloco)
+    return _compactar_tipos(_concatenar_blocos(blocos), fonte)
+
+
+def _ler_csv(fonte: str, versao: str, progresso=None) -> pd.DataFrame:
+    """
+    Lê um CSV (compactado ou não), usando o cache colunar em disco quando a versão da fonte é conhecida.
+    'progresso', se informado, é chamado como progresso(linhas_lidas, bytes_lidos) durante a leitura do CSV.
+    """
+    versao_cache = _versao_cache_colunar(versao)
+    df = _abrir_cache_colunar(fonte, versao_cache)
+    if df is not None:
+        print(f"[INFO] Dados de '{fonte}' abertos do cache colunar em disco.")
+        anotar(origem="cache_colunar")
+        return df
+    anotar(origem="csv")
+    df = _ler_csv_compacto(fonte, progresso) if CARGA_COMPACTA else _ler_csv_inteiro(fonte, progresso)
+    _salvar_cache_colunar(df, fonte, versao_cache)
+    return df
+
+
+# --- Ingestão em Streaming ---
+
+class _ContadorBytes(io.RawIOBase):
+    """Arquivo binário somente leitura que conta os bytes lidos da fonte subjacente."""
+
+    def __init__(self, arquivo):
+        self._arquivo = arquivo
+        self.bytes_lidos = 0
+
+    def readable(self):
+        return True
+
+    def readinto(self, buffer):
+        dados = self._arquivo.read(len(buffer))
+        tamanho = len(dados)
+        buffer[:tamanho] = dados
+        self.bytes_lidos += tamanho
+        return tamanho
+
+
+def _tamanho_fonte(fonte: str):
+    """Tamanho em bytes da fonte (Content-Length para URLs), ou None se desconhecido."""
+    if fonte.startswith(("http://", "https://")):
+        try:
+            resposta = requests.head(fonte, allow_redirects=True, timeout=10)
+            tamanho = resposta.headers.get("Content-Length")
+            return int(tamanho) if tamanho else None
+        except (requests.exceptions.RequestException, ValueError):
+            return None
+    return os.path.getsize(fonte) if os.path.exists(fonte) else None
+
+
+def deve_usar_streaming(fonte: str) -> bool:
+    """Indica se a fonte é grande o bastante (acima de STREAMING_LIMIAR_MB) para ser lida em streaming."""
+    tamanho = _tamanho_fonte(fonte) if fonte else None
+    return tamanho is not None and tamanho > STREAMING_LIMIAR_MB * 1024 * 1024
+
+
+@contextlib.contextmanager
+def _fluxo_csv(fonte: str, max_bytes: int):
+    """
+    Abre a fonte (URL ou caminho local) como um fluxo de texto CSV descompactado sob demanda.
+    Produz (arquivo_texto, contador), onde contador.bytes_lidos mede os bytes lidos da fonte.
+    """
+    with contextlib.ExitStack() as pilha:
+        if fonte.startswith(("http://", "https://")):
+            resposta = pilha.enter_context(requests.get(fonte, stream=True, timeout=30))
+            resposta.raise_for_status()
+            resposta.raw.decode_content = True
+            bruto = resposta.raw
+            extensao = os.path.splitext(urlparse(fonte).path)[1].lower()
+        else:
+            bruto = pilha.enter_context(open(fonte, "rb"))
+            extensao = os.path.splitext(fonte)[1].lower()
+
+        contador = _ContadorBytes(bruto)
+        binario = io.BufferedReader(contador, buffer_size=1024 * 1024)
+
+        if extensao == ".zip":
+            # ZIP exige acesso aleatório: o arquivo compactado é copiado para disco respeitando o limite de bytes
+            temporario = pilha.enter_context(tempfile.TemporaryFile())
+            while True:
+                dados = binario.read(8 * 1024 * 1024)
+                if not dados:
+                    break
+                if contador.bytes_lidos > max_bytes:
+                    raise ValueError(f"o arquivo ZIP excede o limite de {max_bytes // (1024 * 1024)} MB")
+                temporario.write(dados)
+            temporario.seek(0)
+            arquivo_zip = pilha.enter_context(zipfile.ZipFile(temporario))
+            membros = [m for m in arquivo_zip.namelist() if not m.endswith("/")]
+            membro = next((m for m in membros if m.lower().endswith(".csv")), membros[0])
+            binario = pilha.enter_context(arquivo_zip.open(membro))
+        elif extensao == ".gz":
+            binario = pilha.enter_context(gzip.GzipFile(fileobj=binario))
+        elif extensao == ".bz2":
+            binario = pilha.enter_context(bz2.BZ2File(binario))
+        elif extensao == ".xz":
+            binario = pilha.enter_context(lzma.LZMAFile(binario))
+
+        yield io.TextIOWrapper(binario, encoding="utf-8", newline=""), contador
+
+
+def carregar_dados_streaming(fonte: str, max_linhas: int | None = None, max_bytes: int | None = None,
+                             progresso=None, tamanho_bloco: int = STREAMING_BLOCO_LINHAS):
+    """
+    Lê um CSV (URL ou caminho, compactado ou não) em blocos, sem materializar o arquivo inteiro.
+
+    Os agregados globais (contagem por Class, média/variância/mínimo/máximo e quantis aproximados)
+    são calculados sobre todas as linhas lidas; apenas as primeiras 'max_linhas' ficam no DataFrame.
+
+    Args:
+        fonte: URL ou caminho do arquivo.
+        max_linhas: Máximo de linhas mantidas em memória (padrão STREAMING_MAX_LINHAS).
+        max_bytes: Máximo de bytes lidos da fonte antes de interromper a leitura (padrão STREAMING_MAX_MB).
+        progresso: Função opcional chamada como progresso(linhas_lidas, bytes_lidos) após cada bloco.
+        tamanho_bloco: Número de linhas por bloco.
+
+    Returns:
+        Uma tupla (DataFrame com as linhas mantidas, EstatisticasIncrementais), ou uma string de erro.
+    """
+    if not fonte:
+        return "Erro: URL não fornecida."
+    max_linhas = STREAMING_MAX_LINHAS if max_linhas is None else max_linhas
+    max_bytes = STREAMING_MAX_MB * 1024 * 1024 if max_bytes is None else max_bytes
+
+    with trecho("carga_dados", fonte=fonte, origem="streaming") as atual:
+        try:
+            print(f"[INFO] Lendo dados em streaming de: {fonte}")
+            estatisticas = EstatisticasIncrementais()
+            blocos = []
+            linhas_mantidas = 0
+            truncado = False
+
+            with _fluxo_csv(fonte, max_bytes) as (arquivo, contador), \
+                    pd.read_csv(arquivo, chunksize=tamanho_bloco) as leitor:
+                for bloco in leitor:
+                    estatisticas.atualizar(bloco)
+                    if linhas_mantidas < max_linhas:
+                        parte = bloco.iloc[:max_linhas - linhas_mantidas]
+                        if CARGA_COMPACTA and list(parte.columns) == COLUNAS_CREDITCARD:
+                            # Reduz os tipos já no bloco para não acumular float64 em memória
+                            try:
+                                parte = parte.astype(DTYPES_CREDITCARD)
+                            except (ValueError, TypeError):
+                                pass
+                        blocos.append(parte)
+                        linhas_mantidas += len(parte)
+                    if progresso:
+                        progresso(estatisticas.linhas, contador.bytes_lidos)
+                    if contador.bytes_lidos >= max_bytes:
+                        truncado = True
+                        print(f"[AVISO] Limite de {max_bytes // (1024 * 1024)} MB atingido. Leitura interrompida.")
+                        break
+                bytes_lidos = contador.bytes_lidos
+
+            df_retorno = pd.concat(blocos, ignore_index=True) if blocos else pd.DataFrame()
+            if CARGA_COMPACTA and not df_retorno.empty:
+                df_retorno = _compactar_tipos(df_retorno, fonte)
+            df_retorno.attrs["streaming"] = {
+                "linhas_lidas": estatisticas.linhas,
+                "linhas_mantidas": linhas_mantidas,
+                "bytes_lidos": bytes_lidos,
+                "truncado": truncado,
+            }
+            atual.definir(linhas=estatisticas.linhas, bytes_recebidos=bytes_lidos, truncado=truncado)
+            print(f"[INFO] Streaming concluído: {estatisticas.linhas} linhas lidas, {linhas_mantidas} mantidas em memória.")
+            return df_retorno, estatisticas
+        except Exception as e:
+            atual.definir(erro=type(e).__name__)
+            return f"Erro ao carregar dados em streaming ({e}). Verifique o link e a acessibilidade."
+
+
+def carregar_dados_dinamicamente(url: str, progresso=None):
+    """
+    Carrega um DataFrame a partir de uma URL fornecida, suportando compressão (ZIP, GZ, etc.).
+    'progresso', se informado, é chamado como progresso(linhas_lidas, bytes_lidos) durante a leitura.
+    """
     if not url:
         return "Erro: URL não fornecida."
     try:
         print(f"[INFO] Tentando carregar dados da URL: {url}")
-        # Suporte a compressão adicionado aqui
-        df_retorno = pd.read_csv(url, compression='infer')
+        # Suporte a compressão adicionado aqui; a carga é compartilhada entre sessões
+        df_retorno = _carregar_compartilhado(url, _ler_csv, progresso)
         print(f"[INFO] Dados carregados com sucesso da URL.")
         return df_retorno
     except Exception as e:
         return f"Erro ao carregar dados da URL ({e}). Verifique o link e a acessibilidade."
 
-def carregar_dados_ou_demo():
-    """Tenta carregar o creditcard.csv via URL pública, localmente, ou cria um DataFrame de demonstração. Suporta compressão."""
+def carregar_dados_ou_demo(progresso=None):
+    """
+    Tenta carregar o creditcard.csv via URL pública, localmente, ou cria um DataFrame de demonstração. Suporta compressão.
+    'progresso', se informado, é chamado como progresso(linhas_lidas, bytes_lidos) durante a leitura do CSV.
+    """
     
     GENERIC_PLACEHOLDER_URL = "https://example.com/seu_arquivo_publico_de_150MB.csv"
 
@@ -32,8 +760,8 @@ def carregar_dados_ou_demo():
     if PUBLIC_CSV_URL and PUBLIC_CSV_URL != GENERIC_PLACEHOLDER_URL:
         try:
             print(f"[INFO] Tentando carregar dados da URL: {PUBLIC_CSV_URL}")
-            # Comando que carrega o arquivo do GitHub
-            df_retorno = pd.read_csv(PUBLIC_CSV_URL, compression='infer')
+            # Comando que carrega o arquivo do GitHub (uma única vez por processo)
+            df_retorno = _carregar_compartilhado(PUBLIC_CSV_URL, _ler_csv, progresso)
             print(f"[INFO] Dados carregados com sucesso via URL do GitHub.")
             return df_retorno
         except Exception as e:
@@ -44,8 +772,8 @@ def carregar_dados_ou_demo():
     file_path = 'data/creditcard.csv' # Note que o nome do arquivo local ainda é .csv
     if os.path.exists(file_path):
         try:
-            # Comando que carrega o arquivo localmente
-            df_retorno = pd.read_csv(file_path, compression='infer')
+            # Comando que carrega o arquivo localmente (uma única vez por processo)
+            df_retorno = _carregar_compartilhado(file_path, _ler_csv, progresso)
             print(f"[INFO] Dados carregados com sucesso de '{file_path}' (Ambiente Local).")
             return df_retorno
         except Exception as e:
@@ -69,136 +797,514 @@ def carregar_dados_ou_demo():
     return df_retorno
 
 
-def consulta_tool(df: pd.DataFrame, codigo_python: str) -> str:
+# --- Cache de Resultados da consulta_tool ---
+# Chave: (impressão digital do df, código normalizado, variáveis de contexto usadas) -> resultado formatado.
+_cache_consultas = OrderedDict()
+_cache_consultas_lock = threading.Lock()
+_contadores_cache_consultas = {"acertos": 0, "falhas": 0}
+# Nomes que tornam o resultado aleatório (df.sample, np.random, random): essas consultas nunca vão para o cache
+NOMES_NAO_DETERMINISTICOS = {"sample", "random"}
+
+
+def _normalizar_codigo(codigo_python: str) -> tuple:
+    """
+    Forma canônica do código (AST), para que variações de espaços/aspas gerem a mesma chave,
+    e os nomes de variáveis que ele referencia.
+    """
+    try:
+        arvore = ast.parse(codigo_python.strip(), mode='eval')
+    except SyntaxError:
+        return codigo_python.strip(), set()
+    nomes = {no.id for no in ast.walk(arvore) if isinstance(no, ast.Name)}
+    return ast.dump(arvore), nomes
+
+
+def _nao_deterministico(codigo_python: str) -> bool:
+    """Se o código usa amostragem ou números aleatórios (nomes ou atributos em NOMES_NAO_DETERMINISTICOS)."""
+    try:
+        arvore = ast.parse(codigo_python.strip(), mode='eval')
+    except SyntaxError:
+        return False
+    return any(
+        (isinstance(no, ast.Name) and no.id in NOMES_NAO_DETERMINISTICOS)
+        or (isinstance(no, ast.Attribute) and no.attr in NOMES_NAO_DETERMINISTICOS)
+        for no in ast.walk(arvore)
+    )
+
+
+def _chave_consulta(df: pd.DataFrame, codigo_python: str, contexto: dict | None) -> tuple:
+    """Chave do cache de consultas. Objetos de contexto usados pelo código entram pela identidade."""
+    codigo_normalizado, nomes = _normalizar_codigo(codigo_python)
+    usados = tuple(sorted(
+        (nome, getattr(valor, "impressao_digital", None) or id(valor))
+        for nome, valor in (contexto or {}).items() if nome in nomes
+    ))
+    return impressao_digital(df), codigo_normalizado, usados
+
+
+def estatisticas_cache_consultas() -> dict:
+    """Contadores de acertos/falhas e número de entradas do cache de resultados da consulta_tool."""
+    with _cache_consultas_lock:
+        return {**_contadores_cache_consultas, "entradas": len(_cache_consultas)}
+
+
+def _formatar_tabela(result) -> str:
+    """Formata uma Series/DataFrame como markdown; os grandes viram forma + primeiras e últimas linhas."""
+    if len(result) <= CONSULTA_MAX_LINHAS_SAIDA:
+        return result.to_markdown()
+    metade = max(1, CONSULTA_MAX_LINHAS_SAIDA // 2)
+    tipo = "DataFrame" if isinstance(result, pd.DataFrame) else "Series"
+    forma = " x ".join(str(n) for n in result.shape)
+    return (
+        f"{tipo} com forma ({forma}); exibindo as {metade} primeiras e as {metade} últimas linhas:\n"
+        f"{pd.concat([result.head(metade), result.tail(metade)]).to_markdown()}"
+    )
+
+
+class _SaidaPorThread:
+    """
+    Substituto de sys.stdout que envia o que cada thread imprime para o buffer de captura dela, se houver.
+    Consultas executadas em paralelo (ferramentas e conversas em threads) não misturam as saídas, e o
+    restante do processo continua escrevendo na saída original.
+    """
+
+    def __init__(self, original):
+        self._original = original
+        self._local = threading.local()
+
+    def _destino(self):
+        buffer = getattr(self._local, "buffer", None)
+        return self._original if buffer is None else buffer
+
+    def write(self, texto):
+        return self._destino().write(texto)
+
+    def flush(self):
+        return self._destino().flush()
+
+    def __getattr__(self, nome):
+        return getattr(self._original, nome)
+
+
+_saida_lock = threading.Lock()
+
+
+@contextlib.contextmanager
+def _capturar_saida(buffer: io.StringIO):
+    """Captura no buffer o que a thread atual imprimir durante o bloco."""
+    with _saida_lock:
+        if not isinstance(sys.stdout, _SaidaPorThread):
+            sys.stdout = _SaidaPorThread(sys.stdout)
+        saida = sys.stdout
+    anterior = getattr(saida._local, "buffer", None)
+    saida._local.buffer = buffer
+    try:
+        yield
+    finally:
+        saida._local.buffer = anterior
+
+
+def _executar_consulta(df: pd.DataFrame, codigo_python: str, contexto: dict | None = None) -> str:
+    """Executa o código no DataFrame e formata o resultado (sem cache)."""
+    stdout_buffer = io.StringIO()
+
+    with _capturar_saida(stdout_buffer):
+        try:
+            # Importado aqui: o módulo de índices depende deste
+            from indices import variaveis_consulta
+            exec_globals = {'pd': pd, 'df': df, **variaveis_consulta(df, _normalizar_codigo(codigo_python)[1]), **(contexto or {})}
+            exec_locals = dict(exec_globals)
+            exec(f'result = {codigo_python}', exec_globals, exec_locals)
+
+            result = exec_locals.get('result')
+
+            if isinstance(result, (pd.Series, pd.DataFrame)):
+                return _formatar_tabela(result)
+
+            output = stdout_buffer.getvalue().strip()
+
+            if not output and result is not None:
+                return str(result)
+            elif output:
+                return output
+            else:
+                return "Comando executado com sucesso, mas não gerou um retorno visível."
+
+        except MemoryError:
+            return "Erro na execução do código Python: a consulta excedeu o limite de memória."
+        except Exception as e:
+            return f"Erro na execução do código Python: {e}"
+
+
+def _executar_consulta_local(df: pd.DataFrame, codigo_python: str, contexto: dict | None = None) -> tuple:
+    """Executa a consulta no próprio processo. Retorna (resultado, alterou), onde alterou indica se o conteúdo de 'df' mudou."""
+    antes = _assinatura_conteudo(df)
+    resultado = _executar_consulta(df, codigo_python, contexto)
+    return resultado, _assinatura_conteudo(df) != antes
+
+
+def _alteracoes_no_lugar(antes: tuple, df: pd.DataFrame) -> dict | None:
+    """
+    Compara o conteúdo atual de 'df' com a assinatura 'antes' (de _assinatura_conteudo). Retorna None se nada mudou,
+    {"linhas": True} se as linhas ou o índice mudaram, ou {"colunas": {nome: Series alterada ou nova}, "removidas": [nomes das colunas removidas, como str]}.
+    """
+    depois = _assinatura_conteudo(df)
+    if depois == antes:
+        return None
+    if depois[0][0] != antes[0][0] or depois[3] != antes[3]:
+        return {"linhas": True}
+    colunas_antes = dict(zip(antes[1], zip(antes[2], antes[4])))
+    colunas_depois = dict(zip(depois[1], zip(depois[2], depois[4])))
+    return {
+        "colunas": {c: df[c] for c in df.columns if colunas_antes.get(str(c)) != colunas_depois[str(c)]},
+        "removidas": [c for c in colunas_antes if c not in colunas_depois],
+    }
+
+
+def _executar_consulta_isolada(df: pd.DataFrame, codigo_python: str, contexto: dict | None = None) -> tuple:
+    """
+    Executa a consulta no pool de processos, com limites de tempo e memória; recorre à execução local se o pool falhar.
+    Retorna (resultado, alterou), como _executar_consulta_local: as colunas que a consulta alterou, criou ou removeu
+    no lugar são trazidas do trabalhador e aplicadas a 'df'. Alterações no lugar das linhas ou do índice não são
+    mantidas e o resultado é uma mensagem de erro.
+    """
+    try:
+        # Importado aqui: o pool importa este módulo nos processos trabalhadores
+        from pool_consultas import obter_pool
+        resultado, alteracoes = obter_pool().executar(df, codigo_python, contexto)
+    except Exception as e:
+        print(f"[AVISO] Falha no pool de consultas ({e}). Executando no próprio processo.")
+        return _executar_consulta_local(df, codigo_python, contexto)
+
+    if alteracoes is None:
+        return resultado, False
+    if alteracoes.get("linhas"):
+        return (
+            "Erro: a consulta alterou as linhas ou o índice de 'df' no lugar (ex.: dropna, sort_values ou reset_index com "
+            "inplace=True); essas alterações não são mantidas. Atribua o resultado a uma variável "
+            "(ex.: ordenado = df.sort_values('Amount')) em vez de usar inplace=True.",
+            False,
+        )
+    removidas = set(alteracoes["removidas"])
+    for nome in [c for c in df.columns if str(c) in removidas]:
+        del df[nome]
+    for nome, valores in alteracoes["colunas"].items():
+        df[nome] = valores
+    return resultado, True
+
+
+def consulta_tool(df: pd.DataFrame, codigo_python: str, contexto: dict | None = None) -> str:
     """
     Executa um trecho de código Python no DataFrame 'df' e retorna o resultado formatado.
+    O código também pode usar os subconjuntos indexados 'fraudes' e 'normais' e 'janela(t0, t1)' (ver indices.py).
+    Resultados já calculados para o mesmo conteúdo de 'df' e o mesmo código vêm do cache compartilhado
+    (exceto os de código com amostragem ou números aleatórios); os demais são executados em um processo
+    separado, com tempo e memória limitados (CONSULTA_ISOLADA).
     
     Args:
         df: O DataFrame de dados.
         codigo_python: O código Python (como string) para executar no DataFrame 'df'.
+        contexto: Variáveis adicionais disponíveis para o código (ex: 'estatisticas' da leitura em streaming).
         
     Returns:
         O resultado da execução do código como uma string.
     """
     if df is None:
         return "Erro: O DataFrame não foi carregado corretamente."
-        
-    stdout_buffer = io.StringIO()
-    sys.stdout = stdout_buffer
 
-    try:
-        exec_locals = {'df': df, 'pd': pd}
-        exec(f'result = {codigo_python}', {'pd': pd, 'df': df}, exec_locals)
-        
-        result = exec_locals.get('result')
+    with trecho("consulta_tool", linhas=len(df), isolada=CONSULTA_ISOLADA):
+        chave = _chave_consulta(df, codigo_python, contexto)
+        cacheavel = not _nao_deterministico(codigo_python)
+        if cacheavel:
+            with _cache_consultas_lock:
+                resultado = _cache_consultas.get(chave)
+                if resultado is not None:
+                    _cache_consultas.move_to_end(chave)
+                    _contadores_cache_consultas["acertos"] += 1
+                    anotar(cache="acerto", caracteres_saida=len(resultado))
+                    return resultado
+                _contadores_cache_consultas["falhas"] += 1
+        anotar(cache="falha" if cacheavel else "ignorado")
 
-        if isinstance(result, (pd.Series, pd.DataFrame)):
-            return result.to_markdown()
-        
-        output = stdout_buffer.getvalue().strip()
-        
-        if not output and result is not None:
-            return str(result)
-        elif output:
-            return output
+        if CONSULTA_ISOLADA:
+            resultado, alterou = _executar_consulta_isolada(df, codigo_python, contexto)
         else:
-            return "Comando executado com sucesso, mas não gerou um retorno visível."
-            
-    except Exception as e:
-        return f"Erro na execução do código Python: {e}"
-        
-    finally:
-        sys.stdout = sys.__stdout__
+            resultado, alterou = _executar_consulta_local(df, codigo_python, contexto)
+        anotar(caracteres_saida=len(resultado), erro_consulta=resultado.startswith("Erro"))
 
+        if alterou:
+            # O código alterou o DataFrame no lugar: a impressão digital (e com ela os caches derivados do
+            # conteúdo) precisa ser recalculada, e o resultado não é reaproveitável
+            invalidar_impressao_digital(df)
+            anotar(alterou_df=True)
+            return resultado
 
-def grafico_tool(df: pd.DataFrame, tipo_grafico: str, colunas: list, titulo: str) -> BytesIO | str:
+        if cacheavel and not resultado.startswith("Erro") and len(resultado) <= CACHE_CONSULTAS_MAX_CARACTERES:
+            with _cache_consultas_lock:
+                _cache_consultas[chave] = resultado
+                _cache_consultas.move_to_end(chave)
+                while len(_cache_consultas) > CACHE_CONSULTAS_MAX_ENTRADAS:
+                    _cache_consultas.popitem(last=False)
+        return resultado
+
+
+# --- Renderização Agregada (datasets grandes) ---
+
+def _valores_finitos(*series: pd.Series) -> list:
+    """Converte as séries para float64 e descarta as linhas com NaN/inf em qualquer uma delas."""
+    valores = [s.to_numpy(dtype=np.float64, na_value=np.nan) for s in series]
+    mascara = np.logical_and.reduce([np.isfinite(v) for v in valores])
+    return [v[mascara] for v in valores]
+
+
+def _scatter_densidade(ax, x: pd.Series, y: pd.Series, classes: pd.Series):
+    """Dispersão como densidade 2D (histograma em células) com todas as fraudes sobrepostas como pontos."""
+    x_validos, y_validos, c_validos = _valores_finitos(x, y, classes)
+    contagens, bordas_x, bordas_y = np.histogram2d(x_validos, y_validos, bins=CELULAS_DENSIDADE)
+    contagens = np.ma.masked_equal(contagens, 0)
+    malha = ax.pcolormesh(bordas_x, bordas_y, contagens.T, cmap='Blues', norm=LogNorm(), rasterized=True)
+    ax.figure.colorbar(malha, ax=ax, label='Transações por célula')
+    fraudes = c_validos == 1
+    ax.scatter(x_validos[fraudes], y_validos[fraudes], c='red', s=8, alpha=0.8, label='Fraude (Class=1)')
+    ax.legend(loc='upper right')
+
+
+def _decimar_min_max(x: pd.Series, y: pd.Series, baldes: int = BALDES_DECIMACAO) -> tuple:
     """
-    Gera um gráfico com base no tipo especificado e retorna o buffer de memória da imagem (BytesIO).
-    
-    Args:
-        df: O DataFrame de dados.
-        tipo_grafico: Tipo de gráfico ('hist', 'box', 'scatter', 'bar', 'pie', 'line', 'area').
-        colunas: Lista de colunas a serem plotadas.
-        titulo: Título do gráfico.
-        
-    Returns:
-        Um objeto BytesIO contendo o PNG do gráfico, ou uma string de erro.
+    Ordena a série por x e a reduz a no máximo 2 pontos (mínimo e máximo de y) por balde de linhas
+    consecutivas, preservando picos e vales visíveis no gráfico.
     """
-    if df is None:
-        return "Erro: O DataFrame não foi carregado corretamente para gerar o gráfico."
+    x_validos, y_validos = _valores_finitos(x, y)
+    if len(x_validos) and np.any(np.diff(x_validos) < 0):
+        ordem = np.argsort(x_validos, kind='stable')
+        x_validos, y_validos = x_validos[ordem], y_validos[ordem]
+    if len(x_validos) <= 2 * baldes:
+        return x_validos, y_validos
+
+    tamanho = int(np.ceil(len(x_validos) / baldes))
+    preenchimento = baldes * tamanho - len(x_validos)
+    y_baldes = np.concatenate([y_validos, np.full(preenchimento, np.nan)]).reshape(baldes, tamanho)
+    inicio = np.arange(baldes) * tamanho
+    # Os baldes completamente vazios só podem ser os do final (preenchimento)
+    validos = inicio < len(x_validos)
+    y_baldes, inicio = y_baldes[validos], inicio[validos]
+    pos_min = inicio + np.nanargmin(y_baldes, axis=1)
+    pos_max = inicio + np.nanargmax(y_baldes, axis=1)
+    posicoes = np.sort(np.concatenate([pos_min, pos_max]))
+    return x_validos[posicoes], y_validos[posicoes]
+
+
+def _hist_agregado(ax, valores: pd.Series, bins: int = 50):
+    """Histograma desenhado a partir das contagens por faixa já calculadas pelo NumPy."""
+    (validos,) = _valores_finitos(valores)
+    contagens, bordas = np.histogram(validos, bins=bins)
+    ax.bar(bordas[:-1], contagens, width=np.diff(bordas), align='edge', edgecolor='black', alpha=0.7)
+
+
+def _estatisticas_boxplot(valores: np.ndarray, rotulo) -> dict:
+    """Estatísticas de um boxplot (quartis, bigodes a 1,5 IQR e uma amostra dos outliers extremos)."""
+    q1, mediana, q3 = np.quantile(valores, [0.25, 0.5, 0.75])
+    iqr = q3 - q1
+    dentro = valores[(valores >= q1 - 1.5 * iqr) & (valores <= q3 + 1.5 * iqr)]
+    outliers = np.sort(valores[(valores < q1 - 1.5 * iqr) | (valores > q3 + 1.5 * iqr)])
+    if len(outliers) > MAX_OUTLIERS_BOXPLOT:
+        # Amostra uniforme sobre os outliers ordenados: mantém os extremos e a forma da cauda
+        outliers = outliers[np.linspace(0, len(outliers) - 1, MAX_OUTLIERS_BOXPLOT).astype(int)]
+    return {
+        "label": rotulo,
+        "q1": q1,
+        "med": mediana,
+        "q3": q3,
+        "whislo": dentro.min() if len(dentro) else q1,
+        "whishi": dentro.max() if len(dentro) else q3,
+        "fliers": outliers,
+    }
 
+
+def _valores_por_classe(df: pd.DataFrame, coluna: str) -> dict:
+    """Valores finitos da coluna para cada classe, obtidos pelas posições do índice (sem agrupar o DataFrame)."""
+    from indices import obter_indice
+
+    indice = obter_indice(df)
+    if indice.posicoes_classe is None:
+        raise KeyError('Class')
+    valores = df[coluna].to_numpy(dtype=np.float64, na_value=np.nan)
+    grupos = {}
+    for classe in sorted(indice.posicoes_classe):
+        grupo = valores[indice.posicoes_classe[classe]]
+        grupos[classe] = grupo[np.isfinite(grupo)]
+    return grupos
+
+
+def _boxplot_agregado(ax, grupos: dict):
+    """Boxplot por classe desenhado a partir de estatísticas pré-calculadas (ax.bxp)."""
+    estatisticas = [_estatisticas_boxplot(valores, int(classe)) for classe, valores in grupos.items() if len(valores)]
+    ax.bxp(estatisticas, showfliers=True)
+
+
+# --- Renderização de Gráficos (workers + cache) ---
+# Cada gráfico usa sua própria Figure com canvas Agg (sem o estado global do pyplot), o que permite
+# renderizar em várias threads ao mesmo tempo. Os PNGs ficam em cache por (impressão digital, tipo, colunas, título).
+_executor_graficos = ThreadPoolExecutor(max_workers=GRAFICOS_TRABALHADORES, thread_name_prefix="grafico")
+_cache_graficos = OrderedDict()
+_cache_graficos_lock = threading.Lock()
+# Renderizações em andamento: pedidos idênticos simultâneos aguardam o mesmo resultado
+_graficos_em_andamento = {}
+
+
+def _renderizar_grafico(df: pd.DataFrame, tipo_grafico: str, colunas: list, titulo: str) -> bytes | str:
+    """Renderiza o gráfico em uma Figure independente (backend Agg) e retorna os bytes do PNG ou uma string de erro."""
     try:
-        plt.figure(figsize=(10, 6))
+        fig = Figure(figsize=(10, 6))
+        FigureCanvasAgg(fig)
+        ax = fig.add_subplot()
+        # Acima do limiar os dados são pré-agregados: o matplotlib nunca recebe todas as linhas
+        agregar = len(df) > LIMIAR_AGREGACAO_GRAFICO
         
         if tipo_grafico == 'hist' and len(colunas) == 1:
-            df[colunas[0]].hist(bins=50, edgecolor='black', alpha=0.7)
-            plt.title(f'Histograma de {colunas[0]}')
-            plt.xlabel(colunas[0])
-            plt.ylabel('Frequência')
+            if agregar:
+                _hist_agregado(ax, df[colunas[0]])
+            else:
+                ax.hist(df[colunas[0]].dropna(), bins=50, edgecolor='black', alpha=0.7)
+            ax.grid(True)
+            ax.set_title(f'Histograma de {colunas[0]}')
+            ax.set_xlabel(colunas[0])
+            ax.set_ylabel('Frequência')
 
         elif tipo_grafico == 'box' and len(colunas) == 1:
-            df.boxplot(column=colunas[0], by='Class', grid=False, figsize=(8, 6))
-            plt.suptitle('') 
-            plt.title(f'Boxplot de {colunas[0]} por Classe (0=Normal, 1=Fraude)')
-            plt.xlabel('Classe')
-            plt.ylabel(colunas[0])
+            # As posições de cada classe vêm do índice do dataset: nenhum groupby sobre o DataFrame inteiro
+            grupos = _valores_por_classe(df, colunas[0])
+            if agregar:
+                _boxplot_agregado(ax, grupos)
+            else:
+                ax.boxplot(list(grupos.values()))
+                ax.set_xticks(range(1, len(grupos) + 1), [str(int(classe)) for classe in grupos])
+            ax.set_title(f'Boxplot de {colunas[0]} por Classe (0=Normal, 1=Fraude)')
+            ax.set_xlabel('Classe')
+            ax.set_ylabel(colunas[0])
             
         elif tipo_grafico == 'scatter' and len(colunas) == 2:
             col_x, col_y = colunas[0], colunas[1]
-            plt.scatter(df[col_x], df[col_y], c=df['Class'], cmap='coolwarm', alpha=0.6)
-            plt.title(f'Dispersão de {col_x} vs {col_y} (Cor por Fraude)')
-            plt.xlabel(col_x)
-            plt.ylabel(col_y)
-            plt.colorbar(label='Class (0=Normal, 1=Fraude)')
+            if agregar:
+                _scatter_densidade(ax, df[col_x], df[col_y], df['Class'])
+                ax.set_title(f'Densidade de {col_x} vs {col_y} (Fraudes em vermelho)')
+            else:
+                pontos = ax.scatter(df[col_x], df[col_y], c=df['Class'], cmap='coolwarm', alpha=0.6)
+                ax.set_title(f'Dispersão de {col_x} vs {col_y} (Cor por Fraude)')
+                fig.colorbar(pontos, ax=ax, label='Class (0=Normal, 1=Fraude)')
+            ax.set_xlabel(col_x)
+            ax.set_ylabel(col_y)
             
         elif tipo_grafico == 'bar' and colunas[0].lower() == 'class':
             fraudes = df['Class'].value_counts()
-            fraudes.plot(kind='bar', color=['skyblue', 'salmon'])
-            plt.title('Contagem de Transações por Classe')
-            plt.xlabel('Classe (0=Normal, 1=Fraude)')
-            plt.ylabel('Contagem')
-            plt.xticks(rotation=0)
+            ax.bar([str(classe) for classe in fraudes.index], fraudes.to_numpy(), color=['skyblue', 'salmon'][:len(fraudes)])
+            ax.set_title('Contagem de Transações por Classe')
+            ax.set_xlabel('Classe (0=Normal, 1=Fraude)')
+            ax.set_ylabel('Contagem')
         
         elif tipo_grafico == 'pie' and len(colunas) == 1 and colunas[0].lower() == 'class':
             contagem_classe = df['Class'].value_counts()
             labels = ['Normal', 'Fraude']
-            plt.pie(contagem_classe, labels=labels, autopct='%1.1f%%', startangle=140, colors=['#66b3ff', '#ff9999'])
-            plt.title('Distribuição de Transações (Normal vs. Fraude)')
-            plt.ylabel('')
+            ax.pie(contagem_classe, labels=labels, autopct='%1.1f%%', startangle=140, colors=['#66b3ff', '#ff9999'])
+            ax.set_title('Distribuição de Transações (Normal vs. Fraude)')
+            ax.set_ylabel('')
             
         elif tipo_grafico == 'line' and len(colunas) == 2:
             col_x, col_y = colunas[0], colunas[1]
-            plt.plot(df[col_x], df[col_y])
-            plt.title(f'Gráfico de Linha de {col_x} vs {col_y}')
-            plt.xlabel(col_x)
-            plt.ylabel(col_y)
+            if agregar:
+                ax.plot(*_decimar_min_max(df[col_x], df[col_y]))
+            else:
+                ax.plot(df[col_x], df[col_y])
+            ax.set_title(f'Gráfico de Linha de {col_x} vs {col_y}')
+            ax.set_xlabel(col_x)
+            ax.set_ylabel(col_y)
         
         elif tipo_grafico == 'area' and len(colunas) == 2:
             col_x, col_y = colunas[0], colunas[1]
-            plt.fill_between(df[col_x], df[col_y], color="skyblue", alpha=0.4)
-            plt.plot(df[col_x], df[col_y], color="Slateblue", alpha=0.6)
-            plt.title(f'Gráfico de Área de {col_x} vs {col_y}')
-            plt.xlabel(col_x)
-            plt.ylabel(col_y)
+            x, y = _decimar_min_max(df[col_x], df[col_y]) if agregar else (df[col_x], df[col_y])
+            ax.fill_between(x, y, color="skyblue", alpha=0.4)
+            ax.plot(x, y, color="Slateblue", alpha=0.6)
+            ax.set_title(f'Gráfico de Área de {col_x} vs {col_y}')
+            ax.set_xlabel(col_x)
+            ax.set_ylabel(col_y)
             
         else:
-            plt.close()
             return f"Erro: Tipo de gráfico '{tipo_grafico}' ou número de colunas inválido."
         
-        plt.suptitle(titulo, fontsize=16)
-        plt.tight_layout()
+        fig.suptitle(titulo, fontsize=16)
+        fig.tight_layout()
         
         buffer = BytesIO()
-        plt.savefig(buffer, format='png')
-        buffer.seek(0)
-        
-        plt.close()
-        
-        return buffer 
+        fig.savefig(buffer, format='png')
+        return buffer.getvalue()
 
     except KeyError as e:
-        plt.close()
         return f"Erro: Coluna não encontrada: {e}. Colunas disponíveis: {df.columns.tolist()}"
     except Exception as e:
-        plt.close()
         return f"Erro inesperado ao gerar o gráfico: {e}"
+
+
+def _armazenar_grafico(chave: tuple, imagem: bytes):
+    """Guarda o PNG no cache de gráficos, removendo os menos usados até caber em CACHE_GRAFICOS_MAX_MB."""
+    limite = CACHE_GRAFICOS_MAX_MB * 1024 * 1024
+    with _cache_graficos_lock:
+        _cache_graficos[chave] = imagem
+        _cache_graficos.move_to_end(chave)
+        while len(_cache_graficos) > 1 and sum(len(v) for v in _cache_graficos.values()) > limite:
+            _cache_graficos.popitem(last=False)
+
+
+def grafico_tool(df: pd.DataFrame, tipo_grafico: str, colunas: list, titulo: str) -> BytesIO | str:
+    """
+    Gera um gráfico com base no tipo especificado e retorna o buffer de memória da imagem (BytesIO).
+    Acima de LIMIAR_AGREGACAO_GRAFICO linhas os dados são pré-agregados (densidade 2D no scatter,
+    decimação min/max em line/area e contagens pré-calculadas em hist/box). A renderização ocorre
+    em um pool de threads e gráficos idênticos para o mesmo conteúdo de 'df' vêm do cache.
+    
+    Args:
+        df: O DataFrame de dados.
+        tipo_grafico: Tipo de gráfico ('hist', 'box', 'scatter', 'bar', 'pie', 'line', 'area').
+        colunas: Lista de colunas a serem plotadas.
+        titulo: Título do gráfico.
+        
+    Returns:
+        Um objeto BytesIO contendo o PNG do gráfico, ou uma string de erro.
+    """
+    if df is None:
+        return "Erro: O DataFrame não foi carregado corretamente para gerar o gráfico."
+
+    colunas = list(colunas or [])
+    if not colunas:
+        return f"Erro: Tipo de gráfico '{tipo_grafico}' ou número de colunas inválido."
+
+    with trecho("grafico_tool", tipo_grafico=tipo_grafico, linhas=len(df), agregado=len(df) > LIMIAR_AGREGACAO_GRAFICO):
+        chave = (impressao_digital(df), tipo_grafico, tuple(colunas), titulo)
+        with _cache_graficos_lock:
+            imagem = _cache_graficos.get(chave)
+            if imagem is not None:
+                _cache_graficos.move_to_end(chave)
+                anotar(cache="acerto", bytes_imagem=len(imagem))
+                return BytesIO(imagem)
+            futuro = _graficos_em_andamento.get(chave)
+            if futuro is None:
+                futuro = _executor_graficos.submit(_renderizar_grafico, df, tipo_grafico, colunas, titulo)
+                _graficos_em_andamento[chave] = futuro
+                responsavel = True
+            else:
+                responsavel = False
+        # 'compartilhado': outra chamada já renderizava o mesmo gráfico e o resultado dela é reaproveitado
+        anotar(cache="falha" if responsavel else "compartilhado")
+
+        try:
+            resultado = futuro.result()
+        finally:
+            if responsavel:
+                with _cache_graficos_lock:
+                    _graficos_em_andamento.pop(chave, None)
+
+        if isinstance(resultado, str):
+            return resultado
+        anotar(bytes_imagem=len(resultado))
+        if responsavel:
+            _armazenar_grafico(chave, resultado)
+        return BytesIO(resultado)